@@ -241,6 +241,12 @@ if start_button:
                     os.makedirs(DATA_DIR, exist_ok=True)
                     df_final.to_csv(CSV_FILE, index=False, encoding='utf-8')
 
+                    # Каталог - основное хранилище ссылок; CSV остается как экспорт
+                    from src.catalog import TrackCatalog
+                    with TrackCatalog() as catalog:
+                        catalog.add_links(collected_list)
+                        catalog.mark_csv_imported(CSV_FILE)
+
                 st.info(f"💾 Данные обновлены в `{csv_rel_path}`.")
                 if df_existing is not None and not csv_read_error:
                     st.success(f"📊 Статистика CSV: Было: {existing_links_count}, Добавлено новых: {newly_added_count}, Всего в файле: {final_links_count}")
@@ -270,10 +276,13 @@ if start_button:
                  st.warning("Нет данных в итоговом CSV для скачивания.")
                  st.stop()
 
-            links_to_download = df_final['Link'].dropna().unique().tolist()
+            # Из каталога берутся только новые ссылки и ссылки с ошибками
+            from src.catalog import TrackCatalog
+            with TrackCatalog() as catalog:
+                 links_to_download = catalog.pending_links()
 
             if not links_to_download:
-                  st.warning("Нет ссылок для скачивания в итоговом CSV.")
+                  st.info("Новых ссылок для скачивания нет (все уже есть в каталоге).")
             else:
                   st.info(f"Начинаем обработку {len(links_to_download)} ссылок (скачивание / проверка архива)...")
                   st.warning("⚠️ Внимание: Интерфейс может не отвечать во время скачивания. Следите за прогрессом в терминале, где запущен Streamlit.")
@@ -281,8 +290,8 @@ if start_button:
                   try:
                        # Импортируем нужные функции здесь
                        from src.downloader import download_tracks, cleanup_temp_files
-                       from src.playlist import create_playlist_json, create_m3u_playlist
-                       from src.config import DOWNLOADS_DIR, PLAYLIST_JSON_FILE, PLAYLIST_M3U_FILE, PLAYLIST_JSON_SORT_ORDER, CLEANUP_THUMBNAILS_AFTER_DOWNLOAD
+                       from src.playlist import generate_playlists
+                       from src.config import DOWNLOADS_DIR, PLAYLIST_JSON_FILE, PLAYLIST_M3U_FILE, CLEANUP_THUMBNAILS_AFTER_DOWNLOAD
 
                        # Запускаем скачивание (блокирующая операция)
                        with st.spinner("Идет скачивание/обработка треков... Пожалуйста, подождите."):
@@ -307,15 +316,10 @@ if start_button:
                                  json_created = False
                                  m3u_created = False
                             else:
-                                 json_created = create_playlist_json(
-                                      output_dir=DOWNLOADS_DIR,
-                                      output_file=PLAYLIST_JSON_FILE,
-                                      sort_order=PLAYLIST_JSON_SORT_ORDER
-                                 )
-                                 m3u_created = create_m3u_playlist(
-                                      output_dir=DOWNLOADS_DIR,
-                                      output_file=PLAYLIST_M3U_FILE
-                                 )
+                                 # Одно сканирование библиотеки на все форматы (PLAYLIST_FORMATS)
+                                 created = generate_playlists(DOWNLOADS_DIR)
+                                 json_created = created.get('json', False)
+                                 m3u_created = created.get('m3u', False)
 
                        if json_created or m3u_created:
                             st.success("✅ Плейлисты успешно созданы/обновлены.")
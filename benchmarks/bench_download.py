@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Офлайн-бенчмарк download_tracks: локальный сервер (bench_server.py) с фикстурами
+вместо SoundCloud, экстрактор-заглушка (yt_dlp_plugins/extractor/bench_soundcloud.py).
+Замеряет треки/с, байты/с, CPU Python и ffmpeg, пиковую память; результат каждого
+запуска дописывается строкой JSON в файл истории для сравнения между версиями.
+
+Запуск из корня проекта:
+    python benchmarks/bench_download.py --tracks 50 --size-kb 512 --codecs mp3,opus,flac
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+# Корень проекта - для src; папка бенчмарка - чтобы yt-dlp нашел плагин-экстрактор
+sys.path.insert(0, BASE_DIR)
+if BENCH_DIR not in sys.path:
+    sys.path.insert(0, BENCH_DIR)
+
+import src.config as config
+
+DEFAULT_HISTORY_FILE = os.path.join(config.DATA_DIR, 'benchmark_history.jsonl')
+
+logger = logging.getLogger('benchmark')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк скачивания (download_tracks) на локальных фикстурах.")
+    parser.add_argument('--tracks', type=int, default=30, help='Количество треков.')
+    parser.add_argument('--size-kb', type=int, default=512, help='Примерный размер одного аудиофайла, КБ.')
+    parser.add_argument('--codecs', default='mp3,opus,aac,flac',
+                        help='Кодеки фикстур через запятую (mp3, opus, aac, flac), треки распределяются по кругу.')
+    parser.add_argument('--latency-ms', type=int, default=20, help='Задержка каждого ответа сервера, мс.')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Доля "удаленных" треков (404).')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Доля запросов аудио с ответом 429.')
+    parser.add_argument('--workers', type=int, default=None, help='Потоков сетевого этапа (по умолчанию из config.py).')
+    parser.add_argument('--transcode-workers', type=int, default=None, help='Потоков CPU-этапа (по умолчанию из config.py).')
+    parser.add_argument('--no-rate-limit', action='store_true', help='Отключить адаптивный лимитер запросов.')
+    parser.add_argument('--keep-source', choices=['config', 'on', 'off'], default='config',
+                        help='Режим без перекодирования (KEEP_SOURCE_CODECS): как в config.py, включен или выключен.')
+    parser.add_argument('--label', default='', help='Метка запуска в истории (например, версия yt-dlp).')
+    parser.add_argument('--history', default=DEFAULT_HISTORY_FILE, help='Файл истории результатов (JSON Lines).')
+    parser.add_argument('--fixtures-dir', default=os.path.join(tempfile.gettempdir(), 'scl_bench_fixtures'),
+                        help='Папка для кэша сгенерированных фикстур.')
+    parser.add_argument('--verbose', action='store_true', help='Показывать лог скачивания.')
+    return parser.parse_args()
+
+
+def configure(args, work_dir):
+    """
+    Направляет все пути конфига во временную папку - до импорта модулей src,
+    которые читают настройки при импорте. Реальные data/ и downloads/ не затрагиваются.
+    """
+    config.DOWNLOADS_DIR = os.path.join(work_dir, 'downloads')
+    config.CATALOG_FILE = os.path.join(work_dir, 'catalog.sqlite3')
+    config.DOWNLOAD_ARCHIVE = os.path.join(work_dir, 'downloaded.txt')
+    config.DOWNLOAD_INDEX_FILE = os.path.join(work_dir, 'downloaded_index.tsv')
+    config.TRACK_TIMINGS_FILE = os.path.join(work_dir, 'download_timings.jsonl')
+    config.PLAN_FILE = os.path.join(work_dir, 'download_plan.json')
+    # Повторы не должны ждать внутри замера
+    config.RETRY_INLINE_MAX_WAIT_SECONDS = 0
+    if args.no_rate_limit:
+        config.RATE_LIMIT_ENABLED = False
+    if args.keep_source != 'config':
+        config.KEEP_SOURCE_CODECS = args.keep_source == 'on'
+
+
+def rusage_snapshot():
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        'python_cpu': self_usage.ru_utime + self_usage.ru_stime,
+        # ffmpeg запускается дочерними процессами - их время учитывается после завершения
+        'ffmpeg_cpu': children.ru_utime + children.ru_stime,
+        # ru_maxrss в КБ на Linux и в байтах на macOS; у дочерних процессов учитывается
+        # и память форка до exec, поэтому пик ffmpeg не ниже размера процесса Python на момент запуска
+        'python_rss_mb': self_usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+        'ffmpeg_rss_mb': children.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+    }
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logger.setLevel(logging.INFO)
+    codecs = [codec.strip() for codec in args.codecs.split(',') if codec.strip()]
+
+    work_dir = tempfile.mkdtemp(prefix='scl_bench_')
+    configure(args, work_dir)
+
+    import yt_dlp
+    from src.catalog import TrackCatalog
+    from src.downloader import download_tracks
+    from bench_server import generate_fixtures, BenchServer
+
+    logger.info(f"Генерация фикстур ({', '.join(codecs)}, ~{args.size_kb} КБ) в {args.fixtures_dir}...")
+    fixtures = generate_fixtures(args.fixtures_dir, codecs, args.size_kb)
+    server = BenchServer(fixtures, codecs, latency_ms=args.latency_ms, fail_rate=args.fail_rate,
+                         throttle_rate=args.throttle_rate).start()
+    links = [server.track_url(n) for n in range(1, args.tracks + 1)]
+
+    catalog = TrackCatalog()
+    catalog.add_links([('', link) for link in links])
+    logger.info(f"Сервер фикстур: {server.base_url}, треков: {len(links)}, рабочая папка: {work_dir}")
+
+    before = rusage_snapshot()
+    started = time.perf_counter()
+    try:
+        processed_files, success, skipped, errors = download_tracks(
+            links, workers=args.workers, transcode_workers=args.transcode_workers, catalog=catalog
+        )
+    finally:
+        wall = time.perf_counter() - started
+        after = rusage_snapshot()
+        catalog.close()
+        server.stop()
+
+    output_bytes = sum(os.path.getsize(path) for path in processed_files if os.path.exists(path))
+    result = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'label': args.label,
+        'yt_dlp': yt_dlp.version.__version__,
+        'python': platform.python_version(),
+        'params': {
+            'tracks': args.tracks, 'size_kb': args.size_kb, 'codecs': codecs, 'latency_ms': args.latency_ms,
+            'fail_rate': args.fail_rate, 'throttle_rate': args.throttle_rate,
+            'workers': args.workers or config.DOWNLOAD_WORKERS,
+            'transcode_workers': args.transcode_workers or config.TRANSCODE_WORKERS or os.cpu_count(),
+            'rate_limit': config.RATE_LIMIT_ENABLED, 'keep_source': config.KEEP_SOURCE_CODECS,
+        },
+        'success': success, 'skipped': skipped, 'errors': errors,
+        'wall_seconds': round(wall, 3),
+        'tracks_per_second': round(success / wall, 3),
+        'downloaded_bytes_per_second': round(server.bytes_served / wall),
+        'output_bytes': output_bytes,
+        'http_requests': server.requests,
+        'python_cpu_seconds': round(after['python_cpu'] - before['python_cpu'], 3),
+        'ffmpeg_cpu_seconds': round(after['ffmpeg_cpu'] - before['ffmpeg_cpu'], 3),
+        'peak_rss_mb': round(after['python_rss_mb'], 1),
+        'ffmpeg_peak_rss_mb': round(after['ffmpeg_rss_mb'], 1),
+    }
+
+    print("-" * 30 + "📊 Бенчмарк скачивания" + "-" * 30)
+    print(f"Треков: {success} успешно, {skipped} пропущено, {errors} ошибок за {result['wall_seconds']:.2f} сек")
+    print(f"Пропускная способность: {result['tracks_per_second']:.2f} треков/с, "
+          f"{result['downloaded_bytes_per_second'] / 1024 / 1024:.2f} МБ/с (HTTP-запросов: {server.requests})")
+    print(f"CPU: Python {result['python_cpu_seconds']:.2f} сек, ffmpeg {result['ffmpeg_cpu_seconds']:.2f} сек")
+    print(f"Пиковая память: Python {result['peak_rss_mb']:.1f} МБ, ffmpeg {result['ffmpeg_peak_rss_mb']:.1f} МБ")
+
+    os.makedirs(os.path.dirname(args.history), exist_ok=True)
+    with open(args.history, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result, ensure_ascii=False) + '\n')
+    print(f"Результат добавлен в историю: {args.history}")
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return 0 if errors <= round(args.tracks * args.fail_rate) + 1 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
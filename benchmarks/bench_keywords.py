@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарк фильтра по ключевым словам:
+  - прежний цикл по PODCAST_KEYWORDS с поиском подстроки (быстрый, но находит 'set' в 'sunset');
+  - тот же цикл с проверкой границ слова регулярным выражением на каждое слово;
+  - KeywordMatcher из src.utils (границы слова, подготовлен один раз).
+Сеть и зависимости yt-dlp не нужны.
+
+Запуск из корня проекта:
+    python benchmarks/bench_keywords.py --items 100000
+"""
+import os
+import sys
+import re
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import PODCAST_KEYWORDS
+from src.utils import KeywordMatcher
+
+WORDS = [
+    'night', 'drive', 'dream', 'original', 'edit', 'feat', 'deep', 'house', 'techno', 'vocal', 'dub',
+    'city', 'lights', 'summer', 'love', 'bass', 'extended', 'premiere', 'release', 'out', 'now', 'on',
+    'label', 'records', 'free', 'download', 'vinyl', 'the', 'of', 'and', 'with', 'from', 'by',
+]
+# Слова, в которых прежний поиск подстроки находил ключевое слово ('set', 'mix', 'show', 'live')
+LOOKALIKE_WORDS = ['sunset', 'remix', 'showcase', 'alive', 'outset', 'remixed']
+
+
+def make_items(count, seed=1):
+    """
+    Синтетические (название, описание, автор): ~10% содержат ключевое слово,
+    еще ~10% - только похожее слово ('sunset', 'remix').
+    """
+    rnd = random.Random(seed)
+    items = []
+    for _ in range(count):
+        title = ' '.join(rnd.choice(WORDS).capitalize() for _ in range(rnd.randint(2, 6)))
+        description = ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(20, 120)))
+        chance = rnd.random()
+        if chance < 0.1:
+            description += ' ' + rnd.choice(PODCAST_KEYWORDS)
+        elif chance < 0.2:
+            title += ' ' + rnd.choice(LOOKALIKE_WORDS).capitalize()
+        items.append((title, description, f'artist{rnd.randint(1, 500)}'))
+    return items
+
+
+def legacy_search(title, description, uploader):
+    """Прежняя реализация filter_tracks_only: lower() + цикл по словам."""
+    text_to_check = f"{title.lower()} {description.lower()} {uploader.lower()}"
+    for keyword in PODCAST_KEYWORDS:
+        if keyword in text_to_check:
+            return keyword
+    return None
+
+
+def make_boundary_search(keywords):
+    """Прямолинейный вариант с границами слова: отдельный regex на каждое ключевое слово."""
+    patterns = [
+        (keyword, re.compile(r'(?<!\w)' + re.escape(keyword) + (r'(?:e?s)?(?!\w)' if keyword[-1].isalnum() else '')))
+        for keyword in PODCAST_KEYWORDS
+    ]
+
+    def boundary_search(title, description, uploader):
+        text_to_check = f"{title} {description} {uploader}".lower()
+        for keyword, pattern in patterns:
+            if pattern.search(text_to_check):
+                return keyword
+        return None
+
+    return boundary_search
+
+
+def run(label, func, items):
+    started = time.perf_counter()
+    matched = sum(1 for item in items if func(*item))
+    elapsed = time.perf_counter() - started
+    print(f"{label}: {elapsed:.3f} сек ({len(items) / elapsed:,.0f} записей/с), совпадений: {matched}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк поиска ключевых слов.")
+    parser.add_argument('--items', type=int, default=100000, help='Количество синтетических записей.')
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    started = time.perf_counter()
+    matcher = KeywordMatcher(PODCAST_KEYWORDS)
+    print(f"Компиляция KeywordMatcher: {(time.perf_counter() - started) * 1000:.2f} мс")
+
+    legacy = run('Цикл по подстрокам (прежний)', legacy_search, items)
+    boundary = run('Цикл regex с границами слова', make_boundary_search(PODCAST_KEYWORDS), items)
+    compiled = run('KeywordMatcher', lambda title, description, uploader: matcher.search(title, uploader, description), items)
+    print(f"KeywordMatcher относительно цикла regex с границами: x{boundary / compiled:.1f}, "
+          f"относительно прежнего поиска подстрок: x{legacy / compiled:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный HTTP-сервер для бенчмарка: отдает сгенерированное ffmpeg аудио, обложки
+и метаданные в формате api-v2 SoundCloud. Задержка ответа и доля "удаленных"
+треков (404) и ответов 429 настраиваются.
+"""
+import os
+import json
+import time
+import random
+import logging
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+# Кодек фикстуры -> (расширение, аргументы ffmpeg, битрейт кбит/с)
+FIXTURE_CODECS = {
+    'mp3': ('mp3', ['-c:a', 'libmp3lame', '-b:a', '128k'], 128),
+    'opus': ('opus', ['-c:a', 'libopus', '-b:a', '96k'], 96),
+    'aac': ('m4a', ['-c:a', 'aac', '-b:a', '128k'], 128),
+    # FLAC не входит в ACCEPTABLE_CODECS - всегда перекодируется в MP3
+    'flac': ('flac', ['-c:a', 'flac'], 700),
+}
+
+
+def generate_fixtures(fixtures_dir, codecs, size_kb, ffmpeg='ffmpeg'):
+    """
+    Генерирует по одному аудиофайлу примерно size_kb КБ на каждый кодек и обложку.
+    Возвращает словарь кодек -> (путь, длительность в секундах).
+    """
+    os.makedirs(fixtures_dir, exist_ok=True)
+    fixtures = {}
+    for codec in codecs:
+        ext, codec_args, bitrate = FIXTURE_CODECS[codec]
+        duration = max(1, round(size_kb * 8 / bitrate))
+        path = os.path.join(fixtures_dir, f'fixture_{codec}_{size_kb}k.{ext}')
+        if not os.path.exists(path):
+            subprocess.run(
+                [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', '-f', 'lavfi',
+                 '-i', f'sine=frequency=440:duration={duration}', '-ac', '2', *codec_args, path],
+                check=True
+            )
+        fixtures[codec] = (path, duration)
+    cover_path = os.path.join(fixtures_dir, 'cover.jpg')
+    if not os.path.exists(cover_path):
+        subprocess.run(
+            [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', '-f', 'lavfi',
+             '-i', 'color=c=orange:s=500x500', '-frames:v', '1', cover_path],
+            check=True
+        )
+    fixtures['cover'] = (cover_path, 0)
+    return fixtures
+
+
+class BenchServer:
+    """
+    Сервер фикстур. Трек N использует кодек codecs[N % len(codecs)].
+    fail_rate - доля треков, чье аудио отвечает 404 (удаленный трек, постоянная ошибка);
+    throttle_rate - доля запросов аудио, получающих 429 (проверка лимитера).
+    """
+
+    def __init__(self, fixtures, codecs, latency_ms=0, fail_rate=0.0, throttle_rate=0.0, seed=1):
+        self.fixtures = fixtures
+        self.codecs = codecs
+        self.latency = latency_ms / 1000
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self.fail_rate = fail_rate
+        self.seed = seed
+        self.bytes_served = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._cache = {} # путь -> содержимое (чтение с диска не должно влиять на замеры)
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def is_failing(self, n):
+        """Детерминированно (по seed) выбирает "удаленные" треки."""
+        return random.Random(self.seed * 100003 + n).random() < self.fail_rate
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self._httpd.server_address[1]}'
+
+    def track_url(self, n):
+        return f'{self.base_url}/bench-artist/track-{n:05d}'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _content(self, path):
+        if path not in self._cache:
+            with open(path, 'rb') as f:
+                self._cache[path] = f.read()
+        return self._cache[path]
+
+    def _track_json(self, n):
+        codec = self.codecs[n % len(self.codecs)]
+        path, duration = self.fixtures[codec]
+        ext, _, bitrate = FIXTURE_CODECS[codec]
+        return {
+            'id': 900000000 + n,
+            'kind': 'track',
+            'title': f'Bench Artist - Track {n:05d}',
+            'description': 'Synthetic track for download benchmark',
+            'duration': duration * 1000,
+            'user': {'username': 'bench-artist'},
+            'artwork_url': f'/artwork/{n}.jpg',
+            'media': {'transcodings': [{
+                'url': f'/audio/{n}.{ext}', 'preset': f'{codec}_0_0', 'ext': ext,
+                'codec': codec, 'abr': bitrate, 'filesize': os.path.getsize(path),
+            }]},
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _send(self, status, body=b'', content_type='application/octet-stream', headers=None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+                with server._lock:
+                    server.requests += 1
+                    server.bytes_served += len(body)
+
+            def do_HEAD(self):
+                self.do_GET()
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                parts = self.path.split('?', 1)[0].strip('/').split('/')
+                try:
+                    if parts[:2] == ['api', 'tracks']:
+                        body = json.dumps(server._track_json(int(parts[2]))).encode('utf-8')
+                        return self._send(200, body, 'application/json')
+                    if parts[0] == 'artwork':
+                        return self._send(200, server._content(server.fixtures['cover'][0]), 'image/jpeg')
+                    if parts[0] == 'audio':
+                        n = int(parts[1].split('.', 1)[0])
+                        if server.is_failing(n):
+                            return self._send(404, b'Not Found', 'text/plain')
+                        with server._lock:
+                            throttled = server._random.random() < server.throttle_rate
+                        if throttled:
+                            return self._send(429, b'Too Many Requests', 'text/plain', {'Retry-After': '1'})
+                        codec = server.codecs[n % len(server.codecs)]
+                        return self._send_audio(server._content(server.fixtures[codec][0]))
+                except (ValueError, IndexError, KeyError):
+                    pass
+                self._send(404, b'Not Found', 'text/plain')
+
+            def _send_audio(self, content):
+                # Поддержка Range - для докачки .part файлов
+                range_header = self.headers.get('Range', '')
+                if range_header.startswith('bytes='):
+                    start_text, _, end_text = range_header[len('bytes='):].partition('-')
+                    start = int(start_text or 0)
+                    end = int(end_text) if end_text else len(content) - 1
+                    return self._send(206, content[start:end + 1], headers={
+                        'Content-Range': f'bytes {start}-{end}/{len(content)}', 'Accept-Ranges': 'bytes'
+                    })
+                self._send(200, content, headers={'Accept-Ranges': 'bytes'})
+
+        return Handler
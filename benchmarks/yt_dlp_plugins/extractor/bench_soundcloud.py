@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Экстрактор-заглушка для бенчмарка (benchmarks/bench_download.py).
+Подключается yt-dlp как плагин, только когда папка benchmarks/ есть в sys.path.
+Отвечает за ссылки вида http://127.0.0.1:<порт>/bench-artist/track-<N> и берет
+метаданные в формате api-v2 SoundCloud у локального сервера (bench_server.py).
+"""
+from yt_dlp.extractor.common import InfoExtractor
+
+
+class BenchSoundcloudIE(InfoExtractor):
+    IE_NAME = 'benchsoundcloud'
+    _VALID_URL = r'https?://127\.0\.0\.1:(?P<port>\d+)/bench-artist/track-(?P<id>\d+)'
+
+    def _real_extract(self, url):
+        port, track_id = self._match_valid_url(url).group('port', 'id')
+        base_url = f'http://127.0.0.1:{port}'
+        track = self._download_json(f'{base_url}/api/tracks/{track_id}', track_id)
+
+        formats = []
+        for transcoding in track['media']['transcodings']:
+            formats.append({
+                'url': base_url + transcoding['url'],
+                'format_id': transcoding['preset'],
+                'ext': transcoding['ext'],
+                'acodec': transcoding['codec'],
+                'vcodec': 'none',
+                'abr': transcoding['abr'],
+                'filesize': transcoding['filesize'],
+            })
+
+        return {
+            'id': str(track['id']),
+            'title': track['title'],
+            'uploader': track['user']['username'],
+            'description': track.get('description') or '',
+            'duration': track['duration'] / 1000,
+            'thumbnail': base_url + track['artwork_url'] if track.get('artwork_url') else None,
+            'webpage_url': url,
+            'formats': formats,
+        }
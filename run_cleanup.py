@@ -4,12 +4,16 @@ import sys
 import logging
 import shutil
 import time
-from mutagen.mp3 import MP3, HeaderNotFoundError
-from mutagen.easyid3 import EasyID3
+from mutagen.mp3 import HeaderNotFoundError
 from src.config import (
     BASE_DIR, DOWNLOADS_DIR, BACKUP_DIR_BASE, CLEANUP_LOG_FILE, LOG_LEVEL,
-    CLEANUP_MIN_DURATION_SECONDS, CLEANUP_KEYWORDS
+    CLEANUP_MIN_DURATION_SECONDS, CLEANUP_KEYWORDS, PLAYLIST_INCREMENTAL
 )
+from src.catalog import TrackCatalog
+from src.metadata import read_basic_tags
+from src.utils import is_audio_file, KeywordMatcher
+from src.dirindex import shared_index
+from src.playlist import update_playlists
 
 # --- Настройка логирования ---
 log_level_map = {'DEBUG': logging.DEBUG, 'INFO': logging.INFO, 'WARNING': logging.WARNING, 'ERROR': logging.ERROR}
@@ -26,23 +30,24 @@ logging.getLogger().handlers[1].setLevel(logging.INFO) # Консоль толь
 logger = logging.getLogger(__name__)
 # -----------------------------
 
+# Ключевые слова компилируются один раз на весь проход по папке
+CLEANUP_MATCHER = KeywordMatcher(CLEANUP_KEYWORDS)
+
 def is_podcast_or_mix_for_cleanup(filepath):
     """
     Проверяет, является ли файл подкастом/миксом для удаления.
     Использует настройки из config.py (CLEANUP_MIN_DURATION_SECONDS, CLEANUP_KEYWORDS).
     """
-    filename_lower = os.path.basename(filepath).lower()
-
     # 1. Проверка по ключевым словам в имени файла
-    for keyword in CLEANUP_KEYWORDS:
-         if keyword in filename_lower:
-             logger.debug(f"Очистка: '{os.path.basename(filepath)}' - ключевое слово в имени файла ('{keyword}').")
-             return True
+    keyword = CLEANUP_MATCHER.search(os.path.splitext(os.path.basename(filepath))[0])
+    if keyword:
+        logger.debug(f"Очистка: '{os.path.basename(filepath)}' - ключевое слово в имени файла ('{keyword}').")
+        return True
 
     # 2. Проверка ID3-тегов и длительности
     try:
-        audio = MP3(filepath, ID3=EasyID3)
-        duration = audio.info.length if audio.info.length else 0
+        tags, length = read_basic_tags(filepath)
+        duration = length if length else 0
 
         # Проверка длительности
         if duration > CLEANUP_MIN_DURATION_SECONDS:
@@ -50,14 +55,13 @@ def is_podcast_or_mix_for_cleanup(filepath):
             return True
 
         # Проверка ключевых слов в тегах
-        title = (audio['title'][0].lower() if audio.get('title') else "")
-        artist = (audio['artist'][0].lower() if audio.get('artist') else "")
+        title = tags.get('title', "")
+        artist = tags.get('artist', "")
 
-        text_to_check = f"{title} {artist}"
-        for keyword in CLEANUP_KEYWORDS:
-            if keyword in text_to_check:
-                 logger.debug(f"Очистка: '{os.path.basename(filepath)}' - ключевое слово в тегах ('{keyword}').")
-                 return True
+        keyword = CLEANUP_MATCHER.search(title, artist)
+        if keyword:
+            logger.debug(f"Очистка: '{os.path.basename(filepath)}' - ключевое слово в тегах ('{keyword}').")
+            return True
 
     except HeaderNotFoundError:
         logger.warning(f"Не удалось прочитать MP3 заголовок для файла: {os.path.basename(filepath)} - файл не будет удален.")
@@ -97,15 +101,17 @@ def main():
     error_files = []
 
     logger.info(f"🧹 Поиск и удаление миксов/подкастов из {DOWNLOADS_DIR}...")
-    all_files = os.listdir(DOWNLOADS_DIR)
+    downloads_index = shared_index(DOWNLOADS_DIR)
+    all_files = downloads_index.names()
 
     for filename in all_files:
-        # Проверяем только MP3 файлы
-        if filename.lower().endswith('.mp3') and not filename.endswith('.part'):
+        # Проверяем только аудиофайлы (MP3 и сохраненные без перекодирования)
+        if is_audio_file(filename):
             filepath = os.path.join(DOWNLOADS_DIR, filename)
             try:
                 if is_podcast_or_mix_for_cleanup(filepath):
                     os.remove(filepath)
+                    downloads_index.discard(filename)
                     logger.info(f"🗑️ Удален файл: {filename}")
                     removed_files.append(filename)
                 else:
@@ -118,29 +124,44 @@ def main():
                  logger.error(f"❌ Неожиданная ошибка при обработке {filename}: {e}", exc_info=True)
                  error_files.append(filename)
                  kept_files_count += 1
-        elif not filename.lower().endswith('.mp3'):
+        else:
             # Другие файлы (обложки и т.д.) просто игнорируем и считаем оставшимися
-             logger.debug(f"Пропуск не-MP3 файла: {filename}")
+             logger.debug(f"Пропуск не аудиофайла: {filename}")
              kept_files_count += 1
 
 
+    # --- Обновление каталога (одной транзакцией) ---
+    if removed_files:
+        try:
+            with TrackCatalog() as catalog:
+                catalog.mark_removed(removed_files)
+            logger.info(f"🗃️ Каталог обновлен: {len(removed_files)} треков помечены как удаленные.")
+        except Exception as e:
+            logger.error(f"❌ Не удалось обновить каталог: {e}", exc_info=True)
+
     # --- Вывод статистики ---
     logger.info("-" * 30 + "📊 Статистика очистки:" + "-"*30)
-    logger.info(f"✅ Оставлено файлов (включая не-MP3): {kept_files_count}")
-    logger.info(f"🗑️ Удалено MP3 файлов (миксы/подкасты): {len(removed_files)}")
+    logger.info(f"✅ Оставлено файлов (включая не аудио): {kept_files_count}")
+    logger.info(f"🗑️ Удалено аудиофайлов (миксы/подкасты): {len(removed_files)}")
     if error_files:
         logger.warning(f"❌ Ошибок при удалении/обработке: {len(error_files)}")
         logger.warning("Файлы с ошибками:")
         for err_file in error_files: logger.warning(f"  - {err_file}")
 
     if removed_files:
-        logger.info("\n--- Список удаленных MP3 файлов ---")
+        logger.info("\n--- Список удаленных аудиофайлов ---")
         for file in removed_files: logger.info(f"  - {file}")
         logger.info("--- Конец списка ---")
 
     logger.info(f"\n💾 Резервная копия ОРИГИНАЛЬНОЙ папки сохранена в: {os.path.abspath(backup_dir_with_timestamp)}")
-    logger.warning("⚠️ ВАЖНО: После очистки необходимо обновить плейлисты!")
-    logger.warning("Запустите: python run_downloader.py --skip-download")
+    if not removed_files:
+        logger.info("Ничего не удалено - плейлисты обновлять не нужно.")
+    elif PLAYLIST_INCREMENTAL:
+        # Удаленные треки убираются из плейлистов без пересканирования библиотеки
+        update_playlists(DOWNLOADS_DIR, removed=removed_files)
+    else:
+        logger.warning("⚠️ ВАЖНО: После очистки необходимо обновить плейлисты!")
+        logger.warning("Запустите: python run_downloader.py --skip-download")
     logger.info(f"Лог файл сохранен в: {CLEANUP_LOG_FILE}")
     logger.info("🏁 Скрипт очистки завершил работу.")
 
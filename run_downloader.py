@@ -3,27 +3,50 @@ import os
 import sys
 import argparse
 import logging
-import pandas as pd
 from src.config import (
-    BASE_DIR, CSV_FILE, DOWNLOAD_LOG_FILE, LOG_LEVEL, DOWNLOADS_DIR,
-    PLAYLIST_JSON_FILE, PLAYLIST_M3U_FILE, PLAYLIST_JSON_SORT_ORDER
+    BASE_DIR, CSV_FILE, DATA_DIR, DOWNLOAD_LOG_FILE, LOG_LEVEL, DOWNLOADS_DIR, CATALOG_FILE,
+    PLAN_FILE, PLAYLIST_INCREMENTAL
     # УДАЛИЛИ CLEANUP_THUMBNAILS_AFTER_DOWNLOAD ОТСЮДА, ТАК КАК ОН НЕ НУЖЕН НАПРЯМУЮ ЗДЕСЬ
 )
 # --- ИЗМЕНЕНО: ИМПОРТИРУЕМ cleanup_temp_files ---
 from src.downloader import download_tracks, cleanup_temp_files
-from src.playlist import create_playlist_json, create_m3u_playlist
+from src.playlist import generate_playlists, update_playlists
+from src.catalog import TrackCatalog
+from src.planner import build_plan, write_plan, load_plan, log_plan_summary
 
-# --- Настройка логирования (без изменений) ---
-# ... (код настройки логирования) ...
+# --- Настройка логирования ---
+os.makedirs(DATA_DIR, exist_ok=True)
+log_level_map = {'DEBUG': logging.DEBUG, 'INFO': logging.INFO, 'WARNING': logging.WARNING, 'ERROR': logging.ERROR}
+log_level = log_level_map.get(LOG_LEVEL.upper(), logging.INFO)
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(DOWNLOAD_LOG_FILE, encoding='utf-8', mode='w'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logging.getLogger().handlers[1].setLevel(logging.INFO) # Консоль только INFO и выше
 logger = logging.getLogger(__name__)
 # -----------------------------
 
 def check_file_structure():
     """Проверяет наличие основных файлов и папок для запуска скачивания."""
-    # ... (код без изменений) ...
+    all_ok = True
+    if not os.path.exists(CSV_FILE) and not os.path.exists(CATALOG_FILE):
+        logger.error(f"❌ Не найден ни CSV файл {CSV_FILE}, ни каталог {CATALOG_FILE}. Сначала соберите лайки (app/liker_app.py).")
+        all_ok = False
+    if not os.path.isdir(DOWNLOADS_DIR):
+        logger.info(f"Папка {DOWNLOADS_DIR} не найдена, она будет создана.")
     return all_ok
 
-def main(skip_download_flag):
+def plan_downloads(catalog, links):
+    """Режим планирования: метаданные всех ссылок без скачивания, результат - в PLAN_FILE."""
+    plan = build_plan(links, catalog)
+    write_plan(plan, PLAN_FILE)
+    log_plan_summary(plan)
+
+def main(skip_download_flag, workers=None, transcode_workers=None, reset_failed=False, plan_only=False):
     """Основная функция запуска скачивания и генерации плейлистов."""
     logger.info("="*10 + "🚀 Запуск процесса скачивания и обновления плейлистов" + "="*10)
 
@@ -31,36 +54,55 @@ def main(skip_download_flag):
          logger.critical("Проверка структуры не пройдена. Завершение работы.")
          sys.exit(1)
 
+    catalog = TrackCatalog()
     links_to_download = []
     if not skip_download_flag:
         try:
-            logger.info(f"Чтение CSV файла: {CSV_FILE}")
-            df = pd.read_csv(CSV_FILE)
-            links_to_download = df['Link'].dropna().unique().tolist()
-            logger.info(f"🎧 Найдено {len(links_to_download)} уникальных ссылок.")
+            # CSV импортируется в каталог, только если он изменился с прошлого запуска
+            logger.info(f"Синхронизация каталога с CSV файлом: {CSV_FILE}")
+            catalog.sync_csv(CSV_FILE)
+            if reset_failed:
+                logger.info(f"🔁 Возвращено в очередь окончательно проваленных ссылок: {catalog.reset_failed()}")
+            # В работу идут только новые ссылки и ссылки с ошибками - O(изменений), а не O(библиотеки)
+            links_to_download = catalog.pending_links()
+            logger.info(f"🎧 Ссылок к обработке: {len(links_to_download)} (всего в каталоге: {catalog.count_links()}).")
             if not links_to_download:
-                logger.warning("⚠️ CSV файл пуст или не содержит ссылок. Скачивание не начнется.")
-        except FileNotFoundError:
-            logger.error(f"❌ Файл {CSV_FILE} не найден. Нечего скачивать.")
-            sys.exit(1)
+                logger.info("Новых ссылок нет, скачивание не требуется.")
         except Exception as e:
             logger.critical(f"❌ Не удалось загрузить или обработать CSV файл {CSV_FILE}: {e}", exc_info=True)
             sys.exit(1)
+        if plan_only:
+            plan_downloads(catalog, links_to_download)
+            catalog.close()
+            logger.info("🏁 Планирование завершено, скачивание не выполнялось.")
+            return
     else:
         logger.info("⏩ Скачивание пропущено (флаг --skip-download).")
 
     # --- Скачивание треков ---
+    processed_files = []
     if not skip_download_flag and links_to_download:
-        download_tracks(links_to_download)
+        # План (run_downloader.py --plan) избавляет от повторного запроса метаданных
+        plan = load_plan(PLAN_FILE)
+        processed_files = download_tracks(links_to_download, workers=workers, transcode_workers=transcode_workers, catalog=catalog, plan=plan)[0]
+        if plan is not None and catalog.batch_finished():
+            os.remove(PLAN_FILE) # План использован; после прерванного пакета он еще нужен для докачки
         # --- ВЫЗОВ ФУНКЦИИ ОЧИСТКИ ОСТАЕТСЯ ---
         # Функция теперь импортирована из src.downloader
         cleanup_temp_files()
         # --- КОНЕЦ ВЫЗОВА ---
-    elif not links_to_download and not skip_download_flag:
-         logger.info("Ссылок для скачивания нет.")
 
     # --- Генерация плейлистов (всегда) ---
-    # ... (код без изменений) ...
+    if not os.path.isdir(DOWNLOADS_DIR):
+        logger.warning(f"Папка {DOWNLOADS_DIR} не найдена. Плейлисты не могут быть созданы.")
+    else:
+        if PLAYLIST_INCREMENTAL and not skip_download_flag:
+            # В плейлисты вставляются только новые треки; при расхождении с папкой - полная пересборка
+            update_playlists(DOWNLOADS_DIR, added=processed_files, catalog=catalog)
+        else:
+            # Одно сканирование библиотеки на все форматы (PLAYLIST_FORMATS)
+            generate_playlists(DOWNLOADS_DIR, catalog=catalog)
+    catalog.close()
 
     logger.info("🏁 Процесс завершен.")
     logger.info(f"Лог файл сохранен в: {DOWNLOAD_LOG_FILE}")
@@ -72,5 +114,28 @@ if __name__ == "__main__":
         action='store_true',
         help='Пропустить фазу скачивания и только обновить плейлисты.'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Количество параллельных потоков скачивания (по умолчанию DOWNLOAD_WORKERS из config.py).'
+    )
+    parser.add_argument(
+        '--transcode-workers',
+        type=int,
+        default=None,
+        help='Количество потоков ffmpeg/тегов/обложек (по умолчанию TRANSCODE_WORKERS или число ядер).'
+    )
+    parser.add_argument(
+        '--reset-failed',
+        action='store_true',
+        help='Вернуть в очередь ссылки, помеченные как окончательно проваленные (failed).'
+    )
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='Только планирование: получить метаданные ссылок, применить фильтр и сохранить план без скачивания.'
+    )
     args = parser.parse_args()
-    main(skip_download_flag=args.skip_download)
\ No newline at end of file
+    main(skip_download_flag=args.skip_download, workers=args.workers, transcode_workers=args.transcode_workers,
+         reset_failed=args.reset_failed, plan_only=args.plan)
\ No newline at end of file
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import logging
+import argparse
+from src.config import DATA_DIR, SERVER_HOST, SERVER_PORT, SERVER_LOG_FILE, LOG_LEVEL
+from src.server import serve
+
+# --- Настройка логирования ---
+os.makedirs(DATA_DIR, exist_ok=True)
+log_level_map = {'DEBUG': logging.DEBUG, 'INFO': logging.INFO, 'WARNING': logging.WARNING, 'ERROR': logging.ERROR}
+log_level = log_level_map.get(LOG_LEVEL.upper(), logging.INFO)
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(SERVER_LOG_FILE, encoding='utf-8', mode='w'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logging.getLogger().handlers[1].setLevel(logging.INFO) # Консоль только INFO и выше
+logger = logging.getLogger(__name__)
+# -----------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальный сервер веб-плеера: web_player/ и downloads/ с поддержкой перемотки и кэширования.")
+    parser.add_argument('--host', default=SERVER_HOST, help=f'Адрес (по умолчанию {SERVER_HOST}; 127.0.0.1 - только этот компьютер).')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help=f'Порт (по умолчанию {SERVER_PORT}).')
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import logging
+import threading
+from urllib.parse import urlsplit
+
+from .config import DOWNLOADS_DIR
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Ссылки вида https://api.soundcloud.com/tracks/123456 или soundcloud:tracks:123456
+SOUNDCLOUD_TRACK_ID_RE = re.compile(r'(?:/tracks/|soundcloud:tracks:)(\d+)')
+
+
+def normalize_link(link):
+    """Приводит ссылку к каноническому виду: без схемы, www./m., query, fragment и слеша в конце."""
+    if not isinstance(link, str):
+        return ""
+    link = link.strip()
+    parts = urlsplit(link if '://' in link else f"https://{link}")
+    host = parts.netloc.lower()
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return f"{host}{parts.path.rstrip('/')}".lower()
+
+
+def make_archive_id(info):
+    """Строит ID записи архива в формате yt-dlp ('<extractor> <id>'). None, если данных не хватает."""
+    if not info:
+        return None
+    extractor = info.get('extractor_key') or info.get('ie_key')
+    track_id = info.get('id')
+    if not extractor or track_id is None:
+        return None
+    return f"{extractor.lower()} {track_id}"
+
+
+class ArchiveIndex:
+    """
+    In-memory индекс скачанных треков, строится ОДИН раз за запуск из каталога
+    (src.catalog.TrackCatalog). Позволяет пропускать уже скачанные ссылки без
+    единого сетевого запроса, а проверку в match_filter - без обращения к базе.
+    Все изменения сразу записываются в каталог.
+    """
+
+    def __init__(self, catalog, downloads_dir=DOWNLOADS_DIR):
+        self.catalog = catalog
+        self.downloads_dir = downloads_dir
+        self._lock = threading.Lock()
+        # archive_ids: ID архива; links: нормализованная ссылка -> (ID архива, имя файла)
+        self.archive_ids, self.links = catalog.archive_snapshot()
+        logger.info(f"🗂️ Индекс архива: {len(self.archive_ids)} записей, {len(self.links)} известных ссылок.")
+
+    def lookup(self, link):
+        """
+        Проверяет ссылку БЕЗ сети.
+        Возвращает (True, путь_к_MP3_или_None), если ссылка уже в архиве, иначе (False, None).
+        """
+        archive_id, filename = self.links.get(normalize_link(link), (None, None))
+        if archive_id is None and filename is None:
+            # Ссылка с явным ID трека SoundCloud узнается и без записи в каталоге
+            match = SOUNDCLOUD_TRACK_ID_RE.search(link or "")
+            if not match or f"soundcloud {match.group(1)}" not in self.archive_ids:
+                return False, None
+        return True, os.path.join(self.downloads_dir, filename) if filename else None
+
+    def contains(self, info):
+        """Аналог YoutubeDL.in_download_archive для info из yt-dlp."""
+        archive_id = make_archive_id(info)
+        return archive_id is not None and archive_id in self.archive_ids
+
+    def _track_fields(self, info):
+        return {
+            'archive_id': make_archive_id(info),
+            'track_id': str(info['id']) if info and info.get('id') is not None else None,
+            'title': info.get('title') if info else None,
+        }
+
+    def remember(self, link, info, filepath):
+        """Запоминает соответствие ссылка -> ID -> файл для трека, уже бывшего в архиве."""
+        filename = os.path.basename(filepath) if filepath else None
+        fields = self._track_fields(info)
+        with self._lock:
+            self.links[normalize_link(link)] = (fields['archive_id'], filename)
+        self.catalog.mark_downloaded(link, file_path=filename, **fields)
+
+    def record(self, link, info, filepath):
+        """Записывает полностью обработанный трек в каталог как скачанный."""
+        fields = self._track_fields(info)
+        if fields['archive_id'] is None:
+            logger.warning(f"Не удалось построить ID архива для {link}, запись только по ссылке.")
+        filename = os.path.basename(filepath) if filepath else None
+        with self._lock:
+            if fields['archive_id']: self.archive_ids.add(fields['archive_id'])
+            self.links[normalize_link(link)] = (fields['archive_id'], filename)
+        self.catalog.mark_downloaded(link, file_path=filename, **fields)
+
+    def checkpoint(self, link, filepath):
+        """Запоминает незавершенный файл ссылки, чтобы после сбоя докачать его, а не начинать заново."""
+        self.catalog.set_work_file(link, os.path.basename(filepath) if filepath else None)
+
+    def mark_filtered(self, link, info, reason):
+        """Ссылка отсеяна фильтром - при следующем запуске повторно не проверяется."""
+        self.catalog.mark_filtered(link, reason, **self._track_fields(info))
+
+    def mark_error(self, link, reason, info=None):
+        """
+        Ошибка обработки ссылки: каталог планирует повтор с backoff или помечает ее
+        окончательно проваленной. Возвращает (status, attempts, next_attempt_at).
+        """
+        return self.catalog.mark_error(link, reason, **self._track_fields(info))
@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+import os
+import csv
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+from .config import CATALOG_FILE, CSV_FILE, DOWNLOAD_ARCHIVE, DOWNLOAD_INDEX_FILE
+from .archive import normalize_link
+from .retry import plan_retry
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Статусы ссылок в таблице tracks
+STATUS_PENDING = 'pending' # Известна, еще не обрабатывалась
+STATUS_DOWNLOADED = 'downloaded' # Скачана и обработана
+STATUS_FILTERED = 'filtered' # Отсеяна фильтром (микс/подкаст/длительность)
+STATUS_ERROR = 'error' # Временная ошибка, ждет повтора (next_attempt_at)
+STATUS_FAILED = 'failed' # Постоянная ошибка или исчерпаны попытки - больше не скачиваем
+STATUS_REMOVED = 'removed' # Скачана, но удалена при очистке (повторно не качаем)
+
+# Статусы, при которых ссылка считается "в архиве" и не скачивается повторно
+ARCHIVED_STATUSES = (STATUS_DOWNLOADED, STATUS_REMOVED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    link TEXT UNIQUE,          -- нормализованная ссылка (NULL для записей из старого архива)
+    url TEXT,                  -- исходная ссылка из CSV/скрапера
+    archive_id TEXT,           -- ID в формате архива yt-dlp: '<extractor> <id>'
+    track_id TEXT,             -- ID трека SoundCloud
+    title TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    reason TEXT,               -- причина фильтрации/ошибки
+    file_path TEXT,            -- имя итогового файла в DOWNLOADS_DIR
+    attempts INTEGER NOT NULL DEFAULT 0, -- неудачных попыток подряд
+    next_attempt_at REAL,      -- когда можно повторить (для status='error')
+    work_file TEXT,            -- незавершенный файл (.part/исходник до перекодирования) для возобновления
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tracks_archive_id ON tracks(archive_id);
+CREATE INDEX IF NOT EXISTS idx_tracks_status ON tracks(status);
+CREATE INDEX IF NOT EXISTS idx_tracks_file_path ON tracks(file_path);
+
+CREATE TABLE IF NOT EXISTS library (
+    file_path TEXT PRIMARY KEY, -- имя файла в DOWNLOADS_DIR
+    size INTEGER,
+    mtime REAL,
+    title TEXT,
+    artist TEXT,
+    duration INTEGER,
+    cover TEXT,                 -- имя файла обложки в DOWNLOADS_DIR ('' если нет)
+    art_source TEXT,            -- из какого файла сделаны уменьшенные обложки (обложка или сам трек)
+    art_mtime REAL,             -- mtime источника на момент создания
+    art_thumb TEXT,             -- иконка в COVER_THUMBS_DIR ('' - обложки нет)
+    art_cover TEXT,             -- большая обложка в COVER_THUMBS_DIR
+    updated_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class TrackCatalog:
+    """
+    Единый SQLite-каталог треков: ссылки и их статусы (вместо liked_tracks.csv и
+    downloaded.txt) и состояние файлов в DOWNLOADS_DIR с метаданными (вместо
+    повторного сканирования папки и чтения тегов).
+    Соединение общее для потоков, запись - только внутри transaction().
+    """
+
+    def __init__(self, db_file=CATALOG_FILE):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        # WAL позволяет Streamlit-приложению и скриптам работать с каталогом одновременно
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate_schema()
+        self._import_legacy_archive()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @contextmanager
+    def transaction(self):
+        """Транзакция с блокировкой: все изменения применяются атомарно."""
+        with self._lock:
+            with self._conn:
+                yield self._conn
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # --- Служебные значения ---
+    def get_meta(self, key, default=None):
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0]['value'] if rows else default
+
+    def set_meta(self, key, value):
+        with self.transaction() as conn:
+            self._set_meta(conn, key, value)
+
+    def _set_meta(self, conn, key, value):
+        conn.execute(
+            "INSERT INTO meta(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value))
+        )
+
+    def _migrate_schema(self):
+        """Добавляет колонки, появившиеся после создания базы."""
+        columns = {row['name'] for row in self._query("PRAGMA table_info(tracks)")}
+        library_columns = {row['name'] for row in self._query("PRAGMA table_info(library)")}
+        with self.transaction() as conn:
+            if 'attempts' not in columns:
+                conn.execute("ALTER TABLE tracks ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            if 'next_attempt_at' not in columns:
+                conn.execute("ALTER TABLE tracks ADD COLUMN next_attempt_at REAL")
+            if 'work_file' not in columns:
+                conn.execute("ALTER TABLE tracks ADD COLUMN work_file TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tracks_next_attempt ON tracks(status, next_attempt_at)")
+            for column, column_type in (('art_source', 'TEXT'), ('art_mtime', 'REAL'), ('art_thumb', 'TEXT'), ('art_cover', 'TEXT')):
+                if column not in library_columns:
+                    conn.execute(f"ALTER TABLE library ADD COLUMN {column} {column_type}")
+
+    # --- Миграция со старых файлов ---
+    def _import_legacy_archive(self):
+        """Однократно переносит downloaded.txt и downloaded_index.tsv в каталог."""
+        if self.get_meta('legacy_archive_imported'):
+            return
+        archive_ids = []
+        index_rows = []
+        try:
+            with open(DOWNLOAD_ARCHIVE, 'r', encoding='utf-8') as f:
+                archive_ids = [line.strip() for line in f if line.strip()]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка чтения старого архива {DOWNLOAD_ARCHIVE}: {e}")
+        try:
+            with open(DOWNLOAD_INDEX_FILE, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) == 3 and parts[0] and parts[1]:
+                        index_rows.append(parts)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка чтения индекса архива {DOWNLOAD_INDEX_FILE}: {e}")
+
+        now = time.time()
+        with self.transaction() as conn:
+            known_ids = set()
+            for link, archive_id, filename in index_rows:
+                self._upsert_link(conn, link, None, archive_id=archive_id, status=STATUS_DOWNLOADED,
+                                  file_path=filename or None, now=now)
+                known_ids.add(archive_id)
+            for archive_id in archive_ids:
+                if archive_id in known_ids: continue
+                conn.execute(
+                    "INSERT INTO tracks(archive_id, track_id, status, updated_at) VALUES(?, ?, ?, ?)",
+                    (archive_id, archive_id.split(' ', 1)[-1], STATUS_DOWNLOADED, now)
+                )
+            self._set_meta(conn, 'legacy_archive_imported', now)
+        if archive_ids or index_rows:
+            logger.info(f"🗃️ В каталог перенесено записей старого архива: {len(archive_ids)}, ссылок из индекса: {len(index_rows)}.")
+
+    def sync_csv(self, csv_file=CSV_FILE):
+        """
+        Импортирует ссылки из CSV (колонки Title, Link), только если файл изменился
+        с прошлого импорта. Возвращает количество новых ссылок.
+        """
+        try:
+            stat = os.stat(csv_file)
+        except FileNotFoundError:
+            return 0
+        signature = f"{stat.st_size}:{stat.st_mtime}"
+        if self.get_meta('csv_signature') == signature:
+            logger.debug(f"CSV {csv_file} не изменился с прошлого импорта.")
+            return 0
+        entries = []
+        with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                link = (row.get('Link') or '').strip()
+                if link: entries.append(((row.get('Title') or '').strip(), link))
+        added = self.add_links(entries, csv_signature=signature)
+        logger.info(f"🗃️ CSV импортирован в каталог: {len(entries)} ссылок, новых: {added}.")
+        return added
+
+    def mark_csv_imported(self, csv_file=CSV_FILE):
+        """Запоминает текущую версию CSV как уже импортированную (CSV записан из каталога)."""
+        try:
+            stat = os.stat(csv_file)
+        except FileNotFoundError:
+            return
+        with self.transaction() as conn:
+            self._set_meta(conn, 'csv_signature', f"{stat.st_size}:{stat.st_mtime}")
+
+    # --- Ссылки ---
+    def _upsert_link(self, conn, link, url, now, overwrite=(), **fields):
+        """
+        Вставляет/обновляет строку по нормализованной ссылке.
+        Пустые поля не затирают старые, кроме колонок из overwrite.
+        """
+        key = normalize_link(link)
+        columns = ['link', 'url', 'updated_at'] + list(fields)
+        values = [key, url, now] + list(fields.values())
+        updates = ", ".join(
+            f"{col} = excluded.{col}" if col in overwrite else f"{col} = COALESCE(excluded.{col}, {col})"
+            for col in columns if col != 'link'
+        )
+        conn.execute(
+            f"INSERT INTO tracks({', '.join(columns)}) VALUES({', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT(link) DO UPDATE SET {updates}",
+            values
+        )
+        archive_id = fields.get('archive_id')
+        if archive_id:
+            # Запись старого архива без ссылки теперь описывается строкой со ссылкой
+            conn.execute("DELETE FROM tracks WHERE archive_id = ? AND link IS NULL", (archive_id,))
+
+    def add_links(self, entries, csv_signature=None):
+        """Добавляет пары (title, link) со статусом pending. Возвращает число новых ссылок."""
+        now = time.time()
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO tracks(link, url, title, status, updated_at) VALUES(?, ?, ?, ?, ?) "
+                "ON CONFLICT(link) DO NOTHING",
+                [(normalize_link(link), link, title or None, STATUS_PENDING, now) for title, link in entries]
+            )
+            added = conn.total_changes - before
+            if csv_signature is not None:
+                self._set_meta(conn, 'csv_signature', csv_signature)
+        return added
+
+    def pending_links(self, now=None):
+        """
+        Ссылки, которые нужно обработать: сначала новые (в порядке добавления),
+        затем ошибки, у которых наступило время повтора (раньше назначенные - раньше).
+        """
+        now = time.time() if now is None else now
+        rows = self._query(
+            "SELECT url, link FROM tracks "
+            "WHERE link IS NOT NULL AND (status = ? OR (status = ? AND COALESCE(next_attempt_at, 0) <= ?)) "
+            "ORDER BY status = ?, COALESCE(next_attempt_at, 0), id",
+            (STATUS_PENDING, STATUS_ERROR, now, STATUS_ERROR)
+        )
+        return [row['url'] or f"https://{row['link']}" for row in rows]
+
+    def deferred_links(self, now=None):
+        """
+        Ссылки, которые сейчас скачивать НЕ нужно: ждут повтора или окончательно провалены.
+        Словарь нормализованная_ссылка -> (status, next_attempt_at, reason).
+        """
+        now = time.time() if now is None else now
+        rows = self._query(
+            "SELECT link, status, next_attempt_at, reason FROM tracks "
+            "WHERE link IS NOT NULL AND (status = ? OR (status = ? AND next_attempt_at > ?))",
+            (STATUS_FAILED, STATUS_ERROR, now)
+        )
+        return {row['link']: (row['status'], row['next_attempt_at'], row['reason']) for row in rows}
+
+    def retry_due(self, links, within=0, now=None):
+        """
+        Из переданных ссылок выбирает ожидающие повтора, время которых наступит в ближайшие
+        within секунд. Возвращает список (url, next_attempt_at), отсортированный по времени.
+        """
+        now = time.time() if now is None else now
+        keys = {normalize_link(link): link for link in links}
+        if not keys:
+            return []
+        due = []
+        for row in self._query(
+            "SELECT link, next_attempt_at FROM tracks WHERE status = ? AND COALESCE(next_attempt_at, 0) <= ?",
+            (STATUS_ERROR, now + within)
+        ):
+            if row['link'] in keys:
+                due.append((keys[row['link']], row['next_attempt_at'] or now))
+        return sorted(due, key=lambda item: item[1])
+
+    def retry_summary(self):
+        """Сводка очереди повторов: (ожидают, ближайший_повтор_или_None, окончательно_провалены)."""
+        row = self._query(
+            "SELECT SUM(status = ?) AS waiting, MIN(CASE WHEN status = ? THEN next_attempt_at END) AS next_at, "
+            "SUM(status = ?) AS failed FROM tracks",
+            (STATUS_ERROR, STATUS_ERROR, STATUS_FAILED)
+        )[0]
+        return row['waiting'] or 0, row['next_at'], row['failed'] or 0
+
+    def reset_failed(self):
+        """Возвращает окончательно проваленные ссылки в очередь. Возвращает их количество."""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tracks SET status = ?, attempts = 0, next_attempt_at = NULL, updated_at = ? WHERE status = ?",
+                (STATUS_PENDING, time.time(), STATUS_FAILED)
+            )
+            return cursor.rowcount
+
+    def count_links(self):
+        return self._query("SELECT COUNT(*) AS n FROM tracks WHERE link IS NOT NULL")[0]['n']
+
+    def all_links(self):
+        """Все известные ссылки (title, url) - для экспорта в CSV."""
+        rows = self._query("SELECT title, url, link FROM tracks WHERE link IS NOT NULL ORDER BY id")
+        return [(row['title'] or '', row['url'] or f"https://{row['link']}") for row in rows]
+
+    def archive_snapshot(self):
+        """
+        Снимок архива для ArchiveIndex одним запросом:
+        (множество ID архива, словарь нормализованная_ссылка -> (ID архива, имя файла)).
+        """
+        rows = self._query(
+            f"SELECT link, archive_id, file_path FROM tracks WHERE status IN ({', '.join('?' for _ in ARCHIVED_STATUSES)})",
+            ARCHIVED_STATUSES
+        )
+        archive_ids = {row['archive_id'] for row in rows if row['archive_id']}
+        links = {row['link']: (row['archive_id'], row['file_path']) for row in rows if row['link']}
+        return archive_ids, links
+
+    def set_link_status(self, link, status, url=None, archive_id=None, track_id=None, title=None, reason=None,
+                        file_path=None, attempts=0, next_attempt_at=None):
+        """
+        Обновляет состояние одной ссылки в отдельной транзакции
+        (счетчик попыток и незавершенный файл сбрасываются).
+        """
+        with self.transaction() as conn:
+            self._upsert_link(
+                conn, link, url, now=time.time(), overwrite=('attempts', 'next_attempt_at', 'work_file'),
+                status=status, archive_id=archive_id, track_id=track_id, title=title, reason=reason or '',
+                file_path=file_path, attempts=attempts, next_attempt_at=next_attempt_at, work_file=None
+            )
+
+    def set_work_file(self, link, filename):
+        """Контрольная точка: ссылка сейчас качается/обрабатывается в файл filename."""
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE tracks SET work_file = ?, updated_at = ? WHERE link = ?",
+                (filename, time.time(), normalize_link(link))
+            )
+
+    def work_files(self):
+        """
+        Незавершенные файлы из контрольных точек:
+        (файлы ссылок, которые еще будут обрабатываться, файлы завершенных ссылок).
+        """
+        resumable, finished = set(), set()
+        for row in self._query(
+            "SELECT work_file, status FROM tracks WHERE work_file IS NOT NULL "
+            "AND work_file NOT IN (SELECT file_path FROM tracks WHERE file_path IS NOT NULL)"
+        ):
+            (resumable if row['status'] in (STATUS_PENDING, STATUS_ERROR) else finished).add(row['work_file'])
+        return resumable, finished
+
+    def begin_batch(self, total):
+        """
+        Отмечает начало пакета скачивания. Возвращает время начала прерванного
+        предыдущего пакета или None, если предыдущий завершился штатно.
+        """
+        started, finished = self.get_meta('batch_started_at'), self.get_meta('batch_finished_at')
+        interrupted = float(started) if started and (not finished or float(finished) < float(started)) else None
+        with self.transaction() as conn:
+            self._set_meta(conn, 'batch_started_at', time.time())
+            self._set_meta(conn, 'batch_total', total)
+        return interrupted
+
+    def finish_batch(self):
+        self.set_meta('batch_finished_at', time.time())
+
+    def batch_finished(self):
+        """Завершился ли последний пакет скачивания штатно (finish_batch после begin_batch)."""
+        started, finished = self.get_meta('batch_started_at'), self.get_meta('batch_finished_at')
+        return bool(finished) and (not started or float(finished) >= float(started))
+
+    def mark_downloaded(self, link, file_path=None, **fields):
+        self.set_link_status(link, STATUS_DOWNLOADED, url=link, file_path=file_path, **fields)
+
+    def mark_filtered(self, link, reason, **fields):
+        self.set_link_status(link, STATUS_FILTERED, url=link, reason=reason, **fields)
+
+    def mark_error(self, link, reason, **fields):
+        """
+        Записывает неудачную попытку и планирует повтор (src.retry.plan_retry):
+        временная ошибка -> status='error' с next_attempt_at, постоянная -> status='failed'.
+        Возвращает (status, attempts, next_attempt_at).
+        """
+        with self.transaction() as conn:
+            rows = conn.execute("SELECT attempts FROM tracks WHERE link = ?", (normalize_link(link),)).fetchall()
+            attempts = (rows[0]['attempts'] if rows else 0) + 1
+            permanent, next_attempt_at = plan_retry(attempts, reason)
+            status = STATUS_FAILED if permanent else STATUS_ERROR
+            self._upsert_link(
+                conn, link, link, now=time.time(), overwrite=('attempts', 'next_attempt_at'),
+                status=status, reason=reason or '', attempts=attempts, next_attempt_at=next_attempt_at, **fields
+            )
+        return status, attempts, next_attempt_at
+
+    # --- Библиотека файлов ---
+    def library_rows(self):
+        """Словарь имя_файла -> строка library (size, mtime, title, artist, duration, cover, art_*)."""
+        return {row['file_path']: row for row in self._query("SELECT * FROM library")}
+
+    def update_library(self, changed, removed=()):
+        """
+        Применяет изменения библиотеки одной транзакцией.
+        changed - список словарей с ключами file_path, size, mtime, title, artist, duration, cover
+        (и необязательными art_source, art_mtime, art_thumb, art_cover);
+        removed - имена файлов, которых больше нет на диске.
+        """
+        now = time.time()
+        art_defaults = dict.fromkeys(('art_source', 'art_mtime', 'art_thumb', 'art_cover'))
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO library(file_path, size, mtime, title, artist, duration, cover, "
+                "art_source, art_mtime, art_thumb, art_cover, updated_at) "
+                "VALUES(:file_path, :size, :mtime, :title, :artist, :duration, :cover, "
+                ":art_source, :art_mtime, :art_thumb, :art_cover, :updated_at) "
+                "ON CONFLICT(file_path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, "
+                "title = excluded.title, artist = excluded.artist, duration = excluded.duration, "
+                "cover = excluded.cover, art_source = excluded.art_source, art_mtime = excluded.art_mtime, "
+                "art_thumb = excluded.art_thumb, art_cover = excluded.art_cover, updated_at = excluded.updated_at",
+                [{**art_defaults, **item, 'updated_at': now} for item in changed]
+            )
+            conn.executemany("DELETE FROM library WHERE file_path = ?", [(name,) for name in removed])
+
+    def mark_removed(self, filenames):
+        """Файлы удалены при очистке: убираем из библиотеки, ссылки помечаем removed."""
+        now = time.time()
+        with self.transaction() as conn:
+            for name in filenames:
+                conn.execute("DELETE FROM library WHERE file_path = ?", (name,))
+                conn.execute(
+                    "UPDATE tracks SET status = ?, updated_at = ? WHERE file_path = ?",
+                    (STATUS_REMOVED, now, name)
+                )
@@ -9,8 +9,14 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 CSV_FILE = os.path.join(DATA_DIR, 'liked_tracks.csv')
 DOWNLOAD_ARCHIVE = os.path.join(DATA_DIR, 'downloaded.txt')
+DOWNLOAD_INDEX_FILE = os.path.join(DATA_DIR, 'downloaded_index.tsv') # Ссылка -> ID архива -> MP3 (для пропуска без сети)
+# Единый SQLite-каталог: ссылки, статусы, файлы и их метаданные.
+# downloaded.txt и downloaded_index.tsv импортируются в него один раз, CSV - при каждом изменении.
+CATALOG_FILE = os.path.join(DATA_DIR, 'catalog.sqlite3')
 DOWNLOAD_LOG_FILE = os.path.join(DATA_DIR, 'download_log.txt')
+TRACK_TIMINGS_FILE = os.path.join(DATA_DIR, 'download_timings.jsonl') # Замеры по каждому треку (JSON Lines)
 CLEANUP_LOG_FILE = os.path.join(DATA_DIR, 'cleanup_log.txt')
+SERVER_LOG_FILE = os.path.join(DATA_DIR, 'server_log.txt')
 
 # --- Пути для Медиа и Плейлистов ---
 DOWNLOADS_DIR = os.path.join(BASE_DIR, 'downloads')
@@ -18,15 +24,60 @@ DOWNLOADS_DIR = os.path.join(BASE_DIR, 'downloads')
 BACKUP_DIR_BASE = os.path.join(BASE_DIR, 'downloads_backup')
 WEB_PLAYER_DIR = os.path.join(BASE_DIR, 'web_player')
 PLAYLIST_JSON_FILE = os.path.join(WEB_PLAYER_DIR, 'playlist.json') # JSON кладем к плееру
+PLAYLIST_PAGES_DIR = os.path.join(WEB_PLAYER_DIR, 'playlist_pages') # Страницы плейлиста (при PLAYLIST_PAGE_SIZE > 0)
+PLAYLIST_SEARCH_INDEX_FILE = os.path.join(WEB_PLAYER_DIR, 'search_index.json') # Поисковый индекс для плеера
 PLAYLIST_M3U_FILE = os.path.join(DATA_DIR, 'liked_playlist.m3u') # M3U можно в data
+PLAYLIST_XSPF_FILE = os.path.join(DATA_DIR, 'liked_playlist.xspf') # XSPF (если включен в PLAYLIST_FORMATS)
+# Уменьшенные обложки для плеера (имя - хэш содержимого); рядом с треками, чтобы пути делили префикс '../downloads/'
+COVER_THUMBS_DIR = os.path.join(DOWNLOADS_DIR, '.covers')
 
 # --- Настройки Скачивания (yt-dlp) ---
 MP3_QUALITY = '192' # Качество MP3 ('128', '192', '320', 'V0' ~ VBR)
+# Режим без перекодирования: аудио в подходящем кодеке сохраняется как есть (ffmpeg только
+# перекладывает поток в контейнер без декодирования), в MP3 перекодируется только остальное
+KEEP_SOURCE_CODECS = True
+ACCEPTABLE_CODECS = ['mp3', 'opus', 'aac'] # Кодеки, которые веб-плеер воспроизводит без перекодирования
+# Расширения аудиофайлов библиотеки (плейлисты, метаданные, очистка)
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.opus', '.ogg', '.aac')
 EMBED_THUMBNAIL = True # Встраивать ли обложку в MP3
 WRITE_METADATA = True # Записывать ли метаданные (исполнитель, название)
 CLEANUP_THUMBNAILS_AFTER_DOWNLOAD = False # Удалять ли .jpg/.webp после скачивания
+DOWNLOAD_WORKERS = 4 # Количество параллельных потоков скачивания (у каждого свой YoutubeDL)
+TRANSCODE_WORKERS = None # Потоков ffmpeg/тегов/обложек на CPU-этапе (None = число ядер)
+# План скачивания (run_downloader.py --plan): метаданные всех ссылок без скачивания
+PLAN_FILE = os.path.join(DATA_DIR, 'download_plan.json')
+PLAN_WORKERS = 8 # Потоков для получения метаданных при планировании
+PLAN_MAX_AGE_SECONDS = 3 * 60 * 60 # Более старый план не используется (ссылки на аудио истекают)
 # SKIP_DOWNLOADS = False # Управляется через аргументы командной строки в run_downloader.py
 
+# --- Ограничение Частоты Запросов к SoundCloud ---
+RATE_LIMIT_ENABLED = True # Общий адаптивный лимитер запросов для всех воркеров
+RATE_LIMIT_INITIAL_RPS = 4.0 # Начальная частота HTTP-запросов в секунду
+RATE_LIMIT_MIN_RPS = 0.2 # Ниже этой частоты лимит не опускается
+RATE_LIMIT_MAX_RPS = 20.0 # Выше этой частоты лимит не поднимается
+RATE_LIMIT_BURST = 8 # Сколько запросов можно сделать подряд без ожидания
+RATE_LIMIT_RAMP_AFTER = 20 # После стольких успешных запросов подряд лимит повышается
+RATE_LIMIT_RAMP_STEP_RPS = 0.5 # На сколько повышается частота за один шаг
+RATE_LIMIT_COOLDOWN_SECONDS = 30 # Пауза после 429/5xx без Retry-After или сетевого сбоя (удваивается при повторах)
+RATE_LIMIT_MAX_COOLDOWN_SECONDS = 10 * 60 # Максимальная пауза
+RATE_LIMIT_THROTTLE_STATUSES = [429, 500, 502, 503, 504] # Ответы, на которые лимит снижается
+
+# --- Настройки Повторов Неудачных Скачиваний ---
+RETRY_MAX_ATTEMPTS = 6 # После стольких неудач ссылка больше не скачивается
+RETRY_BASE_DELAY_SECONDS = 60 # Задержка после первой неудачи, дальше удваивается
+RETRY_MAX_DELAY_SECONDS = 24 * 60 * 60 # Максимальная задержка между попытками
+RETRY_JITTER = 0.5 # Доля случайного уменьшения задержки (0 - без разброса)
+RETRY_INLINE_MAX_WAIT_SECONDS = 90 # Повторы, которые наступят в этом окне, выполняются в том же запуске
+# Сообщения yt-dlp/SoundCloud, при которых повторять бессмысленно (приватный/удаленный трек, неверный URL).
+# Строка ищется в тексте ошибки целиком (без учета регистра), кортеж - все его фрагменты сразу.
+# Общие слова ('private', 'JSON metadata') сами по себе не годятся: они есть и во временных ошибках
+PERMANENT_ERROR_MARKERS = [
+    'is not a valid URL', 'Unsupported URL',
+    'HTTP Error 404: Not Found', 'HTTP Error 410: Gone',
+    'This track is private', 'This track was removed', 'This track has been removed',
+    ('HTTP Error 401', 'private'), ('HTTP Error 403', 'private'),
+]
+
 # --- Настройки Фильтрации Треков ---
 # Максимальная длительность в секундах для "трека"
 MAX_TRACK_DURATION_SECONDS = 15 * 60 # 15 минут
@@ -40,9 +91,44 @@ PODCAST_KEYWORDS = [
 ]
 
 # --- Настройки Генерации Плейлиста ---
+# Какие плейлисты создавать после скачивания: 'json', 'm3u', 'xspf' (библиотека сканируется один раз)
+PLAYLIST_FORMATS = ['json', 'm3u']
+# После скачивания/очистки в плейлисты вносятся только изменения (полная пересборка - при расхождении с папкой или --skip-download)
+PLAYLIST_INCREMENTAL = True
 INCLUDE_DURATION_IN_JSON = True # Добавлять ли длительность в playlist.json
 # Сортировка JSON: 'title' (по названию), 'artist' (по исполнителю), 'none' (порядок файловой системы)
 PLAYLIST_JSON_SORT_ORDER = 'title'
+# Размер страницы: playlist.json становится манифестом, треки - в страницах PLAYLIST_PAGES_DIR
+# (плеер показывает первую страницу сразу, остальные догружает). 0 - весь плейлист одним файлом
+PLAYLIST_PAGE_SIZE = 500
+PLAYLIST_COMPACT = True # Минифицированный JSON, общий префикс путей ('../downloads/') хранится один раз
+PLAYLIST_COLUMNAR = False # Треки массивами по полям вместо массивов-строк (лучше сжимается)
+PLAYLIST_PRECOMPRESS = True # Писать рядом .gz (и .br, если установлен brotli) для веб-сервера
+PLAYLIST_SEARCH_INDEX = True # Строить поисковый индекс (слова названия/исполнителя без диакритики -> треки)
+# Обложки для плеера: уменьшенные копии в COVER_THUMBS_DIR вместо исходных картинок yt-dlp (нужен ffmpeg).
+# Если файла обложки рядом с треком нет, берется встроенная в аудио (APIC/covr/METADATA_BLOCK_PICTURE).
+# Пересоздаются только при изменении mtime источника
+PLAYLIST_COVER_THUMBS = True
+PLAYLIST_COVER_THUMB_SIZE = 80 # Иконка строки списка, px (квадрат; CSS-размер 40px x2 для HiDPI)
+PLAYLIST_COVER_SIZE = 600 # Большая обложка плеера, px по большей стороне (меньшие не увеличиваются)
+PLAYLIST_COVER_WORKERS = None # Параллельных ffmpeg (None = число ядер)
+# Предзагрузка следующего трека в веб-плеере (пишется в playlist.json): треки до этого размера
+# (оценка по длительности) загружаются целиком, у более длинных - только начало. 0 - не предзагружать
+PLAYER_PRELOAD_MAX_BYTES = 32 * 1024 * 1024
+# Параллельное чтение тегов новых/измененных файлов при сборке плейлистов
+PLAYLIST_METADATA_WORKERS = None # Размер пула (None = число ядер, 1 = последовательно)
+PLAYLIST_METADATA_POOL = 'thread' # 'thread' (чтение заголовков упирается в диск/NFS) или 'process' (mutagen на CPU)
+PLAYLIST_METADATA_CHUNK_SIZE = 32 # Файлов на одну задачу пула процессов (меньше накладных расходов на IPC)
+
+# --- Настройки Сервера Веб-плеера (для run_server.py) ---
+SERVER_HOST = '0.0.0.0' # Слушать все интерфейсы (плеер в локальной сети); '127.0.0.1' - только этот компьютер
+SERVER_PORT = 8000
+SERVER_KEEPALIVE_TIMEOUT = 30 # Секунд ожидания следующего запроса в keep-alive соединении (поток освобождается)
+SERVER_REQUEST_QUEUE_SIZE = 64 # Очередь еще не принятых соединений (listen backlog)
+SERVER_MEDIA_MAX_AGE = 7 * 24 * 3600 # Cache-Control для аудио и обложек, сек (после - проверка по ETag)
+# Файлы с хэшем содержимого в имени/адресе (страницы плейлиста, ?v=) кэшируются навсегда,
+# остальное (index.html, script.js, playlist.json) - с проверкой по ETag при каждом запросе
+SERVER_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
 
 # --- Настройки Логирования ---
 LOG_LEVEL = 'INFO' # Уровень логирования ('DEBUG', 'INFO', 'WARNING', 'ERROR')
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Уменьшенные обложки для веб-плеера: вместо исходных картинок yt-dlp (часто в
+полном разрешении) плейлист ссылается на иконку строки списка и большую обложку
+не больше PLAYLIST_COVER_SIZE в COVER_THUMBS_DIR. Имя файла - хэш содержимого,
+поэтому браузер может кэшировать их бессрочно, а одинаковые обложки (один релиз)
+хранятся один раз. Если файла обложки рядом с треком нет, картинка берется из
+самого аудиофайла (APIC в MP3, covr в M4A, METADATA_BLOCK_PICTURE в Opus) - ffmpeg
+читает их как видеопоток. Результат запоминается в таблице library каталога вместе
+с mtime источника: ffmpeg запускается только для новых и измененных файлов.
+"""
+import os
+import re
+import shutil
+import hashlib
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import (
+    COVER_THUMBS_DIR, PLAYLIST_COVER_THUMBS, PLAYLIST_COVER_THUMB_SIZE, PLAYLIST_COVER_SIZE, PLAYLIST_COVER_WORKERS
+)
+from .dirindex import COVER_EXTENSIONS
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+FFMPEG_TIMEOUT_SECONDS = 60
+# Файлы, которые создает этот модуль (остальное в COVER_THUMBS_DIR не трогаем)
+THUMB_NAME_RE = re.compile(r'^[0-9a-f]{12}-(thumb|cover)\.jpg$')
+TEMP_PREFIX = '.tmp-'
+
+
+def _render_art(ffmpeg, source, thumbs_dir, thumb_size, cover_size):
+    """
+    Одним запуском ffmpeg делает из source (картинка или аудио со встроенной обложкой)
+    квадратную иконку thumb_size (обрезка по центру) и обложку не больше cover_size
+    по большей стороне. Возвращает (имя иконки, имя обложки) в thumbs_dir или None,
+    если картинки в source нет. Ошибки запуска (таймаут, нет доступа) пробрасываются.
+    """
+    prefix = os.path.join(thumbs_dir, f'{TEMP_PREFIX}{os.getpid()}-{threading.get_ident()}')
+    outputs = {'thumb': prefix + '-thumb.jpg', 'cover': prefix + '-cover.jpg'}
+    graph = (
+        "[0:v:0]split=2[t][c];"
+        f"[t]scale={thumb_size}:{thumb_size}:force_original_aspect_ratio=increase,crop={thumb_size}:{thumb_size}[thumb];"
+        f"[c]scale='min({cover_size},iw)':'min({cover_size},ih)':force_original_aspect_ratio=decrease[cover]"
+    )
+    command = [
+        ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', '-i', source, '-filter_complex', graph,
+        '-map', '[thumb]', '-frames:v', '1', '-q:v', '4', outputs['thumb'],
+        '-map', '[cover]', '-frames:v', '1', '-q:v', '3', outputs['cover'],
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=FFMPEG_TIMEOUT_SECONDS)
+        if result.returncode != 0 or not all(os.path.exists(path) for path in outputs.values()):
+            # У аудио без встроенной обложки нет видеопотока - это обычный случай, а битая картинка - нет
+            message = result.stderr.decode('utf-8', errors='replace').strip().splitlines()
+            log = logger.warning if source.lower().endswith(COVER_EXTENSIONS) else logger.debug
+            log(f"Нет обложки в {os.path.basename(source)}: {message[-1] if message else result.returncode}")
+            return None
+        names = {}
+        for kind, path in outputs.items():
+            with open(path, 'rb') as f:
+                names[kind] = f"{hashlib.sha1(f.read()).hexdigest()[:12]}-{kind}.jpg"
+            os.replace(path, os.path.join(thumbs_dir, names[kind]))
+        return names['thumb'], names['cover']
+    finally:
+        for path in outputs.values():
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _apply(track, thumb, cover):
+    track['thumb'] = os.path.join(COVER_THUMBS_DIR, thumb) if thumb else None
+    track['web_cover'] = os.path.join(COVER_THUMBS_DIR, cover) if cover else None
+
+
+def attach_cover_thumbs(tracks, dir_index, metadata_cache, workers=None):
+    """
+    Заполняет у треков 'thumb' и 'web_cover' - полные пути к уменьшенным обложкам или None.
+    Источник - файл обложки трека (track['cover']), без него - сам аудиофайл.
+    Копии берутся из metadata_cache, если источник и его mtime не изменились, новые
+    создаются параллельно (workers, по умолчанию PLAYLIST_COVER_WORKERS). Копии, на которые
+    не ссылается ни один трек, удаляются, поэтому tracks - вся библиотека.
+    При выключенном PLAYLIST_COVER_THUMBS или без ffmpeg плеер получает исходные обложки.
+    """
+    for track in tracks:
+        _apply(track, None, None)
+    if not PLAYLIST_COVER_THUMBS:
+        return
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        logger.warning("⚠️ ffmpeg не найден: плеер получит исходные обложки, встроенные в аудио не извлекаются.")
+        return
+    try:
+        os.makedirs(COVER_THUMBS_DIR, exist_ok=True)
+        existing = set(os.listdir(COVER_THUMBS_DIR))
+    except OSError as e:
+        logger.error(f"❌ Папка уменьшенных обложек {COVER_THUMBS_DIR} недоступна: {e}")
+        return
+
+    pending = []
+    cached = 0
+    for track in tracks:
+        source = track['cover'] or track['filepath']
+        stat = dir_index.stat(source)
+        if stat is None:
+            continue
+        source_name, mtime = os.path.basename(source), stat[1]
+        art = metadata_cache.get_art(track['filename'])
+        if (art and art['art_source'] == source_name and art['art_mtime'] == mtime
+                and (not art['art_thumb'] or (art['art_thumb'] in existing and art['art_cover'] in existing))):
+            _apply(track, art['art_thumb'], art['art_cover'])
+            cached += 1
+        else:
+            pending.append((track, source, source_name, mtime))
+
+    created = missing = 0
+    if pending:
+        workers = max(1, min(workers or PLAYLIST_COVER_WORKERS or os.cpu_count() or 1, len(pending)))
+        logger.info(f"🖼️ Уменьшенные обложки: {len(pending)} новых/измененных источников, потоков ffmpeg: {workers}.")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                (item, executor.submit(_render_art, ffmpeg, item[1], COVER_THUMBS_DIR,
+                                       PLAYLIST_COVER_THUMB_SIZE, PLAYLIST_COVER_SIZE))
+                for item in pending
+            ]
+            for (track, source, source_name, mtime), future in futures:
+                try:
+                    names = future.result()
+                except (OSError, subprocess.SubprocessError) as e:
+                    # Не запоминаем - попробуем в следующий раз
+                    logger.warning(f"⚠️ Не удалось сделать обложку для {track['filename']}: {e}")
+                    continue
+                thumb, cover = names or ('', '')
+                if names:
+                    created += 1
+                else:
+                    missing += 1
+                metadata_cache.set_art(track['filename'], art_source=source_name, art_mtime=mtime,
+                                       art_thumb=thumb, art_cover=cover)
+                _apply(track, thumb, cover)
+
+    referenced = {os.path.basename(path) for track in tracks for path in (track['thumb'], track['web_cover']) if path}
+    removed = 0
+    for name in existing - referenced:
+        if THUMB_NAME_RE.match(name) or name.startswith(TEMP_PREFIX):
+            try:
+                os.remove(os.path.join(COVER_THUMBS_DIR, name))
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Не удалось удалить устаревшую обложку {name}: {e}")
+    log = logger.info if pending or removed else logger.debug
+    log(f"🖼️ Обложки плеера: из кэша {cached}, создано {created}, без обложки {missing}, удалено устаревших {removed}.")
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import os
+import logging
+import threading
+
+from .config import DOWNLOADS_DIR, AUDIO_EXTENSIONS
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Расширения обложек, которые yt-dlp сохраняет рядом с треком
+COVER_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+class DirectoryIndex:
+    """
+    Индекс файлов одной папки в памяти: имя, расширение, размер и mtime.
+    Папка читается одним os.scandir, дальше проверки "есть ли файл" и поиск
+    обложек идут по словарю без обращений к диску (важно для больших папок на NFS).
+    Размер и mtime запрашиваются у ОС лениво - только для файлов, где они нужны
+    (DirEntry кэширует результат stat). Изменения, которые делает сам проект,
+    вносятся в индекс на месте: add/refresh/discard/rename.
+    Потокобезопасен.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._entries = None # имя -> os.DirEntry или os.stat_result
+        self._lock = threading.RLock()
+
+    def rescan(self):
+        """Перечитывает папку целиком (один проход os.scandir)."""
+        entries = {}
+        try:
+            with os.scandir(self.directory) as iterator:
+                for entry in iterator:
+                    if entry.is_file():
+                        entries[entry.name] = entry
+        except FileNotFoundError:
+            logger.debug(f"Папка {self.directory} не найдена - индекс пуст.")
+        except OSError as e:
+            logger.error(f"Ошибка при сканировании папки {self.directory}: {e}")
+        with self._lock:
+            self._entries = entries
+        logger.debug(f"🗂️ Индекс папки {self.directory}: {len(entries)} файлов.")
+        return self
+
+    def _index(self):
+        with self._lock:
+            if self._entries is None:
+                self.rescan()
+            return self._entries
+
+    def __len__(self):
+        return len(self._index())
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def exists(self, name):
+        """Есть ли файл с таким именем (имя или полный путь внутри папки)."""
+        return os.path.basename(name) in self._index()
+
+    def names(self, extensions=None):
+        """Имена файлов (в порядке файловой системы); extensions - кортеж расширений в нижнем регистре."""
+        names = list(self._index())
+        if extensions:
+            names = [name for name in names if name.lower().endswith(extensions)]
+        return names
+
+    def audio_files(self):
+        """Аудиофайлы библиотеки (AUDIO_EXTENSIONS), без .part."""
+        return self.names(AUDIO_EXTENSIONS)
+
+    def find(self, base, extensions):
+        """Первое существующее имя base + ext для ext из extensions, иначе None."""
+        index = self._index()
+        for ext in extensions:
+            if base + ext in index:
+                return base + ext
+        return None
+
+    def stat(self, name):
+        """(размер, mtime) файла или None, если файла нет."""
+        name = os.path.basename(name)
+        with self._lock:
+            entry = self._index().get(name)
+        if entry is None:
+            return None
+        try:
+            result = entry.stat() if isinstance(entry, os.DirEntry) else entry
+        except FileNotFoundError:
+            self.discard(name)
+            return None
+        return result.st_size, result.st_mtime
+
+    def refresh(self, *paths):
+        """
+        Обновляет записи для файлов, которые могли появиться или исчезнуть
+        (например, после yt-dlp/ffmpeg): один stat на путь вместо пересканирования папки.
+        """
+        for path in paths:
+            if not path or os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.directory):
+                continue
+            try:
+                result = os.stat(path)
+            except OSError:
+                self.discard(path)
+                continue
+            with self._lock:
+                self._index()[os.path.basename(path)] = result
+
+    add = refresh
+
+    def discard(self, name):
+        """Убирает файл из индекса (после удаления)."""
+        with self._lock:
+            self._index().pop(os.path.basename(name), None)
+
+    def rename(self, old_name, new_name):
+        """Переносит запись после os.rename внутри папки."""
+        with self._lock:
+            index = self._index()
+            entry = index.pop(os.path.basename(old_name), None)
+        if entry is None or isinstance(entry, os.DirEntry):
+            # У DirEntry путь старый - берем свежий stat нового файла
+            self.refresh(self.path(os.path.basename(new_name)))
+        else:
+            with self._lock:
+                index[os.path.basename(new_name)] = entry
+
+
+_shared_indexes = {}
+_shared_lock = threading.Lock()
+
+
+def shared_index(directory=None):
+    """
+    Общий для всего процесса индекс папки (по умолчанию DOWNLOADS_DIR): строится при
+    первом обращении, дальше его используют скачивание, плейлисты и очистка.
+    download_tracks перечитывает папку в начале каждого запуска (rescan).
+    """
+    directory = os.path.abspath(directory or DOWNLOADS_DIR)
+    with _shared_lock:
+        if directory not in _shared_indexes:
+            _shared_indexes[directory] = DirectoryIndex(directory)
+        return _shared_indexes[directory]
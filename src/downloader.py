@@ -4,14 +4,28 @@ from tqdm import tqdm
 import os
 import time
 import logging
+import queue
+import threading
 import sys # Добавим sys на всякий случай для логгера
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # --- ИМПОРТЫ КОНФИГУРАЦИИ И УТИЛИТ ---
 from .config import (
-    DOWNLOADS_DIR, DOWNLOAD_ARCHIVE, MP3_QUALITY, EMBED_THUMBNAIL, WRITE_METADATA,
-    CLEANUP_THUMBNAILS_AFTER_DOWNLOAD # Убедимся, что это импортировано
+    DOWNLOADS_DIR, MP3_QUALITY, EMBED_THUMBNAIL, WRITE_METADATA,
+    CLEANUP_THUMBNAILS_AFTER_DOWNLOAD, # Убедимся, что это импортировано
+    KEEP_SOURCE_CODECS, ACCEPTABLE_CODECS, AUDIO_EXTENSIONS,
+    DOWNLOAD_WORKERS, TRANSCODE_WORKERS, RETRY_INLINE_MAX_WAIT_SECONDS, RATE_LIMIT_ENABLED
 )
-from .utils import get_safe_filepath, filter_tracks_only
+from .utils import get_safe_filepath, filter_tracks_only, find_audio_file
+from .archive import ArchiveIndex, normalize_link
+from .planner import PLAN_FILTERED, PLAN_ARCHIVED, PLAN_DOWNLOAD
+from .ratelimit import AdaptiveRateLimiter, RateLimitedYoutubeDL
+from .timing import TrackTimings
+from .catalog import TrackCatalog
+from .dirindex import shared_index, COVER_EXTENSIONS
+
+# Причина, которую match_filter сетевого этапа возвращает для треков из архива
+ARCHIVED_FILTER_REASON = "Уже в архиве"
 
 # Настройка логгера
 logger = logging.getLogger(__name__)
@@ -24,24 +38,25 @@ if not logger.hasHandlers():
      # настройку нужно делать в главном скрипте (run_downloader.py/liker_app.py)
 
 
-# --->>> НАЧАЛО ФУНКЦИИ download_tracks <<<---
-def download_tracks(links):
+# --->>> НАЧАЛО ФУНКЦИИ _build_postprocessors <<<---
+def _build_postprocessors(keep_source=False):
     """
-    Скачивает треки из списка ссылок, используя настройки из config.py.
-    Возвращает кортеж: (list_of_processed_files, success_count, skip_count, error_count)
+    Формирует список постпроцессоров yt-dlp (ffmpeg, метаданные, обложка) и их аргументы.
+    keep_source=True - аудио не перекодируется: ffmpeg только перекладывает поток
+    в подходящий контейнер (mp3/opus/m4a).
+    Возвращает кортеж (postprocessors, postprocessor_args).
     """
-    # --- ИНИЦИАЛИЗАЦИЯ ПЕРЕМЕННЫХ ---
-    processed_files = [] # Список для хранения путей к успешно обработанным файлам
-    success_count = 0
-    skip_download_count = 0
-    error_count = 0
-    start_time = time.time()
-    # --- КОНЕЦ ИНИЦИАЛИЗАЦИИ ---
-
-    # --- Формирование опций yt-dlp на основе конфига ---
     postprocessors = []
     postprocessor_args = {} # Используем пустой словарь по умолчанию
-    if MP3_QUALITY:
+    if MP3_QUALITY and keep_source:
+         # 'best' - yt-dlp копирует поток без перекодирования (-acodec copy)
+         postprocessors.append({
+             'key': 'FFmpegExtractAudio',
+             'preferredcodec': 'best',
+         })
+         if WRITE_METADATA:
+             postprocessor_args['ffmpegextractaudio'] = ['-metadata', 'genre=SoundCloud']
+    elif MP3_QUALITY:
          postprocessors.append({
              'key': 'FFmpegExtractAudio',
              'preferredcodec': 'mp3',
@@ -67,6 +82,23 @@ def download_tracks(links):
          # (на случай если WRITE_METADATA=True, а MP3_QUALITY=None) - маловероятно
           postprocessor_args.setdefault('ffmpegextractaudio', []).extend(['-metadata', 'genre=SoundCloud'])
 
+    return postprocessors, postprocessor_args
+# --->>> КОНЕЦ ФУНКЦИИ _build_postprocessors <<<---
+
+
+# --->>> НАЧАЛО ФУНКЦИИ _build_fetch_opts <<<---
+def _build_fetch_opts(archive_index, progress_hooks=None):
+    """
+    Опции yt-dlp для СЕТЕВОГО этапа: только скачивание лучшего аудио и обложки,
+    без постпроцессоров. Архив проверяется через общий archive_index в match_filter,
+    а записывается только после успешной обработки на CPU-этапе.
+    Недокачанные .part файлы докачиваются с места обрыва (если сервер поддерживает Range).
+    """
+    def match_filter(info):
+        # Сначала архив (дешево, без сети), потом наш фильтр треков
+        if archive_index.contains(info):
+            return ARCHIVED_FILTER_REASON
+        return filter_tracks_only(info)
 
     ydl_opts = {
         'format': 'bestaudio/best',
@@ -74,15 +106,16 @@ def download_tracks(links):
         'outtmpl': os.path.join(DOWNLOADS_DIR, '%(title)s.%(ext)s'), # yt-dlp сам обработает title
         'quiet': True, # Подавляем стандартный вывод yt-dlp
         'noplaylist': True,
-        'ignoreerrors': True, # Продолжать при ошибках отдельных треков
+        # Ошибки не глотаются: _fetch_link ловит DownloadError каждой ссылки и передает текст
+        # в каталог (повтор с backoff или окончательная ошибка, см. src.retry)
+        'ignoreerrors': False,
         'writethumbnail': EMBED_THUMBNAIL, # Скачиваем обложку, только если будем встраивать
         'writeinfojson': False, # Не сохраняем info.json
-        'download_archive': DOWNLOAD_ARCHIVE, # Файл для отслеживания скачанного
-        'postprocessors': postprocessors,
-        'postprocessor_args': postprocessor_args,
-        'keepvideo': False, # Не оставлять видео файл после извлечения аудио
-        'match_filter': filter_tracks_only, # Используем наш фильтр треков
-        'progress_hooks': [], # Можно добавить hook для более детального прогресса
+        'postprocessors': [], # Постпроцессоры выполняет CPU-этап
+        'match_filter': match_filter, # Архив + наш фильтр треков
+        'progress_hooks': progress_hooks or [], # Контрольные точки незавершенных файлов
+        'continuedl': True, # Докачивать .part файлы, оставшиеся после прерванного запуска
+        'nopart': False, # Качать во временный .part - недокачанный файл не примут за готовый
         'ffmpeg_location': None, # Можно указать путь к ffmpeg, если он не в PATH
          # 'verbose': True, # Раскомментировать для детальной отладки yt-dlp
          # Опции ниже могут помочь с некоторыми ошибками
@@ -90,149 +123,643 @@ def download_tracks(links):
          # 'retries': 5, # Количество попыток скачивания
          # 'fragment_retries': 5, # Количество попыток для фрагментов (DASH/HLS)
     }
-    # --- Конец формирования опций ---
+    return ydl_opts
+# --->>> КОНЕЦ ФУНКЦИИ _build_fetch_opts <<<---
 
-    logger.info(f"Начинаем скачивание/обработку {len(links)} ссылок в {DOWNLOADS_DIR}...")
-    logger.debug(f"Опции yt-dlp: {ydl_opts}") # Логируем опции для отладки
 
-    os.makedirs(DOWNLOADS_DIR, exist_ok=True) # Убедимся, что папка существует
+# --->>> НАЧАЛО ФУНКЦИИ _build_transcode_opts <<<---
+def _build_transcode_opts(keep_source=False):
+    """Опции yt-dlp для CPU-этапа: только постпроцессоры (ffmpeg, теги, обложка)."""
+    postprocessors, postprocessor_args = _build_postprocessors(keep_source)
+    return {
+        'quiet': True,
+        'postprocessors': postprocessors,
+        'postprocessor_args': postprocessor_args,
+        'keepvideo': False, # Не оставлять исходный файл после извлечения аудио
+        'ffmpeg_location': None, # Можно указать путь к ffmpeg, если он не в PATH
+    }
+# --->>> КОНЕЦ ФУНКЦИИ _build_transcode_opts <<<---
+
+
+def _keeps_source_codec(info):
+    """Можно ли сохранить скачанное аудио без перекодирования в MP3 (KEEP_SOURCE_CODECS)."""
+    if not KEEP_SOURCE_CODECS:
+        return False
+    acodec = (info.get('acodec') or '').split('.')[0].lower() # 'mp4a.40.2' -> 'mp4a'
+    if acodec in ('', 'none'):
+        # Кодек не указан - определяем по расширению
+        acodec = {'mp3': 'mp3', 'opus': 'opus', 'm4a': 'aac', 'aac': 'aac'}.get(info.get('ext'), '')
+    if acodec == 'mp4a':
+        acodec = 'aac'
+    return acodec in ACCEPTABLE_CODECS
+
+
+class _StageStats:
+    """Потокобезопасный счетчик пропускной способности одного этапа конвейера."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.bytes = 0
+        self.busy_time = 0.0 # Суммарное время работы воркеров над элементами
+        self.first_start = None
+        self.last_end = None
+        self._lock = threading.Lock()
+
+    def record(self, started, finished, nbytes=0):
+        with self._lock:
+            self.items += 1
+            self.bytes += nbytes or 0
+            self.busy_time += finished - started
+            if self.first_start is None or started < self.first_start: self.first_start = started
+            if self.last_end is None or finished > self.last_end: self.last_end = finished
+
+    def log_summary(self):
+        if not self.items:
+            logger.info(f"⚙️ Этап '{self.name}': нет обработанных элементов.")
+            return
+        wall = max(self.last_end - self.first_start, 1e-6)
+        # Загрузка воркеров близка к 100% у этапа, который является узким местом
+        utilization = self.busy_time / (wall * self.workers) * 100
+        logger.info(
+            f"⚙️ Этап '{self.name}': {self.items} шт. за {wall:.1f} сек "
+            f"({self.items / wall * 60:.1f} треков/мин, {self.bytes / wall / 1024 / 1024:.2f} МБ/с), "
+            f"воркеров: {self.workers}, загрузка: {utilization:.0f}%"
+        )
+
+
+def _downloaded_filepath(info):
+    """Путь скачанного файла: новые версии yt-dlp пишут его только в requested_downloads."""
+    for download in info.get('requested_downloads') or []:
+        if download.get('filepath'):
+            return download['filepath']
+    return None
+
+
+# --->>> НАЧАЛО ФУНКЦИИ _fetch_link <<<---
+def _fetch_link(ydl, archive_index, link, planned_info=None):
+    """
+    СЕТЕВОЙ этап для ОДНОЙ ссылки: метаданные + скачивание лучшего аудио.
+    planned_info - метаданные из плана (src.planner): скачивание идет без повторного запроса метаданных.
+    Возвращает кортеж (outcome, payload):
+      ('fetched', info) - файл скачан и ждет CPU-этапа;
+      ('success'/'skip'/'error'/None, files) - обработка ссылки завершена.
+    """
+    files = []
+    # Логируем начало обработки каждой ссылки
+    logger.debug(f"Обработка ссылки: {link}")
+    try:
+        # extract_info выполнит фильтр и скачивание (если download=True и не отфильтровано/не в архиве)
+        # download=True является поведением по умолчанию, если не использовать extract_info(..., download=False)
+        info = None
+        if planned_info is not None:
+            try:
+                info = ydl.process_ie_result(dict(planned_info), download=True)
+                if (info is not None and not info.get('filepath') and not _downloaded_filepath(info)
+                        and not archive_index.contains(info) and not filter_tracks_only(info)):
+                    # Трек не отфильтрован, но файла нет - скачивание по плану не удалось
+                    raise yt_dlp.utils.DownloadError("скачивание по плану не дало файла")
+            except yt_dlp.utils.DownloadError as e_plan:
+                # Ссылки на аудио в плане могли истечь - запрашиваем метаданные заново
+                logger.debug(f"Метаданные из плана для {link} не подошли ({e_plan}), запрашиваем заново.")
+                planned_info = None
+        if planned_info is None:
+            info = ydl.extract_info(link) # download=True по умолчанию
+
+        if info is None: # Без ignoreerrors сюда попадаем только в редких случаях (ошибки приходят исключением)
+             # Пытаемся понять, почему info is None
+             # Возможно, стоит проверить архив вручную или использовать хуки
+             logger.warning(f"❓ Не удалось получить info для {link} (возможно, уже в архиве или ошибка до скачивания). Проверяем архив.")
+             # info нет - проверяем архив по самой ссылке
+             if archive_index.lookup(link)[0]:
+                 logger.debug(f"Ссылка {link}: already_downloaded")
+                 return 'skip', files
+             logger.debug(f"Ссылка {link}: error_or_filtered_early")
+             archive_index.mark_error(link, "yt-dlp не вернул метаданные")
+             return 'error', files
+
+        elif '_type' in info and info['_type'] == 'playlist':
+             # Если ссылка оказалась плейлистом (не должна при noplaylist=True, но на всякий случай)
+             logger.warning(f"⏭️ Ссылка {link} оказалась плейлистом, пропускаем.")
+             archive_index.mark_filtered(link, None, "Плейлист")
+             return 'skip', files
+
+        elif info.get('__downloaded') == False: # Проверка флага фильтрации
+              reason = info.get('_filter_reason', 'N/A')
+              logger.info(f"⏭️ Пропущено фильтром: {info.get('title', link)} ({reason})")
+              archive_index.mark_filtered(link, info, reason)
+              return 'skip', files
+
+        elif archive_index.contains(info):
+             logger.info(f"⏭️ Уже скачано (архив): {info.get('title', link)}")
+             # Пытаемся найти путь к существующему файлу
+             try:
+                # Получаем ожидаемое имя файла (без скачивания)
+                expected_path_base = ydl.prepare_filename(info).rsplit('.', 1)[0]
+                expected_mp3_path = expected_path_base + '.mp3'
+                # Трек мог быть сохранен и без перекодирования (opus/m4a)
+                existing_path = find_audio_file(DOWNLOADS_DIR, info.get('title', 'unknown_track'))
+                if not existing_path:
+                    existing_name = shared_index(DOWNLOADS_DIR).find(os.path.basename(expected_path_base), AUDIO_EXTENSIONS)
+                    existing_path = os.path.join(DOWNLOADS_DIR, existing_name) if existing_name else None
+                if existing_path:
+                     files.append(existing_path)
+                     # Запоминаем ссылку: следующий запуск пропустит ее без сети
+                     archive_index.remember(link, info, existing_path)
+                else:
+                     logger.warning(f"Файл {expected_mp3_path} помечен как скачанный в архиве, но не найден на диске.")
+                     archive_index.remember(link, info, None)
+             except Exception as e_path:
+                logger.warning(f"Не удалось определить путь для уже скачанного {info.get('title', link)}: {e_path}")
+             return 'skip', files
+
+        elif info.get('filepath') or _downloaded_filepath(info): # Файл скачан - дальше работает CPU-этап
+            info['filepath'] = info.get('filepath') or _downloaded_filepath(info)
+            logger.debug(f"📥 Скачан исходник: {os.path.basename(info['filepath'])}")
+            return 'fetched', info
+
+        else:
+            # match_filter мог отклонить трек - тогда скачивания не было
+            reason = filter_tracks_only(info)
+            if reason:
+                logger.info(f"⏭️ Пропущено фильтром: {info.get('title', link)} ({reason})")
+                archive_index.mark_filtered(link, info, reason)
+                return 'skip', files
+            # Случай, когда info есть, но не скачано, не в архиве, не отфильтровано
+            logger.warning(f"❓ Не удалось скачать или обработать: {info.get('title', link)} (Статус неизвестен). Info: {info}")
+            archive_index.mark_error(link, "Статус неизвестен", info)
+            return 'error', files
+
+    # --- Обработка исключений для ОДНОЙ ссылки ---
+    except yt_dlp.utils.DownloadError as e:
+        # Ловим специфичные ошибки yt-dlp
+        if "is not a valid URL" in str(e): logger.error(f"❌ Некорректный URL: {link}")
+        elif "unable to download video data" in str(e): logger.error(f"❌ Не удалось скачать данные для {link}: {e}")
+        elif "HTTP Error 429" in str(e): logger.warning(f"🚦 SoundCloud ограничил частоту запросов для {link}, ссылка будет повторена позже.")
+        elif "JSON metadata" in str(e): logger.warning(f"❓ Не удалось получить метаданные для {link} (возможно, удален/приватный).")
+        else: logger.error(f"❌ Ошибка скачивания yt-dlp для {link}: {e}")
+        archive_index.mark_error(link, str(e))
+        return 'error', files
+    except Exception as e_inner:
+        # Ловим любые другие неожиданные ошибки при обработке ссылки
+        logger.error(f"❌ Неожиданная ошибка при обработке {link}: {e_inner}", exc_info=True)
+        archive_index.mark_error(link, str(e_inner))
+        return 'error', files
+    # --- Конец обработки исключений для ОДНОЙ ссылки ---
+# --->>> КОНЕЦ ФУНКЦИИ _fetch_link <<<---
+
+
+# --->>> НАЧАЛО ФУНКЦИИ _transcode_fetched <<<---
+def _transcode_fetched(ydl, archive_index, link, info, keep_source=False):
+    """
+    CPU-этап для ОДНОЙ скачанной ссылки: постпроцессоры yt-dlp (перекодирование
+    в MP3 или, при keep_source, только смена контейнера; теги, обложка),
+    переименование в безопасное имя и запись в архив.
+    Возвращает кортеж (outcome, files).
+    """
+    files = []
+    original_filepath = info['filepath']
+    try:
+        # post_process запускает те же постпроцессоры, что раньше работали внутри extract_info
+        info = ydl.post_process(original_filepath, info)
+    except yt_dlp.utils.DownloadError as e: # PostProcessingError обернут в DownloadError при ignoreerrors=False
+        logger.error(f"❌ Ошибка постпроцессора (вероятно, ffmpeg) для {link}: {e}")
+        archive_index.mark_error(link, str(e), info)
+        return 'error', files
+    except Exception as e_pp:
+        logger.error(f"❌ Ошибка постпроцессора (вероятно, ffmpeg) для {link}: {e_pp}", exc_info=True)
+        archive_index.mark_error(link, str(e_pp), info)
+        return 'error', files
+
+    if keep_source:
+        # Без перекодирования расширение определяет контейнер, выбранный yt-dlp
+        final_path = info.get('filepath') or original_filepath
+    else:
+        # Ожидаемый путь после конвертации в MP3
+        final_path = os.path.splitext(info.get('filepath') or original_filepath)[0] + '.mp3'
+    extension = os.path.splitext(final_path)[1].lstrip('.') or 'mp3'
+    # Постпроцессоры создали/удалили файлы: обновляем только их записи в индексе папки
+    downloads_index = shared_index(DOWNLOADS_DIR)
+    downloads_index.refresh(
+        original_filepath, final_path,
+        *(thumbnail.get('filepath') for thumbnail in info.get('thumbnails') or [])
+    )
+    # Создаем безопасное имя файла на основе заголовка
+    safe_path = get_safe_filepath(DOWNLOADS_DIR, info.get('title', 'unknown_track'), extension)
+    codec_note = f" (без перекодирования, {extension})" if keep_source else ""
+
+    try:
+        if downloads_index.exists(final_path):
+            # Переименовываем в безопасное имя, если оно отличается
+            if final_path != safe_path:
+                if downloads_index.exists(safe_path):
+                    logger.warning(f"Файл с безопасным именем {os.path.basename(safe_path)} уже существует. Пропускаем переименование для '{os.path.basename(final_path)}'.")
+                    # Добавляем тот файл, который точно есть
+                    files.append(final_path)
+                else:
+                    os.rename(final_path, safe_path)
+                    downloads_index.rename(final_path, safe_path)
+                    logger.info(f"✅ Скачано и переименовано: {os.path.basename(safe_path)}{codec_note}")
+                    files.append(safe_path)
+            else:
+                 logger.info(f"✅ Скачано: {os.path.basename(final_path)}{codec_note}")
+                 files.append(final_path)
+            # В архив пишем только полностью обработанный трек
+            archive_index.record(link, info, files[-1])
+            return 'success', files
+        else:
+            # Это может случиться, если постпроцессор не создал аудиофайл
+            logger.error(f"❌ Ожидаемый аудиофайл не найден после скачивания: {final_path} (Оригинал: {original_filepath}) для ссылки {link}")
+            archive_index.mark_error(link, "Аудиофайл не создан постпроцессором", info)
+            return 'error', files
+    except OSError as rename_err:
+        logger.error(f"❌ Ошибка переименования '{os.path.basename(final_path)}' -> '{os.path.basename(safe_path)}': {rename_err}")
+        archive_index.mark_error(link, str(rename_err), info)
+        # Добавляем оригинальный файл, если он остался
+        if downloads_index.exists(final_path): files.append(final_path)
+        return 'error', files
+# --->>> КОНЕЦ ФУНКЦИИ _transcode_fetched <<<---
+
+
+# --->>> НАЧАЛО ФУНКЦИИ _fetch_worker <<<---
+def _fetch_worker(worker_id, link_queue, transcode_queue, archive_index, stats, planned_infos=None, limiter=None,
+                  timings=None):
+    """
+    Воркер СЕТЕВОГО пула: владеет собственным YoutubeDL без постпроцессоров,
+    берет ссылки из link_queue, скачанное передает в transcode_queue.
+    Все запросы воркера проходят через общий limiter (если задан), замеры пишутся в timings.
+    Возвращает список кортежей (index, outcome, files) для ссылок, завершенных на этом этапе.
+    """
+    results = []
+    # Ссылка, которую воркер качает сейчас, и ее файл - для контрольных точек и замеров
+    current = {'index': None, 'link': None, 'file': None}
+
+    def progress_hook(d):
+        if not current['link']:
+            return
+        if d.get('status') == 'finished' and timings is not None:
+            timings.mark(current['index'], 'download_end', bytes=d.get('total_bytes') or d.get('downloaded_bytes'))
+        if d.get('status') != 'downloading':
+            return
+        if timings is not None:
+            timings.mark(current['index'], 'download_start')
+        filename = d.get('filename')
+        if filename and filename != current['file']:
+            current['file'] = filename
+            archive_index.checkpoint(current['link'], filename)
+
+    logger.debug(f"Сетевой воркер #{worker_id} запущен.")
+    with RateLimitedYoutubeDL(_build_fetch_opts(archive_index, [progress_hook]), limiter=limiter) as ydl:
+        while True:
+            try:
+                index, link = link_queue.get_nowait()
+            except queue.Empty:
+                break
+            started = time.time()
+            current['index'], current['link'], current['file'] = index, link, None
+            if timings is not None: timings.mark(index, 'fetch_start')
+            if limiter is not None:
+                # Лимитер может временно уменьшить число одновременно качаемых ссылок
+                with limiter.slot():
+                    outcome, payload = _fetch_link(ydl, archive_index, link, (planned_infos or {}).get(link))
+            else:
+                outcome, payload = _fetch_link(ydl, archive_index, link, (planned_infos or {}).get(link))
+            current['link'] = None
+            if timings is not None: timings.mark(index, 'fetch_end')
+            if outcome == 'fetched':
+                # Исходник ждет CPU-этапа: после сбоя он не будет скачиваться заново
+                archive_index.checkpoint(link, payload['filepath'])
+                downloads_index = shared_index(DOWNLOADS_DIR)
+                downloads_index.refresh(payload['filepath'])
+                nbytes = (downloads_index.stat(payload['filepath']) or (0, None))[0]
+                stats.record(started, time.time(), nbytes)
+                if timings is not None:
+                    timings.mark(index, None, title=payload.get('title'))
+                    timings.fill(index, bytes=nbytes) # Если progress hook не сообщил размер
+                transcode_queue.put((index, link, payload))
+            else:
+                stats.record(started, time.time())
+                if timings is not None: timings.finish(index, outcome)
+                results.append((index, outcome, payload))
+    logger.debug(f"Сетевой воркер #{worker_id} завершен.")
+    return results
+# --->>> КОНЕЦ ФУНКЦИИ _fetch_worker <<<---
+
+
+# --->>> НАЧАЛО ФУНКЦИИ _transcode_worker <<<---
+def _transcode_worker(worker_id, transcode_queue, archive_index, stats, timings=None):
+    """
+    Воркер CPU-пула: владеет собственными YoutubeDL с постпроцессорами (перекодирование
+    в MP3 и сохранение без перекодирования) и обрабатывает скачанные файлы
+    из transcode_queue до получения None.
+    Возвращает список кортежей (index, outcome, files).
+    """
+    results = []
+    logger.debug(f"CPU воркер #{worker_id} запущен.")
+    with yt_dlp.YoutubeDL(_build_transcode_opts()) as ydl, \
+         yt_dlp.YoutubeDL(_build_transcode_opts(keep_source=True)) as keep_ydl:
+        while True:
+            item = transcode_queue.get()
+            if item is None: # Сигнал остановки от download_tracks
+                break
+            index, link, info = item
+            started = time.time()
+            if timings is not None: timings.mark(index, 'transcode_start')
+            keep_source = _keeps_source_codec(info)
+            if timings is not None: timings.mark(index, None, transcoded=not keep_source)
+            outcome, files = _transcode_fetched(keep_ydl if keep_source else ydl, archive_index, link, info, keep_source)
+            nbytes = sum((shared_index(DOWNLOADS_DIR).stat(f) or (0, None))[0] for f in files)
+            stats.record(started, time.time(), nbytes)
+            if timings is not None:
+                timings.mark(index, 'transcode_end')
+                timings.finish(index, outcome)
+            results.append((index, outcome, files))
+    logger.debug(f"CPU воркер #{worker_id} завершен.")
+    return results
+# --->>> КОНЕЦ ФУНКЦИИ _transcode_worker <<<---
+
+
+# --->>> НАЧАЛО ФУНКЦИИ _run_pipeline <<<---
+def _run_pipeline(indexed_links, archive_index, workers, transcode_workers, fetch_stats, transcode_stats,
+                  planned_infos=None, limiter=None, timings=None):
+    """
+    Прогоняет пары (index, link) через двухэтапный конвейер (сеть -> CPU).
+    planned_infos - словарь ссылка -> метаданные из плана, limiter - общий AdaptiveRateLimiter,
+    timings - TrackTimings для замеров по трекам.
+    Возвращает (список (index, outcome, files), число ссылок, не обработанных из-за критической ошибки).
+    """
+    link_results = []
+    # Общая очередь ссылок: воркеры разбирают ее сами, поэтому медленный трек
+    # не блокирует остальные
+    link_queue = queue.Queue()
+    for index, link in indexed_links:
+        if timings is not None: timings.queued(index, link)
+        link_queue.put((index, link))
+    # Очередь между этапами: скачанные исходники ждут ffmpeg
+    transcode_queue = queue.Queue()
 
-    # Используем контекстный менеджер для yt-dlp для корректного завершения
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # tqdm для прогресс-бара в консоли (если запускать run_downloader.py)
-            # При запуске из Streamlit tqdm может работать некорректно в UI,
-            # но он будет писать в лог терминала.
-            # Можно обернуть links в tqdm(links), если нужен прогресс в терминале.
-            # for link in tqdm(links, unit="ссылка", dynamic_ncols=True, desc="Обработка ссылок"):
-            for link in links:
-                # Логируем начало обработки каждой ссылки
-                logger.debug(f"Обработка ссылки: {link}")
+        with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="fetch") as fetch_executor, \
+             ThreadPoolExecutor(max_workers=max(transcode_workers, 1), thread_name_prefix="transcode") as transcode_executor:
+            transcode_futures = [
+                transcode_executor.submit(_transcode_worker, worker_id, transcode_queue, archive_index, transcode_stats, timings)
+                for worker_id in range(1, transcode_workers + 1)
+            ]
+            fetch_futures = [
+                fetch_executor.submit(_fetch_worker, worker_id, link_queue, transcode_queue, archive_index, fetch_stats, planned_infos, limiter, timings)
+                for worker_id in range(1, workers + 1)
+            ]
+            for future in as_completed(fetch_futures):
+                try:
+                    link_results.extend(future.result())
+                except Exception as e_worker:
+                    # Ошибка инициализации yt-dlp в одном воркере не должна терять результаты остальных
+                    logger.critical(f"Критическая ошибка в сетевом воркере: {e_worker}", exc_info=True)
+
+            # Сетевой этап завершен - останавливаем CPU-воркеры после разбора очереди
+            for _ in transcode_futures:
+                transcode_queue.put(None)
+            for future in as_completed(transcode_futures):
                 try:
-                    # extract_info выполнит фильтр и скачивание (если download=True и не отфильтровано/не в архиве)
-                    # download=True является поведением по умолчанию, если не использовать extract_info(..., download=False)
-                    info = ydl.extract_info(link) # download=True по умолчанию
-
-                    # Статус загрузки может быть в info словаре
-                    # (но yt-dlp может и не добавить его, если был только pre-processing)
-                    download_status = 'unknown'
-                    if info is None: # Если info=None, скорее всего ошибка или фильтр сработал на этапе pre-processing
-                         # Пытаемся понять, почему info is None
-                         # Возможно, стоит проверить архив вручную или использовать хуки
-                         logger.warning(f"❓ Не удалось получить info для {link} (возможно, уже в архиве или ошибка до скачивания). Проверяем архив.")
-                         # Добавим ручную проверку архива, если info is None
-                         if ydl.in_download_archive(info): # info тут может быть None, нужна проверка как это работает
-                             download_status = 'already_downloaded'
-                         else:
-                              download_status = 'error_or_filtered_early'
-
-                    elif '_type' in info and info['_type'] == 'playlist':
-                         # Если ссылка оказалась плейлистом (не должна при noplaylist=True, но на всякий случай)
-                         logger.warning(f"⏭️ Ссылка {link} оказалась плейлистом, пропускаем.")
-                         download_status = 'skipped_playlist'
-                         skip_download_count += 1
-
-                    elif info.get('__downloaded') == False: # Проверка флага фильтрации
-                          reason = info.get('_filter_reason', 'N/A')
-                          logger.info(f"⏭️ Пропущено фильтром: {info.get('title', link)} ({reason})")
-                          download_status = 'filtered'
-                          skip_download_count += 1
-
-                    elif ydl.in_download_archive(info):
-                         logger.info(f"⏭️ Уже скачано (архив): {info.get('title', link)}")
-                         download_status = 'already_downloaded'
-                         skip_download_count += 1
-                         # Пытаемся найти путь к существующему файлу
-                         try:
-                            # Получаем ожидаемое имя файла (без скачивания)
-                            expected_path_base = ydl.prepare_filename(info).rsplit('.', 1)[0]
-                            expected_mp3_path = expected_path_base + '.mp3'
-                            if os.path.exists(expected_mp3_path):
-                                 processed_files.append(expected_mp3_path)
-                            else:
-                                 logger.warning(f"Файл {expected_mp3_path} помечен как скачанный в архиве, но не найден на диске.")
-                         except Exception as e_path:
-                            logger.warning(f"Не удалось определить путь для уже скачанного {info.get('title', link)}: {e_path}")
-
-                    elif info.get('filepath'): # Если файл был скачан и обработан
-                        original_filepath = info['filepath']
-                        # Ожидаемый путь после конвертации в MP3
-                        final_mp3_path = os.path.splitext(original_filepath)[0] + '.mp3'
-                        # Создаем безопасное имя файла на основе заголовка
-                        safe_mp3_path = get_safe_filepath(DOWNLOADS_DIR, info.get('title', 'unknown_track'))
-
-                        try:
-                            if os.path.exists(final_mp3_path):
-                                # Переименовываем в безопасное имя, если оно отличается
-                                if final_mp3_path != safe_mp3_path:
-                                    if os.path.exists(safe_mp3_path):
-                                        logger.warning(f"Файл с безопасным именем {os.path.basename(safe_mp3_path)} уже существует. Пропускаем переименование для '{os.path.basename(final_mp3_path)}'.")
-                                        # Добавляем тот файл, который точно есть
-                                        processed_files.append(final_mp3_path)
-                                    else:
-                                        os.rename(final_mp3_path, safe_mp3_path)
-                                        logger.info(f"✅ Скачано и переименовано: {os.path.basename(safe_mp3_path)}")
-                                        processed_files.append(safe_mp3_path)
-                                else:
-                                     logger.info(f"✅ Скачано: {os.path.basename(final_mp3_path)}")
-                                     processed_files.append(final_mp3_path)
-                                success_count += 1
-                                download_status = 'downloaded'
-                            else:
-                                # Это может случиться, если постпроцессор не создал MP3
-                                logger.error(f"❌ Ожидаемый MP3 файл не найден после скачивания: {final_mp3_path} (Оригинал: {original_filepath}) для ссылки {link}")
-                                download_status = 'error_postprocessing'
-                                error_count += 1
-                        except OSError as rename_err:
-                            logger.error(f"❌ Ошибка переименования '{os.path.basename(final_mp3_path)}' -> '{os.path.basename(safe_mp3_path)}': {rename_err}")
-                            error_count += 1
-                            download_status = 'error_rename'
-                            # Добавляем оригинальный файл, если он остался
-                            if os.path.exists(final_mp3_path): processed_files.append(final_mp3_path)
-                    else:
-                        # Случай, когда info есть, но не скачано, не в архиве, не отфильтровано
-                        logger.warning(f"❓ Не удалось скачать или обработать: {info.get('title', link)} (Статус неизвестен). Info: {info}")
-                        download_status = 'error_unknown'
-                        error_count += 1
-
-                # --- Обработка исключений для ОДНОЙ ссылки ---
-                except yt_dlp.utils.DownloadError as e:
-                    # Ловим специфичные ошибки yt-dlp
-                    if "is not a valid URL" in str(e): logger.error(f"❌ Некорректный URL: {link}")
-                    elif "unable to download video data" in str(e): logger.error(f"❌ Не удалось скачать данные для {link}: {e}")
-                    elif "returned non-zero exit status 1" in str(e): logger.error(f"❌ Ошибка постпроцессора (вероятно, ffmpeg) для {link}: {e}")
-                    elif "JSON metadata" in str(e): logger.warning(f"❓ Не удалось получить метаданные для {link} (возможно, удален/приватный).")
-                    else: logger.error(f"❌ Ошибка скачивания yt-dlp для {link}: {e}")
-                    error_count += 1
-                except Exception as e_inner:
-                    # Ловим любые другие неожиданные ошибки при обработке ссылки
-                    logger.error(f"❌ Неожиданная ошибка при обработке {link}: {e_inner}", exc_info=True)
-                    error_count += 1
-                # --- Конец обработки исключений для ОДНОЙ ссылки ---
+                    link_results.extend(future.result())
+                except Exception as e_worker:
+                    logger.critical(f"Критическая ошибка в CPU воркере: {e_worker}", exc_info=True)
 
     # --- Обработка исключений для ВСЕГО процесса yt-dlp ---
     except Exception as e_outer:
-         logger.critical(f"Критическая ошибка при инициализации yt-dlp или в цикле: {e_outer}", exc_info=True)
-         # Возвращаем текущие счетчики, даже если не все обработали
-         # 'processed_files' был инициализирован в начале функции
-         return processed_files, success_count, skip_download_count, error_count
+         logger.critical(f"Критическая ошибка при запуске конвейера скачивания: {e_outer}", exc_info=True)
     # --- Конец обработки исключений для ВСЕГО процесса yt-dlp ---
 
+    # Ссылки, до которых воркеры не добрались из-за критической ошибки
+    unfinished = link_queue.qsize() + sum(1 for item in list(transcode_queue.queue) if item is not None)
+    return link_results, unfinished
+# --->>> КОНЕЦ ФУНКЦИИ _run_pipeline <<<---
+
+
+# --->>> НАЧАЛО ФУНКЦИИ download_tracks <<<---
+def download_tracks(links, workers=None, transcode_workers=None, catalog=None, plan=None):
+    """
+    Скачивает треки из списка ссылок, используя настройки из config.py.
+    Работает как двухэтапный конвейер:
+      - сетевой пул из `workers` потоков (по умолчанию DOWNLOAD_WORKERS) только скачивает лучшее аудио;
+      - CPU-пул из `transcode_workers` потоков (по умолчанию TRANSCODE_WORKERS или число ядер)
+        перекодирует, пишет теги и встраивает обложки из очереди.
+    У каждого потока свой экземпляр yt_dlp.YoutubeDL.
+    Состояние ссылок читается из каталога и записывается в него (src.catalog.TrackCatalog);
+    если catalog не передан, открывается каталог по умолчанию.
+    Временные ошибки повторяются с экспоненциальной задержкой (src.retry): короткие
+    повторы (до RETRY_INLINE_MAX_WAIT_SECONDS) - в этом же запуске, остальные - в следующих.
+    plan - план из src.planner.load_plan: отсеянные и скачанные по плану ссылки не проверяются
+    заново, а скачиваемые используют сохраненные метаданные.
+    Возвращает кортеж: (list_of_processed_files, success_count, skip_count, error_count)
+    """
+    # --- ИНИЦИАЛИЗАЦИЯ ПЕРЕМЕННЫХ ---
+    processed_files = [] # Список для хранения путей к успешно обработанным файлам
+    success_count = 0
+    skip_download_count = 0
+    error_count = 0
+    start_time = time.time()
+    # --- КОНЕЦ ИНИЦИАЛИЗАЦИИ ---
+
+    os.makedirs(DOWNLOADS_DIR, exist_ok=True) # Убедимся, что папка существует
+    # Индекс папки загрузок: один scandir на запуск, дальше его дополняют воркеры,
+    # а плейлисты и очистка после скачивания используют тот же индекс
+    downloads_index = shared_index(DOWNLOADS_DIR).rescan()
+
+    own_catalog = catalog is None
+    if own_catalog:
+        catalog = TrackCatalog()
+    # Индекс архива строится один раз: уже скачанные ссылки отсекаются без сети
+    archive_index = ArchiveIndex(catalog)
+    # Ссылки с окончательной ошибкой или еще не наступившим временем повтора
+    deferred = catalog.deferred_links()
+
+    # Состояние каждой ссылки сохраняется в каталоге сразу по ее завершении, поэтому
+    # прерванный пакет продолжается с первой незавершенной ссылки (catalog.pending_links)
+    interrupted_at = catalog.begin_batch(len(links))
+    if interrupted_at:
+        logger.info(f"⏯️ Предыдущий запуск ({time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(interrupted_at))}) был прерван - продолжаем с незавершенных ссылок.")
+    cleanup_partial_files(catalog)
+
+    # Результаты собираются по индексу ссылки, чтобы порядок processed_files
+    # совпадал с порядком ссылок, как при последовательной обработке.
+    # Повтор ссылки перезаписывает ее предыдущий результат.
+    link_results = {}
+    indexed_links = []
+    planned_infos = {}
+    deferred_count = 0
+    planned_count = 0
+    for index, link in enumerate(links):
+        is_archived, archived_path = archive_index.lookup(link)
+        entry = plan.get(normalize_link(link)) if plan else None
+        if not is_archived and entry and entry['status'] in (PLAN_FILTERED, PLAN_ARCHIVED):
+            # Решение уже принято при планировании - сеть не нужна
+            planned_count += 1
+            if entry['status'] == PLAN_FILTERED:
+                archive_index.mark_filtered(link, entry, entry.get('reason', 'N/A'))
+                link_results[index] = ('skip', [])
+            else:
+                archived_path = os.path.join(DOWNLOADS_DIR, entry['file']) if entry.get('file') else None
+                archive_index.remember(link, entry, archived_path)
+                link_results[index] = ('skip', [archived_path] if archived_path and downloads_index.exists(archived_path) else [])
+        elif is_archived:
+            files = []
+            if archived_path and downloads_index.exists(archived_path):
+                files.append(archived_path)
+                logger.debug(f"⏭️ Уже скачано (индекс архива): {os.path.basename(archived_path)}")
+            else:
+                logger.warning(f"Ссылка {link} есть в архиве, но файл не найден на диске.")
+            link_results[index] = ('skip', files)
+        elif normalize_link(link) in deferred:
+            status, next_attempt_at, reason = deferred[normalize_link(link)]
+            logger.debug(f"⏳ Ссылка отложена ({status}): {link} - {reason}")
+            deferred_count += 1
+            link_results[index] = ('skip', [])
+        else:
+            indexed_links.append((index, link))
+            if entry and entry['status'] == PLAN_DOWNLOAD and entry.get('info'):
+                planned_infos[link] = entry['info']
+    pending_count = len(indexed_links)
+    if len(link_results) - deferred_count - planned_count:
+        logger.info(f"⏭️ Пропущено по индексу архива без обращения к сети: {len(link_results) - deferred_count - planned_count}")
+    if plan:
+        logger.info(f"🗺️ По плану: отсеяно/в архиве без проверки - {planned_count}, скачиваются без повторного запроса метаданных - {len(planned_infos)}")
+    if deferred_count:
+        logger.info(f"⏳ Пропущено ссылок, ожидающих повтора или окончательно проваленных: {deferred_count}")
+
+    if workers is None:
+        workers = DOWNLOAD_WORKERS
+    if transcode_workers is None:
+        transcode_workers = TRANSCODE_WORKERS or os.cpu_count() or 1
+    # Не запускаем больше потоков, чем есть ссылок для обработки
+    max_workers = max(1, int(workers))
+    max_transcode_workers = max(1, int(transcode_workers))
+    workers = min(max_workers, pending_count)
+    transcode_workers = min(max_transcode_workers, pending_count)
+
+    logger.info(f"Начинаем скачивание/обработку {pending_count} из {len(links)} ссылок в {DOWNLOADS_DIR} (сеть: {workers}, CPU: {transcode_workers})...")
+
+    fetch_stats = _StageStats("сеть", workers)
+    transcode_stats = _StageStats("CPU", transcode_workers)
+    # Один лимитер на весь запуск: частота запросов и параллельность общие для всех воркеров
+    limiter = AdaptiveRateLimiter(max_concurrency=max_workers) if RATE_LIMIT_ENABLED else None
+    timings = TrackTimings()
+
+    unfinished = 0
+    if indexed_links:
+        results, unfinished = _run_pipeline(indexed_links, archive_index, workers, transcode_workers, fetch_stats, transcode_stats, planned_infos, limiter, timings)
+        link_results.update((index, (outcome, files)) for index, outcome, files in results)
+
+    # --- Повторы внутри запуска: только те, чья задержка короче RETRY_INLINE_MAX_WAIT_SECONDS ---
+    index_by_link = {link: index for index, link in indexed_links}
+    retry_rounds = 0
+    while not unfinished:
+        due = catalog.retry_due(index_by_link, within=RETRY_INLINE_MAX_WAIT_SECONDS)
+        if not due:
+            break
+        retry_rounds += 1
+        wait = max(0.0, due[0][1] - time.time())
+        logger.info(f"🔁 Повтор #{retry_rounds}: {len(due)} ссылок с временной ошибкой, ожидание {wait:.0f} сек...")
+        time.sleep(wait)
+        # Берем все ссылки, чье время уже наступило к моменту пробуждения
+        retry_links = [(index_by_link[link], link) for link, _ in catalog.retry_due(index_by_link)]
+        round_workers = min(max_workers, len(retry_links))
+        round_transcode_workers = min(max_transcode_workers, len(retry_links))
+        results, unfinished = _run_pipeline(retry_links, archive_index, round_workers, round_transcode_workers, fetch_stats, transcode_stats, limiter=limiter, timings=timings)
+        link_results.update((index, (outcome, files)) for index, outcome, files in results)
+
+    if not unfinished:
+        catalog.finish_batch()
+    cleanup_partial_files(catalog)
+
+    # Слияние результатов выполняется только в этом потоке - гонок нет
+    for index in sorted(link_results):
+        outcome, files = link_results[index]
+        processed_files.extend(files)
+        if outcome == 'success': success_count += 1
+        elif outcome == 'skip': skip_download_count += 1
+        elif outcome == 'error': error_count += 1
+
+    if unfinished:
+        logger.warning(f"⚠️ Не обработано ссылок из-за критической ошибки: {unfinished}")
 
     # Итоги
     total_time = time.time() - start_time
     logger.info("-" * 30+"📊 Статистика скачивания:"+"-"*30)
     logger.info(f"✅ Успешно скачано/обработано новых треков: {success_count}")
-    logger.info(f"⏭️ Пропущено (фильтр/архив/плейлист): {skip_download_count}")
+    logger.info(f"⏭️ Пропущено (фильтр/архив/плейлист/отложено): {skip_download_count}")
     logger.info(f"❌ Ошибок обработки/скачивания: {error_count}")
+    if retry_rounds:
+        logger.info(f"🔁 Раундов повтора в этом запуске: {retry_rounds}")
+    waiting, next_at, failed = catalog.retry_summary()
+    if waiting or failed:
+        next_info = f", ближайший: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(next_at))}" if next_at else ""
+        logger.info(f"⏳ Очередь повторов: {waiting} ждут{next_info}; окончательно проваленных: {failed}")
+    fetch_stats.log_summary()
+    transcode_stats.log_summary()
+    if limiter is not None:
+        limiter.log_summary()
+    timings.log_summary()
+    timings.close()
     logger.info(f"⏱️ Общее время: {time.strftime('%H:%M:%S', time.gmtime(total_time))}")
     logger.info("-" * (60 + len("📊 Статистика скачивания:")))
 
+    if own_catalog:
+        catalog.close()
+
     # --- ВОЗВРАТ РЕЗУЛЬТАТОВ ---
     return processed_files, success_count, skip_download_count, error_count
 # --->>> КОНЕЦ ФУНКЦИИ download_tracks <<<---
 
 
+# --->>> НАЧАЛО ФУНКЦИИ cleanup_partial_files <<<---
+def cleanup_partial_files(catalog, downloads_dir=None):
+    """
+    Удаляет осиротевшие незавершенные файлы (.part, .ytdl, .part-FragN) и исходники,
+    оставшиеся от прерванных запусков. Файлы ссылок, которые еще будут обрабатываться
+    (pending/error), сохраняются для докачки.
+    """
+    downloads_dir = downloads_dir or DOWNLOADS_DIR
+    if not os.path.isdir(downloads_dir):
+        return 0
+    downloads_index = shared_index(downloads_dir)
+    resumable, finished = catalog.work_files()
+    resumable = {os.path.basename(name) for name in resumable}
+    finished = {os.path.basename(name) for name in finished}
+
+    def base_name(filename):
+        # 'track.opus.part' / 'track.opus.part-Frag3' / 'track.opus.ytdl' -> 'track.opus'
+        for marker in ('.part-Frag', '.part', '.ytdl'):
+            pos = filename.rfind(marker)
+            if pos > 0 and (filename.endswith(marker) or marker == '.part-Frag'):
+                return filename[:pos]
+        return None
+
+    removed = 0
+    for name in downloads_index.names():
+        partial_of = base_name(name)
+        if partial_of is not None:
+            orphan = partial_of not in resumable
+        else:
+            # Исходник завершенной ссылки (перекодирование не удалось, ссылка больше не качается).
+            # Итоговые файлы скачанных треков в finished не попадают (catalog.work_files).
+            orphan = name in finished
+        if not orphan:
+            continue
+        try:
+            os.remove(downloads_index.path(name))
+            downloads_index.discard(name)
+            removed += 1
+            logger.debug(f"Удален незавершенный файл: {name}")
+        except OSError as e:
+            logger.error(f"Ошибка при удалении незавершенного файла {name}: {e}")
+    if removed:
+        logger.info(f"🧹 Удалено осиротевших незавершенных файлов: {removed}")
+    return removed
+# --->>> КОНЕЦ ФУНКЦИИ cleanup_partial_files <<<---
+
+
 # --->>> НАЧАЛО ФУНКЦИИ cleanup_temp_files <<<---
 def cleanup_temp_files():
     """Удаляет временные файлы обложек, если настроено."""
@@ -249,18 +776,20 @@ def cleanup_temp_files():
              logger.warning(f"Папка {DOWNLOADS_DIR} не найдена, очистка не требуется.")
              return
 
-        for filename in os.listdir(DOWNLOADS_DIR):
+        # Только файлы обложек (по индексу папки, без listdir и проверок exists)
+        downloads_index = shared_index(DOWNLOADS_DIR)
+        for filename in downloads_index.names(COVER_EXTENSIONS):
             filepath = os.path.join(DOWNLOADS_DIR, filename)
             try:
-                # Удаляем только файлы обложек, связанные с существующими MP3
-                if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
-                     mp3_equivalent = os.path.splitext(filepath)[0] + '.mp3'
-                     if os.path.exists(mp3_equivalent):
-                          os.remove(filepath)
-                          thumb_count += 1
-                          logger.debug(f"Удалена обложка: {filename}")
-                     else:
-                          logger.debug(f"Обложка {filename} оставлена (нет MP3).")
+                # Удаляем только файлы обложек, связанные с существующими треками
+                base = os.path.splitext(filename)[0]
+                if downloads_index.find(base, AUDIO_EXTENSIONS):
+                     os.remove(filepath)
+                     downloads_index.discard(filename)
+                     thumb_count += 1
+                     logger.debug(f"Удалена обложка: {filename}")
+                else:
+                     logger.debug(f"Обложка {filename} оставлена (нет аудиофайла).")
             except OSError as e:
                 logger.error(f"Ошибка при удалении файла {filename}: {e}")
             except Exception as e_inner:
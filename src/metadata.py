@@ -2,17 +2,78 @@
 import os
 import logging
 from math import floor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import mutagen
 from mutagen.mp3 import MP3, HeaderNotFoundError
 from mutagen.easyid3 import EasyID3
 
+from .mp3info import read_mp3_info
+from .config import PLAYLIST_METADATA_WORKERS, PLAYLIST_METADATA_POOL, PLAYLIST_METADATA_CHUNK_SIZE
+
 # Настройка логгера для этого модуля
 logger = logging.getLogger(__name__)
 
-def get_track_metadata(filepath):
+def open_audio(filepath):
+    """
+    Открывает аудиофайл библиотеки с "простыми" тегами (title, artist, ...):
+    MP3 через EasyID3, остальные форматы (m4a, opus, ogg) - через mutagen.File(easy=True).
+    """
+    if filepath.lower().endswith('.mp3'):
+        return MP3(filepath, ID3=EasyID3)
+    audio = mutagen.File(filepath, easy=True)
+    if audio is None:
+        raise mutagen.MutagenError(f"Неподдерживаемый формат файла: {os.path.basename(filepath)}")
+    return audio
+
+# Теги, которые нужны плейлистам и очистке
+BASIC_TAGS = ('title', 'artist', 'composer', 'albumartist')
+# Колонки library с уменьшенными обложками (их заполняет src.covers)
+ART_FIELDS = ('art_source', 'art_mtime', 'art_thumb', 'art_cover')
+
+def read_basic_tags(filepath):
+    """
+    Возвращает (теги, длительность в секундах): словарь BASIC_TAGS -> строка (только найденные).
+    MP3 читаются быстрым путем (src.mp3info, только заголовки); необычные файлы
+    и остальные форматы - mutagen (его исключения пробрасываются).
+    """
+    if filepath.lower().endswith('.mp3'):
+        info = read_mp3_info(filepath)
+        if info is not None:
+            length = info.pop('length')
+            return info, length
+        logger.debug(f"Быстрое чтение не подошло, используем mutagen: {os.path.basename(filepath)}")
+    audio = open_audio(filepath)
+    tags = {}
+    for tag in BASIC_TAGS:
+        try:
+            if audio.get(tag): tags[tag] = audio[tag][0]
+        except KeyError: pass
+    return tags, audio.info.length
+
+def _read_basic_tags_safe(filepath):
     """
-    Извлекает метаданные (название, исполнитель, длительность) из MP3 файла.
+    read_basic_tags для пула: вместо исключения возвращает его самого, чтобы ошибка
+    была залогирована в основном процессе get_track_metadata, как при чтении без пула.
+    """
+    try:
+        return read_basic_tags(filepath)
+    except Exception as e:
+        return e
+
+def get_track_metadata(filepath, basic_tags=None):
+    """
+    Извлекает метаданные (название, исполнитель, длительность) из аудиофайла
+    (MP3 или сохраненного без перекодирования m4a/opus/ogg).
+    basic_tags - уже прочитанный в пуле результат read_basic_tags (или его исключение).
     Возвращает кортеж (title: str, artist: str, duration: int).
     """
+    return _read_track_metadata(filepath, basic_tags)[0]
+
+def _read_track_metadata(filepath, basic_tags=None):
+    """
+    get_track_metadata с признаком успеха: ((title, artist, duration), True) или,
+    если файл не прочитался, (значения по умолчанию, False) - их нельзя кэшировать.
+    """
     title = None
     artist = None
     duration = 0
@@ -20,21 +81,21 @@ def get_track_metadata(filepath):
     filename_no_ext = filename_base.rsplit('.', 1)[0]
 
     try:
-        audio = MP3(filepath, ID3=EasyID3)
-        duration = floor(audio.info.length) if audio.info.length and audio.info.length > 0 else 0
+        if basic_tags is None:
+            basic_tags = read_basic_tags(filepath)
+        if isinstance(basic_tags, Exception):
+            raise basic_tags
+        tags, length = basic_tags
+        duration = floor(length) if length and length > 0 else 0
 
-        # Пытаемся получить теги, обрабатывая возможный KeyError
-        try: title = audio['title'][0].strip() if audio.get('title') else None
-        except KeyError: pass
-        try: artist = audio['artist'][0].strip() if audio.get('artist') else None
-        except KeyError: pass
+        title = tags['title'].strip() if tags.get('title') else None
+        artist = tags['artist'].strip() if tags.get('artist') else None
 
         # --- Улучшенная логика определения исполнителя ---
         if not artist:
             tags_to_try = ['composer', 'albumartist']
             for tag in tags_to_try:
-                 try: artist = audio[tag][0].strip() if audio.get(tag) else None
-                 except KeyError: pass
+                 artist = tags[tag].strip() if tags.get(tag) else None
                  if artist: break # Нашли - выходим
 
             # Попробовать извлечь из имени файла, если artist все еще не найден
@@ -60,7 +121,7 @@ def get_track_metadata(filepath):
         title = title.strip()
         artist = artist.strip()
 
-        return title, artist, duration
+        return (title, artist, duration), True
 
     except HeaderNotFoundError:
         logger.error(f"Не удалось прочитать MP3 заголовок: {filename_base}")
@@ -68,4 +129,111 @@ def get_track_metadata(filepath):
         logger.error(f"Ошибка чтения метаданных {filename_base}: {e}", exc_info=True)
 
     # Возвращаем значения по умолчанию в случае серьезной ошибки
-    return filename_no_ext, "Unknown Artist", 0
\ No newline at end of file
+    return (filename_no_ext, "Unknown Artist", 0), False
+
+
+class MetadataCache:
+    """
+    Постоянный кэш get_track_metadata в таблице library каталога (src.catalog.TrackCatalog).
+    Ключ - имя файла в папке загрузок, размер и mtime: при совпадении файл не открывается
+    mutagen'ом вообще. Таблица читается из базы один раз, поэтому один экземпляр можно
+    передать всем генераторам плейлистов за запуск; изменения и удаление записей
+    исчезнувших файлов пишутся одной транзакцией в flush().
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._rows = {name: dict(row) for name, row in catalog.library_rows().items()}
+        self._changed = {}
+        self._prefetched = {} # имя файла -> (размер, mtime, результат read_basic_tags)
+        self.hits = 0
+        self.misses = 0
+
+    def _cached_row(self, filename, size, mtime):
+        row = self._changed.get(filename) or self._rows.get(filename)
+        if row is not None and size is not None and row['size'] == size and row['mtime'] == mtime:
+            return row
+        return None
+
+    def prefetch(self, files, workers=None, pool=None, chunk_size=None):
+        """
+        Заранее читает теги новых/измененных файлов в пуле потоков или процессов.
+        files - список (путь, размер, mtime). Результаты забирает get() в обычном
+        последовательном проходе, поэтому порядок плейлиста и логи ошибок не меняются.
+        """
+        workers = workers or PLAYLIST_METADATA_WORKERS or os.cpu_count() or 1
+        pool = pool or PLAYLIST_METADATA_POOL
+        chunk_size = max(1, chunk_size or PLAYLIST_METADATA_CHUNK_SIZE)
+        pending = [
+            (filepath, size, mtime) for filepath, size, mtime in files
+            if os.path.basename(filepath) not in self._prefetched
+            and self._cached_row(os.path.basename(filepath), size, mtime) is None
+        ]
+        # Пул не нужен, если читать нечего или почти нечего
+        workers = min(workers, -(-len(pending) // chunk_size) if pool == 'process' else len(pending))
+        if workers <= 1:
+            return
+        executor_class = ProcessPoolExecutor if pool == 'process' else ThreadPoolExecutor
+        logger.info(f"🗃️ Чтение тегов {len(pending)} файлов: пул {pool}, {workers} воркеров.")
+        try:
+            with executor_class(max_workers=workers) as executor:
+                results = executor.map(_read_basic_tags_safe, [filepath for filepath, _, _ in pending], chunksize=chunk_size)
+                for (filepath, size, mtime), result in zip(pending, results):
+                    self._prefetched[os.path.basename(filepath)] = (size, mtime, result)
+        except Exception as e:
+            # Например, упавший процесс пула: непрочитанные файлы get() прочитает сам
+            logger.warning(f"⚠️ Параллельное чтение тегов прервано ({e}), остальные файлы будут прочитаны последовательно.")
+
+    def get(self, filepath, size, mtime):
+        """(title, artist, duration) из кэша или, для новых/измененных файлов, из тегов."""
+        filename = os.path.basename(filepath)
+        row = self._cached_row(filename, size, mtime)
+        if row is not None:
+            self.hits += 1
+            return row['title'], row['artist'], row['duration']
+        self.misses += 1
+        row = self._changed.get(filename) or self._rows.get(filename)
+        prefetched = self._prefetched.pop(filename, None)
+        basic_tags = prefetched[2] if prefetched is not None and prefetched[:2] == (size, mtime) else None
+        (title, artist, duration), ok = _read_track_metadata(filepath, basic_tags)
+        if not ok:
+            # Файл мог еще записываться или быть заблокирован: не запоминаем, в следующий раз прочитаем снова
+            return title, artist, duration
+        self._changed[filename] = {
+            'file_path': filename, 'size': size, 'mtime': mtime,
+            'title': title, 'artist': artist, 'duration': duration,
+            'cover': row['cover'] if row is not None else '',
+            **{field: row[field] if row is not None else None for field in ART_FIELDS},
+        }
+        return title, artist, duration
+
+    def set_cover(self, filename, cover):
+        """Запоминает имя файла обложки трека ('' если нет)."""
+        row = self._changed.get(filename) or self._rows.get(filename)
+        if row is not None and row['cover'] != cover:
+            self._changed[filename] = dict(row, cover=cover)
+
+    def get_art(self, filename):
+        """Запись об уменьшенных обложках трека (словарь ART_FIELDS) или None."""
+        row = self._changed.get(filename) or self._rows.get(filename)
+        return {field: row.get(field) for field in ART_FIELDS} if row is not None else None
+
+    def set_art(self, filename, **art):
+        """Запоминает уменьшенные обложки трека (см. src.covers)."""
+        row = self._changed.get(filename) or self._rows.get(filename)
+        if row is not None and any(row.get(field) != value for field, value in art.items()):
+            self._changed[filename] = dict(row, **art)
+
+    def flush(self, present_filenames):
+        """Записывает измененные файлы и удаляет записи файлов, которых больше нет на диске."""
+        removed = set(self._rows) - set(present_filenames)
+        if self._changed or removed:
+            self.catalog.update_library(list(self._changed.values()), removed)
+            logger.info(f"🗃️ Кэш метаданных обновлен: изменено {len(self._changed)}, удалено {len(removed)}.")
+        for filename in removed:
+            del self._rows[filename]
+        self._rows.update(self._changed)
+        self._changed = {}
+
+    def log_summary(self):
+        logger.info(f"🗃️ Кэш метаданных: из кэша {self.hits}, прочитано тегов {self.misses}.")
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Быстрое чтение названия, исполнителя и длительности MP3 без mutagen: читаются
+только заголовок ID3v2 и нужные текстовые кадры (встроенная обложка APIC
+пропускается через seek), первый MPEG-кадр и заголовок Xing/Info/VBRI/LAME.
+Для необычных файлов (ID3v2.2, unsynchronisation, сжатые кадры, тег ID3v1 в конце
+файла, MPEG-кадр не найден в первых SYNC_SEARCH_BYTES после тега и т.п.) read_mp3_info
+возвращает None - тогда используется mutagen. Длительность считается так же, как в mutagen.
+"""
+import os
+import struct
+import logging
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Кадры ID3v2.3/2.4 -> ключи EasyID3, которые использует src.metadata
+TEXT_FRAMES = {b'TIT2': 'title', b'TPE1': 'artist', b'TCOM': 'composer', b'TPE2': 'albumartist'}
+TEXT_ENCODINGS = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}
+
+# Тег ID3v1 - последние 128 байт файла, начинаются с 'TAG'
+ID3V1_SIZE = 128
+
+# Окно поиска первого MPEG-кадра после тега (паддинг, мусор) - дальше не ищем, это работа mutagen
+SYNC_SEARCH_BYTES = 16 * 1024
+
+# Битрейты (кбит/с): [MPEG1 / MPEG2 и 2.5][слой I, II, III][индекс]
+BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+
+def _synchsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_text(data):
+    """Текстовый кадр ID3: байт кодировки + текст; несколько значений разделены нулем - берем первое."""
+    if not data or data[0] not in TEXT_ENCODINGS:
+        return None
+    encoding = TEXT_ENCODINGS[data[0]]
+    text = data[1:].decode(encoding, errors='replace')
+    return text.split('\x00', 1)[0] or None
+
+
+def _read_id3_tags(f):
+    """
+    Читает теги ID3v2 с начала файла. Возвращает (tags, audio_offset) или None,
+    если тег нестандартный и его лучше разобрать mutagen'ом.
+    """
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b'ID3':
+        return {}, 0
+    version, flags = header[3], header[5]
+    if version not in (3, 4) or flags & 0x80: # ID3v2.2 и unsynchronisation - в mutagen
+        return None
+    tag_size = _synchsafe(header[6:10])
+    tag_end = 10 + tag_size
+    audio_offset = tag_end + (10 if version == 4 and flags & 0x10 else 0) # футер ID3v2.4
+    position = 10
+    if flags & 0x40: # Расширенный заголовок пропускаем
+        ext = f.read(4)
+        ext_size = _synchsafe(ext) if version == 4 else struct.unpack('>I', ext)[0] + 4
+        position += ext_size
+        f.seek(position)
+
+    tags = {}
+    while position + 10 <= tag_end and len(tags) < len(TEXT_FRAMES):
+        frame_header = f.read(10)
+        frame_id = frame_header[:4]
+        if len(frame_header) < 10 or frame_id[:1] == b'\x00': # Начался паддинг
+            break
+        size = _synchsafe(frame_header[4:8]) if version == 4 else struct.unpack('>I', frame_header[4:8])[0]
+        position += 10 + size
+        if position > tag_end:
+            return None
+        if frame_id in TEXT_FRAMES and frame_id not in tags:
+            format_flags = frame_header[9]
+            # Сжатие/шифрование/unsynchronisation кадра (2.4: 0x08/0x04/0x02, 2.3: 0x80/0x40)
+            if format_flags & (0x0E if version == 4 else 0xC0):
+                return None
+            tags[frame_id] = _decode_text(f.read(size))
+        else:
+            f.seek(position) # APIC и прочие кадры не читаем
+    return {TEXT_FRAMES[frame_id]: value for frame_id, value in tags.items() if value}, audio_offset
+
+
+def _parse_frame_header(data, pos):
+    """Разбирает 4-байтный заголовок MPEG-кадра. None, если это не заголовок."""
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version_bits, layer_bits = (b1 >> 3) & 3, (b1 >> 1) & 3
+    bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    version = {3: 1, 2: 2, 0: 2.5}[version_bits]
+    layer = 4 - layer_bits
+    bitrate = BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    mono = (b3 >> 6) == 3
+    if layer == 1:
+        samples = 384
+        frame_size = (12 * bitrate // sample_rate + ((b2 >> 1) & 1)) * 4
+    else:
+        samples = 1152 if layer == 2 or version == 1 else 576
+        frame_size = samples // 8 * bitrate // sample_rate + ((b2 >> 1) & 1)
+    if layer == 3:
+        side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+    else:
+        side_info = 0
+    return {'version': version, 'layer': layer, 'bitrate': bitrate, 'sample_rate': sample_rate,
+            'samples': samples, 'frame_size': frame_size, 'side_info': side_info}
+
+
+def _vbr_length(data, pos, frame):
+    """Длительность по заголовку Xing/Info (с задержкой/паддингом LAME) или VBRI. None, если заголовка нет."""
+    xing = pos + 4 + frame['side_info']
+    if data[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', data[xing + 4:xing + 8])[0]
+        if not flags & 1:
+            return None
+        frames = struct.unpack('>I', data[xing + 8:xing + 12])[0]
+        samples = frames * frame['samples']
+        lame = xing + 8 + 4 * bin(flags & 0x0B).count('1') + (100 if flags & 4 else 0)
+        if data[lame:lame + 4] == b'LAME' and len(data) >= lame + 24:
+            delay_padding = int.from_bytes(data[lame + 21:lame + 24], 'big')
+            samples -= (delay_padding >> 12) + (delay_padding & 0xFFF)
+        return max(samples, 0) / frame['sample_rate']
+    vbri = pos + 4 + 32
+    if data[vbri:vbri + 4] == b'VBRI':
+        frames = struct.unpack('>I', data[vbri + 14:vbri + 18])[0]
+        return frames * frame['samples'] / frame['sample_rate']
+    return None
+
+
+def read_mp3_info(filepath):
+    """
+    Возвращает словарь {'title', 'artist', 'composer', 'albumartist' (если есть), 'length'}
+    или None, если файл нужно разобрать mutagen'ом.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            if file_size >= ID3V1_SIZE:
+                # ID3v1 mutagen читает (и дополняет им ID3v2), а его 128 байт не входят в аудио
+                f.seek(-ID3V1_SIZE, os.SEEK_END)
+                if f.read(3) == b'TAG':
+                    return None
+                f.seek(0)
+            parsed = _read_id3_tags(f) if file_size > 10 else None
+            if parsed is None:
+                return None
+            tags, audio_offset = parsed
+            f.seek(audio_offset)
+            data = f.read(SYNC_SEARCH_BYTES)
+    except (OSError, struct.error) as e:
+        logger.debug(f"Быстрое чтение MP3 не удалось для {os.path.basename(filepath)}: {e}")
+        return None
+
+    pos = data.find(b'\xff')
+    while pos != -1 and pos + 4 <= len(data):
+        frame = (data[pos + 1] & 0xE0) == 0xE0 and _parse_frame_header(data, pos)
+        if frame:
+            next_pos = pos + frame['frame_size']
+            # Первый кадр подтверждается синхрословом следующего (как и mutagen, не верим одиночному 0xFF)
+            if next_pos + 2 > len(data) or (data[next_pos] == 0xFF and (data[next_pos + 1] & 0xE0) == 0xE0):
+                break
+        pos = data.find(b'\xff', pos + 1)
+    else:
+        return None
+
+    try:
+        length = _vbr_length(data, pos, frame)
+    except struct.error: # Обрезанный заголовок Xing/VBRI
+        return None
+    if length is None:
+        # Без заголовка Xing/VBRI длительность точна только для CBR - как и оценка mutagen
+        length = 8 * (file_size - audio_offset - pos) / frame['bitrate']
+    tags['length'] = length
+    return tags
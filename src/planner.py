@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import queue
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import yt_dlp
+
+from .config import DOWNLOADS_DIR, PLAN_FILE, PLAN_WORKERS, PLAN_MAX_AGE_SECONDS, RATE_LIMIT_ENABLED
+from .utils import filter_tracks_only, find_audio_file
+from .archive import ArchiveIndex, normalize_link
+from .ratelimit import AdaptiveRateLimiter, RateLimitedYoutubeDL
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Статусы ссылок в плане
+PLAN_DOWNLOAD = 'download' # Будет скачана
+PLAN_FILTERED = 'filtered' # Отсеяна фильтром треков
+PLAN_ARCHIVED = 'archived' # Уже скачана
+PLAN_ERROR = 'error' # Метаданные получить не удалось - будет проверена при скачивании
+
+
+def _build_probe_opts():
+    """Опции yt-dlp для планирования: только метаданные и выбор формата, без скачивания."""
+    return {
+        'format': 'bestaudio/best', # Тот же выбор формата, что и при скачивании - для оценки размера
+        'quiet': True,
+        'noplaylist': True,
+        'skip_download': True,
+    }
+
+
+def estimate_bytes(info):
+    """Оценка размера скачиваемого аудио: размер выбранного формата или битрейт * длительность."""
+    formats = info.get('requested_formats') or [info]
+    total = 0
+    for fmt in formats:
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size:
+            bitrate = fmt.get('abr') or fmt.get('tbr') # кбит/с
+            duration = info.get('duration')
+            size = bitrate * 1000 / 8 * duration if bitrate and duration else 0
+        total += size
+    return int(total)
+
+
+def _track_fields(info):
+    """Минимальный набор полей трека, достаточный для записи в каталог без повторного запроса."""
+    return {
+        'id': info.get('id'),
+        'extractor_key': info.get('extractor_key') or info.get('ie_key'),
+        'title': info.get('title'),
+        'duration': info.get('duration'),
+    }
+
+
+def _probe_link(ydl, archive_index, link):
+    """Получает метаданные ОДНОЙ ссылки и решает, что с ней будет при скачивании. Возвращает запись плана."""
+    entry = {'link': link}
+    is_archived, archived_path = archive_index.lookup(link)
+    if is_archived:
+        entry.update(status=PLAN_ARCHIVED, file=os.path.basename(archived_path) if archived_path else None)
+        return entry
+    try:
+        info = ydl.extract_info(link, download=False)
+    except yt_dlp.utils.DownloadError as e:
+        entry.update(status=PLAN_ERROR, reason=str(e))
+        return entry
+    except Exception as e_inner:
+        logger.error(f"❌ Неожиданная ошибка при проверке {link}: {e_inner}", exc_info=True)
+        entry.update(status=PLAN_ERROR, reason=str(e_inner))
+        return entry
+
+    if info is None:
+        entry.update(status=PLAN_ERROR, reason="Нет информации о треке")
+    elif info.get('_type') == 'playlist':
+        entry.update(status=PLAN_FILTERED, reason="Плейлист", title=info.get('title'))
+    elif archive_index.contains(info):
+        existing_path = find_audio_file(DOWNLOADS_DIR, info.get('title', 'unknown_track'))
+        entry.update(_track_fields(info), status=PLAN_ARCHIVED,
+                     file=os.path.basename(existing_path) if existing_path else None)
+    else:
+        reason = filter_tracks_only(info)
+        if reason:
+            entry.update(_track_fields(info), status=PLAN_FILTERED, reason=reason)
+        else:
+            # Полные метаданные сохраняются, чтобы скачивание обошлось без повторного запроса
+            entry.update(_track_fields(info), status=PLAN_DOWNLOAD, estimated_bytes=estimate_bytes(info),
+                         info=ydl.sanitize_info(info))
+    return entry
+
+
+def _probe_worker(worker_id, link_queue, archive_index, limiter=None):
+    """Воркер планирования: свой YoutubeDL, ссылки из общей очереди. Возвращает [(index, entry)]."""
+    results = []
+    logger.debug(f"Воркер планирования #{worker_id} запущен.")
+    with RateLimitedYoutubeDL(_build_probe_opts(), limiter=limiter) as ydl:
+        while True:
+            try:
+                index, link = link_queue.get_nowait()
+            except queue.Empty:
+                break
+            if limiter is not None:
+                with limiter.slot():
+                    results.append((index, _probe_link(ydl, archive_index, link)))
+            else:
+                results.append((index, _probe_link(ydl, archive_index, link)))
+    return results
+
+
+def build_plan(links, catalog, workers=None):
+    """
+    Планирование без скачивания: параллельно получает метаданные всех ссылок
+    (extract_info(download=False)) и применяет тот же фильтр треков, что и скачивание.
+    Возвращает словарь плана: created_at, summary и tracks (в порядке ссылок).
+    """
+    start_time = time.time()
+    archive_index = ArchiveIndex(catalog)
+    link_queue = queue.Queue()
+    for index, link in enumerate(links):
+        link_queue.put((index, link))
+    workers = max(1, min(int(workers or PLAN_WORKERS), len(links))) if links else 0
+    logger.info(f"🔎 Планирование: проверка {len(links)} ссылок ({workers} потоков)...")
+    limiter = AdaptiveRateLimiter(max_concurrency=workers) if RATE_LIMIT_ENABLED and workers else None
+
+    results = []
+    if workers:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plan") as executor:
+            futures = [executor.submit(_probe_worker, worker_id, link_queue, archive_index, limiter) for worker_id in range(1, workers + 1)]
+            for future in as_completed(futures):
+                try:
+                    results.extend(future.result())
+                except Exception as e_worker:
+                    logger.critical(f"Критическая ошибка в воркере планирования: {e_worker}", exc_info=True)
+
+    tracks = [entry for _, entry in sorted(results, key=lambda r: r[0])]
+    to_download = [entry for entry in tracks if entry['status'] == PLAN_DOWNLOAD]
+    summary = {status: sum(1 for entry in tracks if entry['status'] == status)
+               for status in (PLAN_DOWNLOAD, PLAN_FILTERED, PLAN_ARCHIVED, PLAN_ERROR)}
+    summary['total_duration'] = sum(entry.get('duration') or 0 for entry in to_download)
+    summary['estimated_bytes'] = sum(entry.get('estimated_bytes') or 0 for entry in to_download)
+    summary['probe_seconds'] = round(time.time() - start_time, 1)
+    if limiter is not None:
+        limiter.log_summary()
+    return {'created_at': time.time(), 'summary': summary, 'tracks': tracks}
+
+
+def log_plan_summary(plan):
+    summary = plan['summary']
+    logger.info("-" * 30 + "🗺️ План скачивания:" + "-" * 30)
+    logger.info(f"⬇️ К скачиванию: {summary[PLAN_DOWNLOAD]} треков, "
+                f"{time.strftime('%H:%M:%S', time.gmtime(summary['total_duration']))} аудио, "
+                f"~{summary['estimated_bytes'] / 1024 / 1024:.1f} МБ")
+    logger.info(f"⏭️ Отсеяно фильтром: {summary[PLAN_FILTERED]}")
+    logger.info(f"🗂️ Уже в архиве: {summary[PLAN_ARCHIVED]}")
+    logger.info(f"❓ Не удалось проверить: {summary[PLAN_ERROR]}")
+    logger.info(f"⏱️ Проверка заняла {summary['probe_seconds']} сек")
+    logger.info("-" * (60 + len("🗺️ План скачивания:")))
+
+
+def write_plan(plan, plan_file=PLAN_FILE):
+    """Сохраняет план атомарно (через временный файл)."""
+    os.makedirs(os.path.dirname(plan_file), exist_ok=True)
+    tmp_file = plan_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, ensure_ascii=False)
+    os.replace(tmp_file, plan_file)
+    logger.info(f"💾 План сохранен: {plan_file}")
+
+
+def _remove_plan(plan_file):
+    try:
+        os.remove(plan_file)
+    except OSError as e:
+        logger.warning(f"Не удалось удалить план {plan_file}: {e}")
+
+
+def load_plan(plan_file=PLAN_FILE, max_age=PLAN_MAX_AGE_SECONDS):
+    """
+    Загружает план для скачивания: словарь нормализованная_ссылка -> запись плана.
+    Возвращает None, если плана нет, он поврежден или устарел (ссылки на аудио
+    в метаданных имеют ограниченный срок жизни); такой план удаляется.
+    """
+    try:
+        with open(plan_file, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+        age = time.time() - float(plan.get('created_at', 0))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"Не удалось прочитать план {plan_file}, он будет удален: {e}")
+        _remove_plan(plan_file)
+        return None
+    if age > max_age:
+        logger.info(f"План {plan_file} устарел ({age / 3600:.1f} ч) и удален, будет выполнена обычная проверка ссылок.")
+        _remove_plan(plan_file)
+        return None
+    try:
+        entries = {normalize_link(entry['link']): entry for entry in plan.get('tracks', [])}
+    except (KeyError, TypeError, AttributeError) as e:
+        logger.warning(f"План {plan_file} поврежден и будет удален: {e}")
+        _remove_plan(plan_file)
+        return None
+    logger.info(f"🗺️ Используется план от {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - age))}: {len(entries)} ссылок.")
+    return entries
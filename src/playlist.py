@@ -1,129 +1,209 @@
 # -*- coding: utf-8 -*-
 import os
+import re
 import json
+import gzip
+import hashlib
 import logging
-from .metadata import get_track_metadata
+import unicodedata
+from bisect import bisect_right
+import xml.etree.ElementTree as ET
+from urllib.parse import quote
+from .metadata import MetadataCache
+from .catalog import TrackCatalog
+from .dirindex import shared_index, COVER_EXTENSIONS
+from .covers import attach_cover_thumbs, THUMB_NAME_RE
 # --- ИЗМЕНЕНО: Импортируем нужные пути и настройки из конфига ---
-from .config import INCLUDE_DURATION_IN_JSON, WEB_PLAYER_DIR, DOWNLOADS_DIR
+from .config import (
+    INCLUDE_DURATION_IN_JSON, WEB_PLAYER_DIR, DOWNLOADS_DIR, PLAYLIST_FORMATS,
+    PLAYLIST_JSON_FILE, PLAYLIST_M3U_FILE, PLAYLIST_XSPF_FILE, PLAYLIST_JSON_SORT_ORDER,
+    PLAYLIST_PAGES_DIR, PLAYLIST_PAGE_SIZE, PLAYLIST_COMPACT, PLAYLIST_COLUMNAR, PLAYLIST_PRECOMPRESS,
+    PLAYLIST_SEARCH_INDEX, PLAYLIST_SEARCH_INDEX_FILE, PLAYER_PRELOAD_MAX_BYTES
+)
+
+try:
+    import brotli # Необязательная зависимость: без нее пишутся только .gz версии плейлиста
+except ImportError:
+    brotli = None
 
 # Настройка логгера
 logger = logging.getLogger(__name__)
 
-def create_playlist_json(output_dir, output_file, sort_order='title'):
+# Версия формата постраничного плейлиста (манифест + страницы)
+PAGED_PLAYLIST_VERSION = 2
+SEARCH_INDEX_VERSION = 1
+# Поля-пути плейлиста: общий префикс base хранится один раз
+PATH_FIELDS = ('src', 'cover', 'thumb')
+# Слово для поиска - буквы/цифры (в плеере то же правило: /[\p{L}\p{N}_]+/gu)
+SEARCH_TOKEN_RE = re.compile(r'\w+')
+
+
+def scan_library(output_dir, catalog=None, metadata_cache=None):
     """
-    Создает JSON-плейлист для веб-плеера из ВСЕХ mp3 файлов в output_dir.
-    Использует относительные пути от папки web_player.
+    Один проход по библиотеке для всех форматов плейлистов: список треков
+    (в порядке файловой системы) - словари filename, filepath, title, artist,
+    duration, cover (полный путь к обложке или None) и thumb/web_cover (уменьшенные
+    обложки для плеера, см. src.covers).
+    Метаданные неизмененных файлов берутся из кэша (metadata_cache, общий для всех
+    плейлистов запуска, или кэш в каталоге catalog / каталоге по умолчанию).
+    Возвращает None, если папки нет.
     """
-    playlist_items = []
-    logger.info(f"Создание JSON плейлиста (сортировка: {sort_order})...")
-
     # Убедимся, что output_dir это ожидаемая папка downloads
     # Эта проверка нестрогая, но может помочь
     if os.path.normpath(output_dir) != os.path.normpath(DOWNLOADS_DIR):
-         logger.warning(f"Папка для сканирования MP3 ({output_dir}) не совпадает с DOWNLOADS_DIR ({DOWNLOADS_DIR}) из конфига. Пути могут быть неверными.")
+         logger.warning(f"Папка для сканирования аудио ({output_dir}) не совпадает с DOWNLOADS_DIR ({DOWNLOADS_DIR}) из конфига. Пути могут быть неверными.")
+
+    if not os.path.isdir(output_dir):
+         logger.error(f"Папка для сканирования аудио не найдена: {output_dir}")
+         return None
+    # Индекс папки общий с downloader: после скачивания в том же запуске папка не перечитывается
+    dir_index = shared_index(output_dir)
+    # Собираем пути к аудиофайлам
+    mp3_filepaths = [os.path.join(output_dir, f) for f in dir_index.audio_files()]
+    logger.info(f"Найдено {len(mp3_filepaths)} аудиофайлов для обработки в {output_dir}.")
+
+    own_catalog = catalog is None and metadata_cache is None
+    if own_catalog:
+        catalog = TrackCatalog()
+    if metadata_cache is None:
+        metadata_cache = MetadataCache(catalog)
+
+    # Теги новых/измененных файлов читаются заранее в пуле, дальше проход по порядку
+    metadata_cache.prefetch([(p, *(dir_index.stat(p) or (None, None))) for p in mp3_filepaths])
+
+    tracks = []
+    for filepath in mp3_filepaths:
+        track = _library_track(output_dir, os.path.basename(filepath), dir_index, metadata_cache)
+        if track is not None:
+            tracks.append(track)
+    attach_cover_thumbs(tracks, dir_index, metadata_cache)
 
     try:
-        # Собираем пути к mp3 файлам
-        mp3_filepaths = [
-            os.path.join(output_dir, f)
-            for f in os.listdir(output_dir)
-            if f.lower().endswith('.mp3') and not f.endswith('.part')
-        ]
-        logger.info(f"Найдено {len(mp3_filepaths)} MP3 файлов для обработки в {output_dir}.")
-    except FileNotFoundError:
-         logger.error(f"Папка для сканирования MP3 не найдена: {output_dir}")
-         return False
+        metadata_cache.flush([os.path.basename(p) for p in mp3_filepaths])
     except Exception as e:
-        logger.error(f"Ошибка при сканировании папки {output_dir}: {e}")
-        return False
+        logger.error(f"Ошибка обновления каталога библиотеки: {e}", exc_info=True)
+    finally:
+        if own_catalog: catalog.close()
+    return tracks
 
-    # Извлекаем метаданные и формируем пути для всех файлов
-    items_data = []
-    web_player_full_path = WEB_PLAYER_DIR # Путь к папке плеера из конфига
 
-    for filepath in mp3_filepaths:
-        filename = os.path.basename(filepath)
-        try:
-            title, artist, duration = get_track_metadata(filepath) # Получаем метаданные
+def _library_track(output_dir, filename, dir_index, metadata_cache):
+    """Трек модели плейлиста для одного файла библиотеки; None при ошибке (она логируется)."""
+    filepath = os.path.join(output_dir, filename)
+    try:
+        title, artist, duration = metadata_cache.get(filepath, *dir_index.stat(filename) or (None, None)) # Получаем метаданные
+        # Ищем обложки в папке downloads (output_dir) - по индексу, без проверок на диске
+        thumb_name = dir_index.find(os.path.splitext(filename)[0], COVER_EXTENSIONS)
+        metadata_cache.set_cover(filename, thumb_name or '')
+        return {
+            "filename": filename,
+            "filepath": filepath,
+            "title": title,
+            "artist": artist,
+            "duration": duration,
+            "cover": os.path.join(output_dir, thumb_name) if thumb_name else None,
+        }
+    except Exception as e:
+        logger.error(f"Ошибка добавления трека {filename} в плейлист: {e}", exc_info=True)
+        return None # Пропускаем трек
+
+
+def _relative_path(path, start):
+    """Путь от папки start для веб/плеера (прямые слеши); если relpath невозможен (разные диски) - None."""
+    try:
+        return os.path.relpath(path, start=start).replace('\\', '/')
+    except ValueError:
+        return None
 
-            # --- ИСПРАВЛЕНО: Расчет относительного пути к MP3 ---
-            try:
-                # Вычисляем путь от папки web_player к файлу MP3
-                relative_src_path = os.path.relpath(filepath, start=web_player_full_path)
-                # Заменяем обратные слеши на прямые для веб-совместимости
-                relative_src_path = relative_src_path.replace('\\', '/')
-                # Ожидаемый результат: '../downloads/track.mp3'
-            except ValueError:
-                 # Запасной вариант, если диски разные (маловероятно)
-                 relative_src_path = f"../{os.path.basename(output_dir)}/{filename}".replace('\\', '/')
-                 logger.warning(f"Не удалось вычислить относительный путь для {filename} через relpath, используется fallback: {relative_src_path}")
-            # --- КОНЕЦ ИСПРАВЛЕНИЯ MP3 пути ---
-
-            # --- ИСПРАВЛЕНО: Поиск обложки и расчет пути к ней ---
-            relative_cover_path = ""
-            thumbnail_base = os.path.splitext(filename)[0]
-            # Ищем обложки в папке downloads (output_dir)
-            for ext in ['.jpg', '.jpeg', '.png', '.webp']:
-                 thumb_name = thumbnail_base + ext
-                 thumb_full_path = os.path.join(output_dir, thumb_name) # Полный путь к файлу обложки
-                 if os.path.exists(thumb_full_path):
-                      try:
-                           # Вычисляем путь от папки web_player к файлу обложки
-                           relative_cover_path = os.path.relpath(thumb_full_path, start=web_player_full_path)
-                           relative_cover_path = relative_cover_path.replace('\\', '/')
-                           # Ожидаемый результат: '../downloads/track.jpg'
-                           break # Нашли обложку, выходим из цикла for ext
-                      except ValueError:
-                           relative_cover_path = f"../{os.path.basename(output_dir)}/{thumb_name}".replace('\\', '/')
-                           logger.warning(f"Не удалось вычислить относительный путь для обложки {thumb_name} через relpath, используется fallback: {relative_cover_path}")
-                           break # Нашли обложку, выходим из цикла for ext
-            # --- КОНЕЦ ИСПРАВЛЕНИЯ пути к обложке ---
-
-            # Формируем информацию о треке с ИСПРАВЛЕННЫМИ путями
-            item_info = {
-                "title": title,
-                "artist": artist,
-                "src": relative_src_path, # Используем исправленный путь
-                "cover": relative_cover_path, # Используем исправленный путь
-            }
-            if INCLUDE_DURATION_IN_JSON: # Убедимся, что эта переменная импортирована/определена
-                item_info["duration"] = duration
 
-            items_data.append(item_info)
+def _sort_key(sort_order):
+    """Ключ сортировки плейлиста для sort_order или None (порядок файловой системы)."""
+    if sort_order == 'artist':
+        return lambda x: (x['artist'] or "").lower() # Устойчивость к None
+    if sort_order == 'title':
+        return lambda x: (x['title'] or "").lower()
+    return None
 
-        except Exception as e:
-            logger.error(f"Ошибка добавления трека {filename} в JSON: {e}", exc_info=True)
-            continue # Пропускаем трек и переходим к следующему
 
-    # Сортировка (без изменений)
+def sort_tracks(tracks, sort_order):
+    """Сортировка треков: 'title', 'artist' или 'none' (порядок файловой системы)."""
     try:
-        sort_key = None
+        sort_key = _sort_key(sort_order)
         if sort_order == 'artist':
-            sort_key = lambda x: (x['artist'] or "").lower() # Устойчивость к None
             logger.info("Плейлист будет отсортирован по исполнителю.")
         elif sort_order == 'title':
-            sort_key = lambda x: (x['title'] or "").lower()
             logger.info("Плейлист будет отсортирован по названию.")
         else: # 'none' или неизвестное значение
              logger.info("Плейлист останется в порядке файловой системы.")
-
-        if sort_key:
-             playlist_items = sorted(items_data, key=sort_key)
-        else:
-             playlist_items = items_data # Без сортировки
-
+        return sorted(tracks, key=sort_key) if sort_key else list(tracks)
     except Exception as e:
         logger.error(f"Ошибка сортировки плейлиста: {e}. Используется порядок ФС.")
-        playlist_items = items_data
+        return list(tracks)
 
-    playlist_data = {"tracks": playlist_items}
 
-    # Запись файла (без изменений)
+def write_playlist_json(tracks, output_file, sort_order='title', page_size=None, compact=None, columnar=None, precompress=None):
+    """
+    JSON-плейлист для веб-плеера. Пути к аудио и обложкам - относительные
+    от папки web_player (ожидаемо '../downloads/track.mp3'). cover - уменьшенная
+    обложка (web_cover), если она есть, иначе исходная; thumb - иконка строки списка.
+    sort_order=None - треки уже упорядочены (инкрементальное обновление), без сортировки.
+    page_size (по умолчанию PLAYLIST_PAGE_SIZE) > 0 - манифест и страницы, см. _write_paged_playlist.
+    compact, columnar, precompress - по умолчанию PLAYLIST_COMPACT/COLUMNAR/PRECOMPRESS, см. _encode_tracks.
+    """
+    logger.info(f"Создание JSON плейлиста (сортировка: {sort_order or 'сохранена'})...")
+    items_data = []
+    for track in tracks:
+        folder = os.path.basename(os.path.dirname(track['filepath']))
+        # --- ИСПРАВЛЕНО: Расчет относительного пути к MP3 ---
+        relative_src_path = _relative_path(track['filepath'], WEB_PLAYER_DIR)
+        if relative_src_path is None:
+             # Запасной вариант, если диски разные (маловероятно)
+             relative_src_path = f"../{folder}/{track['filename']}"
+             logger.warning(f"Не удалось вычислить относительный путь для {track['filename']} через relpath, используется fallback: {relative_src_path}")
+        relative_cover_path = ""
+        cover = track.get('web_cover') or track['cover']
+        if cover:
+             relative_cover_path = _relative_path(cover, WEB_PLAYER_DIR)
+             if relative_cover_path is None:
+                  relative_cover_path = f"../{folder}/{os.path.basename(cover)}"
+                  logger.warning(f"Не удалось вычислить относительный путь для обложки {cover} через relpath, используется fallback: {relative_cover_path}")
+        relative_thumb_path = (_relative_path(track['thumb'], WEB_PLAYER_DIR) or "") if track.get('thumb') else ""
+
+        item_info = {
+            "title": track['title'],
+            "artist": track['artist'],
+            "src": relative_src_path,
+            "cover": relative_cover_path,
+            "thumb": relative_thumb_path,
+        }
+        if INCLUDE_DURATION_IN_JSON:
+            item_info["duration"] = track['duration']
+        items_data.append(item_info)
+
+    playlist_items = sort_tracks(items_data, sort_order) if sort_order else items_data
+    page_size = PLAYLIST_PAGE_SIZE if page_size is None else page_size
+    compact = PLAYLIST_COMPACT if compact is None else compact
+    layout = 'columns' if (PLAYLIST_COLUMNAR if columnar is None else columnar) else 'rows'
+    precompress = PLAYLIST_PRECOMPRESS if precompress is None else precompress
+
     try:
         # Убедимся, что папка для файла существует (на случай web_player/playlist.json)
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(playlist_data, f, ensure_ascii=False, indent=2)
+        search_index = _write_search_index(playlist_items, output_file, precompress)
+        if page_size > 0:
+            _write_paged_playlist(playlist_items, output_file, page_size, compact, layout, precompress, search_index)
+        elif compact:
+            fields = _json_fields()
+            base = _shared_base(playlist_items)
+            playlist_data = {
+                "version": PAGED_PLAYLIST_VERSION, "total": len(playlist_items), "base": base,
+                "fields": fields, "layout": layout, "tracks": _encode_tracks(playlist_items, fields, base, layout),
+                "search_index": search_index, **_player_settings(),
+            }
+            _write_playlist_file(output_file, _dump_json(playlist_data, compact), precompress)
+        else:
+            playlist_data = {"tracks": playlist_items, "search_index": search_index, **_player_settings()}
+            _write_playlist_file(output_file, _dump_json(playlist_data, compact), precompress)
         logger.info(f"✅ JSON плейлист сохранен: {os.path.abspath(output_file)} ({len(playlist_items)} треков)")
         return len(playlist_items) > 0
     except IOError as e:
@@ -134,54 +214,441 @@ def create_playlist_json(output_dir, output_file, sort_order='title'):
         return False
 
 
-def create_m3u_playlist(output_dir, output_file):
-    """Создает M3U плейлист из ВСЕХ mp3 файлов в output_dir с относительными путями."""
-    # Эта функция остается без изменений, т.к. M3U обычно используется
-    # локальными плеерами, которые могут нормально разрешать пути
-    # относительно самого M3U файла. Логика os.path.relpath здесь уже была.
+def _json_fields():
+    return ["title", "artist", "src", "cover", "thumb"] + (["duration"] if INCLUDE_DURATION_IN_JSON else [])
+
+
+def _dump_json(data, compact):
+    """JSON в байтах: минифицированный (compact) или с отступами, как раньше."""
+    if compact:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def _shared_base(items):
+    """Общий префикс-папка путей src/cover/thumb (обычно '../downloads/') - в компактном формате хранится один раз."""
+    paths = [item[field] for item in items for field in PATH_FIELDS if item.get(field)]
+    if not paths:
+        return ''
+    prefix = os.path.commonprefix(paths)
+    return prefix[:prefix.rfind('/') + 1]
+
+
+def _encode_tracks(items, fields, base, layout):
+    """
+    Компактная запись треков: без префикса base в путях (PATH_FIELDS) и без повторения имен полей -
+    строки-массивы в порядке fields (layout='rows') или по массиву на поле ('columns',
+    одинаковые значения в столбце лучше сжимаются gzip/brotli).
+    """
+    cut = len(base)
+    rows = [
+        [item[field][cut:] if field in PATH_FIELDS and item[field] else item[field] for field in fields]
+        for item in items
+    ]
+    if layout == 'columns':
+        return {field: [row[i] for row in rows] for i, field in enumerate(fields)}
+    return rows
+
+
+def _decode_tracks(block, fields, base='', layout='rows'):
+    """Обратное преобразование _encode_tracks: список словарей треков."""
+    if layout == 'columns':
+        rows = list(zip(*(block[field] for field in fields)))
+    else:
+        rows = block
+    items = []
+    for row in rows:
+        item = dict(zip(fields, row))
+        for field in PATH_FIELDS:
+            if item.get(field):
+                item[field] = base + item[field]
+        items.append(item)
+    return items
+
+
+def _write_playlist_file(path, content, precompress):
+    """
+    Атомарно записывает файл плейлиста и, если precompress, его .gz (и .br при
+    установленном brotli) рядом - их может отдавать веб-сервер без сжатия на лету.
+    Устаревшие сжатые версии удаляются, чтобы сервер не отдал старое содержимое.
+    """
+    variants = {}
+    if precompress:
+        variants['.gz'] = gzip.compress(content, compresslevel=9, mtime=0)
+        if brotli is not None:
+            variants['.br'] = brotli.compress(content)
+    for suffix, data in [('', content)] + list(variants.items()):
+        with open(path + suffix + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + suffix + '.tmp', path + suffix)
+    for suffix in ('.gz', '.br'):
+        if suffix not in variants and os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def _normalize_search_text(text):
+    """Текст для поиска: без диакритики (é -> e, й -> и) и в нижнем регистре - как normalizeSearchText в плеере."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def build_search_index(items):
+    """
+    Поисковый индекс плейлиста: отсортированный список слов (из названия и исполнителя,
+    см. _normalize_search_text) и для каждого слова - позиции треков в плейлисте,
+    записанные разностями (delta) для компактности. Плеер ищет слова запроса как префиксы
+    двоичным поиском по списку слов, поэтому слова отсортированы по кодовым единицам
+    UTF-16 - так же, как сравнивает строки JavaScript.
+    """
+    postings = {}
+    for position, item in enumerate(items):
+        text = _normalize_search_text(f"{item['title']} {item['artist']}")
+        for token in set(SEARCH_TOKEN_RE.findall(text)):
+            postings.setdefault(token, []).append(position)
+    tokens = sorted(postings, key=lambda token: token.encode('utf-16-be'))
+    return {
+        "version": SEARCH_INDEX_VERSION,
+        "total": len(items),
+        "tokens": tokens,
+        "postings": [[p - prev for p, prev in zip(postings[t], [0] + postings[t][:-1])] for t in tokens],
+    }
 
-    logger.info("Создание M3U плейлиста...")
 
+def _write_search_index(items, output_file, precompress):
+    """
+    Записывает поисковый индекс (PLAYLIST_SEARCH_INDEX_FILE) и возвращает ссылку на него
+    для плейлиста - путь от папки плейлиста с хэшем содержимого (?v=...), чтобы браузер
+    не взял устаревший индекс из кэша. None, если индекс выключен.
+    """
+    if not PLAYLIST_SEARCH_INDEX:
+        for suffix in ('', '.gz', '.br'):
+            if os.path.exists(PLAYLIST_SEARCH_INDEX_FILE + suffix):
+                os.remove(PLAYLIST_SEARCH_INDEX_FILE + suffix)
+        return None
+    content = _dump_json(build_search_index(items), True)
+    _write_playlist_file(PLAYLIST_SEARCH_INDEX_FILE, content, precompress)
+    relative = os.path.relpath(PLAYLIST_SEARCH_INDEX_FILE, os.path.dirname(os.path.abspath(output_file))).replace('\\', '/')
+    return f"{relative}?v={hashlib.sha1(content).hexdigest()[:10]}"
+
+
+def _player_settings():
+    """Настройки веб-плеера, которые он читает из playlist.json (см. loadPlaylist в script.js)."""
+    return {"preload_max_bytes": max(0, int(PLAYER_PRELOAD_MAX_BYTES or 0))}
+
+
+def _player_settings_current(playlist_file=None):
+    """Совпадают ли настройки плеера в уже записанном playlist.json с текущими."""
     try:
-        mp3_files = sorted([
-            f for f in os.listdir(output_dir)
-            if f.lower().endswith('.mp3') and not f.endswith('.part')
-        ])
-    except FileNotFoundError:
-         logger.error(f"Папка для сканирования не найдена: {output_dir}")
-         return False
-    except Exception as e:
-        logger.error(f"Ошибка при сканировании папки {output_dir}: {e}")
+        with open(playlist_file or PLAYLIST_JSON_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
         return False
+    return all(data.get(key) == value for key, value in _player_settings().items())
+
+
+def _write_paged_playlist(items, output_file, page_size, compact=True, layout='rows', precompress=False, search_index=None):
+    """
+    Постраничный плейлист: output_file - маленький манифест (число треков, поля,
+    общий префикс путей, список страниц), страницы в PLAYLIST_PAGES_DIR - минифицированные
+    треки (см. _encode_tracks) по page_size штук.
+    Имя страницы содержит хэш содержимого: неизмененные страницы не перезаписываются
+    и могут кэшироваться браузером бессрочно. Сначала пишутся страницы, затем манифест,
+    после него удаляются страницы, на которые манифест больше не ссылается.
+    """
+    fields = _json_fields()
+    base = _shared_base(items) if compact else ''
+    manifest_dir = os.path.dirname(os.path.abspath(output_file))
+    os.makedirs(PLAYLIST_PAGES_DIR, exist_ok=True)
+    pages = []
+    written = 0
+    for start in range(0, len(items), page_size):
+        content = _dump_json(_encode_tracks(items[start:start + page_size], fields, base, layout), True)
+        page_name = f"page-{start // page_size:04d}-{hashlib.sha1(content).hexdigest()[:10]}.json"
+        page_path = os.path.join(PLAYLIST_PAGES_DIR, page_name)
+        if not os.path.exists(page_path) or precompress != os.path.exists(page_path + '.gz'):
+            _write_playlist_file(page_path, content, precompress)
+            written += 1
+        pages.append(os.path.relpath(page_path, manifest_dir).replace('\\', '/'))
+
+    manifest = {
+        "version": PAGED_PLAYLIST_VERSION,
+        "total": len(items),
+        "page_size": page_size,
+        "base": base,
+        "fields": fields,
+        "layout": layout,
+        "pages": pages,
+        "search_index": search_index,
+        **_player_settings(),
+    }
+    _write_playlist_file(output_file, _dump_json(manifest, compact), precompress)
+
+    current = {os.path.basename(page) for page in pages}
+    for name in os.listdir(PLAYLIST_PAGES_DIR):
+        # Вместе со страницей удаляются ее .gz/.br
+        if name.startswith('page-') and name.rsplit('.json', 1)[0] + '.json' not in current:
+            try:
+                os.remove(os.path.join(PLAYLIST_PAGES_DIR, name))
+            except OSError as e:
+                logger.warning(f"Не удалось удалить устаревшую страницу плейлиста {name}: {e}")
+    logger.info(f"📄 Страниц плейлиста: {len(pages)} по {page_size} треков (записано новых: {written}).")
 
-    logger.info(f"Найдено {len(mp3_files)} MP3 файлов для включения в M3U.")
-    if not mp3_files:
-        logger.warning("⚠️ MP3 файлы не найдены, M3U плейлист не будет создан.")
+
+def write_m3u_playlist(tracks, output_file):
+    """M3U плейлист (по имени файла) с путями относительно самого M3U файла."""
+    logger.info("Создание M3U плейлиста...")
+    if not tracks:
+        logger.warning("⚠️ Аудиофайлы не найдены, M3U плейлист не будет создан.")
         return False
 
-    # Запись файла
+    m3u_dir = os.path.dirname(output_file)
     try:
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        os.makedirs(m3u_dir, exist_ok=True)
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write("#EXTM3U\n")
-            for filename in mp3_files:
-                 filepath = os.path.join(output_dir, filename)
-                 title, artist, duration = get_track_metadata(filepath)
-                 try:
-                    m3u_dir = os.path.dirname(output_file)
-                    relative_path = os.path.relpath(filepath, start=m3u_dir).replace('\\', '/')
-                 except ValueError:
+            for track in sorted(tracks, key=lambda x: x['filename']):
+                 relative_path = _relative_path(track['filepath'], m3u_dir)
+                 if relative_path is None:
                     # Запасной вариант, если M3U и треки на разных дисках
-                    relative_path = os.path.join(os.path.basename(output_dir), filename).replace('\\', '/')
-
-                 f.write(f"#EXTINF:{duration or -1},{artist} - {title}\n") # Используем -1 если duration = 0
+                    relative_path = os.path.join(os.path.basename(os.path.dirname(track['filepath'])), track['filename']).replace('\\', '/')
+                 f.write(f"#EXTINF:{track['duration'] or -1},{track['artist']} - {track['title']}\n") # Используем -1 если duration = 0
                  f.write(f"{relative_path}\n")
-
-        logger.info(f"✅ M3U плейлист сохранен: {os.path.abspath(output_file)} ({len(mp3_files)} треков)")
+        logger.info(f"✅ M3U плейлист сохранен: {os.path.abspath(output_file)} ({len(tracks)} треков)")
         return True
     except IOError as e:
         logger.error(f"❌ Не удалось записать M3U плейлист {output_file}: {e}")
         return False
     except Exception as e:
         logger.error(f"❌ Неожиданная ошибка при сохранении M3U: {e}", exc_info=True)
-        return False
\ No newline at end of file
+        return False
+
+
+def write_xspf_playlist(tracks, output_file):
+    """XSPF плейлист (XML, понимают VLC, foobar2000 и др.): относительные URI аудио и обложек."""
+    logger.info("Создание XSPF плейлиста...")
+    if not tracks:
+        logger.warning("⚠️ Аудиофайлы не найдены, XSPF плейлист не будет создан.")
+        return False
+
+    xspf_dir = os.path.dirname(output_file)
+    playlist = ET.Element('playlist', version='1', xmlns='http://xspf.org/ns/0/')
+    track_list = ET.SubElement(playlist, 'trackList')
+    for track in sorted(tracks, key=lambda x: x['filename']):
+        element = ET.SubElement(track_list, 'track')
+        location = _relative_path(track['filepath'], xspf_dir)
+        ET.SubElement(element, 'location').text = quote(location) if location else 'file://' + quote(track['filepath'].replace('\\', '/'))
+        ET.SubElement(element, 'title').text = track['title']
+        ET.SubElement(element, 'creator').text = track['artist']
+        if track['duration']:
+            ET.SubElement(element, 'duration').text = str(track['duration'] * 1000) # XSPF: миллисекунды
+        if track['cover']:
+            cover = _relative_path(track['cover'], xspf_dir)
+            if cover:
+                ET.SubElement(element, 'image').text = quote(cover)
+    try:
+        os.makedirs(xspf_dir, exist_ok=True)
+        ET.ElementTree(playlist).write(output_file, encoding='utf-8', xml_declaration=True)
+        logger.info(f"✅ XSPF плейлист сохранен: {os.path.abspath(output_file)} ({len(tracks)} треков)")
+        return True
+    except IOError as e:
+        logger.error(f"❌ Не удалось записать XSPF плейлист {output_file}: {e}")
+        return False
+
+
+# Формат -> (функция записи, файл по умолчанию из конфига, доп. аргументы)
+PLAYLIST_WRITERS = {
+    'json': (write_playlist_json, PLAYLIST_JSON_FILE, {'sort_order': PLAYLIST_JSON_SORT_ORDER}),
+    'm3u': (write_m3u_playlist, PLAYLIST_M3U_FILE, {}),
+    'xspf': (write_xspf_playlist, PLAYLIST_XSPF_FILE, {}),
+}
+
+
+def generate_playlists(output_dir=DOWNLOADS_DIR, formats=None, catalog=None, metadata_cache=None):
+    """
+    Сканирует библиотеку один раз и пишет все плейлисты из formats
+    (по умолчанию PLAYLIST_FORMATS). Возвращает словарь формат -> создан ли плейлист.
+    """
+    formats = formats if formats is not None else PLAYLIST_FORMATS
+    unknown = [fmt for fmt in formats if fmt not in PLAYLIST_WRITERS]
+    if unknown:
+        logger.warning(f"Неизвестные форматы плейлистов пропущены: {', '.join(unknown)}")
+
+    own_cache = metadata_cache is None
+    if own_cache and catalog is not None:
+        metadata_cache = MetadataCache(catalog)
+    tracks = scan_library(output_dir, catalog=catalog, metadata_cache=metadata_cache)
+    if tracks is None:
+        return {fmt: False for fmt in formats if fmt in PLAYLIST_WRITERS}
+
+    results = {}
+    for fmt in formats:
+        if fmt not in PLAYLIST_WRITERS:
+            continue
+        writer, output_file, options = PLAYLIST_WRITERS[fmt]
+        results[fmt] = writer(tracks, output_file, **options)
+    if own_cache and metadata_cache is not None:
+        metadata_cache.log_summary()
+    return results
+
+
+def load_playlist_tracks(output_dir, playlist_file=None):
+    """
+    Модель треков из уже записанного JSON-плейлиста (в его порядке) - основа
+    инкрементального обновления. None, если файла нет, он поврежден или в нем
+    нет длительности (INCLUDE_DURATION_IN_JSON выключен - M3U/XSPF без нее не построить).
+    """
+    playlist_file = playlist_file or PLAYLIST_JSON_FILE
+    try:
+        with open(playlist_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        encoding = (data.get('fields'), data.get('base', ''), data.get('layout', 'rows'))
+        if 'pages' in data:
+            # Постраничный формат: собираем треки из страниц (пути - от папки манифеста)
+            manifest_dir = os.path.dirname(os.path.abspath(playlist_file))
+            items = []
+            for page in data['pages']:
+                with open(os.path.join(manifest_dir, page), 'r', encoding='utf-8') as f:
+                    items.extend(_decode_tracks(json.load(f), *encoding))
+        elif 'fields' in data:
+            items = _decode_tracks(data['tracks'], *encoding) # Компактный единый файл
+        else:
+            items = data['tracks']
+        tracks = []
+        for item in items:
+            filename = os.path.basename(item['src'])
+            cover = os.path.basename(item['cover']) if item.get('cover') else None
+            if cover and THUMB_NAME_RE.match(cover):
+                cover = None # Уменьшенная копия (src.covers) - исходную обложку найдет update_playlists
+            tracks.append({
+                "filename": filename,
+                "filepath": os.path.join(output_dir, filename),
+                "title": item['title'],
+                "artist": item['artist'],
+                "duration": item['duration'],
+                "cover": os.path.join(output_dir, cover) if cover else None,
+            })
+        return tracks
+    except FileNotFoundError:
+        logger.info(f"JSON плейлист {playlist_file} еще не создан.")
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"⚠️ Не удалось прочитать JSON плейлист {playlist_file}: {e}")
+    return None
+
+
+def update_playlists(output_dir=DOWNLOADS_DIR, added=(), removed=(), formats=None, catalog=None, metadata_cache=None):
+    """
+    Инкрементальное обновление плейлистов после скачивания/очистки: модель треков
+    берется из существующего playlist.json, из нее убираются removed, а added
+    (пути или имена файлов) вставляются на свое место по ключу сортировки (bisect),
+    без полной пересортировки и без чтения тегов остальной библиотеки.
+    Если плейлист и папка расходятся (файлы добавлены/удалены вне проекта,
+    изменились PLAYLIST_JSON_SORT_ORDER/INCLUDE_DURATION_IN_JSON), выполняется
+    полная пересборка generate_playlists. Возвращает словарь формат -> создан ли плейлист.
+    """
+    formats = formats if formats is not None else PLAYLIST_FORMATS
+    if not os.path.isdir(output_dir):
+        logger.error(f"Папка для сканирования аудио не найдена: {output_dir}")
+        return {fmt: False for fmt in formats if fmt in PLAYLIST_WRITERS}
+    dir_index = shared_index(output_dir)
+    on_disk = set(dir_index.audio_files())
+    added_names = {os.path.basename(path) for path in added} & on_disk
+    removed_names = {os.path.basename(path) for path in removed}
+
+    tracks = load_playlist_tracks(output_dir)
+    reason = None
+    if tracks is None:
+        reason = "нет действующего JSON плейлиста"
+    else:
+        expected = ({track['filename'] for track in tracks} - removed_names) | added_names
+        if expected != on_disk:
+            reason = f"плейлист и папка расходятся (нет на диске: {len(expected - on_disk)}, нет в плейлисте: {len(on_disk - expected)})"
+        else:
+            sort_key = _sort_key(PLAYLIST_JSON_SORT_ORDER)
+            keys = [sort_key(track) for track in tracks] if sort_key else []
+            if any(keys[i] > keys[i + 1] for i in range(len(keys) - 1)):
+                reason = f"порядок плейлиста не соответствует сортировке '{PLAYLIST_JSON_SORT_ORDER}'"
+    if reason:
+        logger.info(f"🔄 Полная пересборка плейлистов: {reason}.")
+        return generate_playlists(output_dir, formats, catalog=catalog, metadata_cache=metadata_cache)
+    outputs = {fmt: PLAYLIST_WRITERS[fmt][1] for fmt in formats if fmt in PLAYLIST_WRITERS}
+    if (not added_names and not removed_names and all(os.path.exists(path) for path in outputs.values())
+            and ('json' not in outputs or _player_settings_current(outputs['json']))):
+        # Плейлист совпадает с папкой, а изменений нет - перезаписывать нечего
+        logger.info("🔄 Плейлисты актуальны: новых и удаленных треков нет.")
+        return {fmt: True for fmt in outputs}
+
+    # --- Удаление ---
+    stale = removed_names | added_names # Перекачанные файлы вставляются заново со свежими тегами
+    gone = removed_names - added_names
+    refreshed = sum(1 for track in tracks if track['filename'] in added_names)
+    removed_count = sum(1 for track in tracks if track['filename'] in gone)
+    keep = [i for i, track in enumerate(tracks) if track['filename'] not in stale]
+    tracks = [tracks[i] for i in keep]
+    keys = [keys[i] for i in keep] if sort_key else []
+
+    # --- Добавление ---
+    own_catalog = catalog is None and metadata_cache is None
+    if own_catalog:
+        catalog = TrackCatalog()
+    if metadata_cache is None:
+        metadata_cache = MetadataCache(catalog)
+    new_names = sorted(added_names) # Порядок вставки не зависит от порядка скачивания
+    metadata_cache.prefetch([(dir_index.path(name), *(dir_index.stat(name) or (None, None))) for name in new_names])
+    inserted = 0
+    for name in new_names:
+        track = _library_track(output_dir, name, dir_index, metadata_cache)
+        if track is None:
+            continue
+        if sort_key:
+            key = sort_key(track)
+            position = bisect_right(keys, key)
+            keys.insert(position, key)
+        else:
+            position = len(tracks)
+        tracks.insert(position, track)
+        inserted += 1
+    # Обложки могли удалить (CLEANUP_THUMBNAILS_AFTER_DOWNLOAD) или докачать - проверка по индексу в памяти
+    for track in tracks:
+        thumb_name = dir_index.find(os.path.splitext(track['filename'])[0], COVER_EXTENSIONS)
+        track['cover'] = os.path.join(output_dir, thumb_name) if thumb_name else None
+    attach_cover_thumbs(tracks, dir_index, metadata_cache)
+    try:
+        metadata_cache.flush(on_disk)
+    except Exception as e:
+        logger.error(f"Ошибка обновления каталога библиотеки: {e}", exc_info=True)
+    finally:
+        if own_catalog: catalog.close()
+    logger.info(f"🔄 Инкрементальное обновление плейлистов: добавлено {inserted - refreshed}, обновлено {refreshed}, удалено {removed_count}.")
+
+    results = {}
+    for fmt in formats:
+        if fmt not in PLAYLIST_WRITERS:
+            continue
+        writer, output_file, options = PLAYLIST_WRITERS[fmt]
+        if fmt == 'json':
+            options = dict(options, sort_order=None) # Порядок уже поддержан вставкой
+        results[fmt] = writer(tracks, output_file, **options)
+    return results
+
+
+def create_playlist_json(output_dir, output_file, sort_order='title', catalog=None, metadata_cache=None):
+    """
+    Создает JSON-плейлист для веб-плеера из ВСЕХ аудиофайлов в output_dir
+    (MP3 и сохраненных без перекодирования - AUDIO_EXTENSIONS).
+    Для нескольких форматов сразу используйте generate_playlists (одно сканирование).
+    """
+    tracks = scan_library(output_dir, catalog=catalog, metadata_cache=metadata_cache)
+    if tracks is None:
+        return False
+    return write_playlist_json(tracks, output_file, sort_order)
+
+
+def create_m3u_playlist(output_dir, output_file, catalog=None, metadata_cache=None):
+    """
+    Создает M3U плейлист из ВСЕХ аудиофайлов в output_dir с относительными путями.
+    Для нескольких форматов сразу используйте generate_playlists (одно сканирование).
+    """
+    tracks = scan_library(output_dir, catalog=catalog, metadata_cache=metadata_cache)
+    if tracks is None:
+        return False
+    return write_m3u_playlist(tracks, output_file)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import yt_dlp
+from yt_dlp.networking.exceptions import TransportError, IncompleteRead
+
+from .config import (
+    RATE_LIMIT_INITIAL_RPS, RATE_LIMIT_MIN_RPS, RATE_LIMIT_MAX_RPS, RATE_LIMIT_BURST,
+    RATE_LIMIT_RAMP_AFTER, RATE_LIMIT_RAMP_STEP_RPS, RATE_LIMIT_COOLDOWN_SECONDS,
+    RATE_LIMIT_MAX_COOLDOWN_SECONDS, RATE_LIMIT_THROTTLE_STATUSES
+)
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveRateLimiter:
+    """
+    Общий для всех воркеров ограничитель запросов к SoundCloud:
+      - token bucket ограничивает частоту HTTP-запросов (acquire);
+      - slot() ограничивает число ссылок, которые качаются одновременно.
+    На 429/5xx, а также на таймауты, сбросы соединения и оборванные ответы
+    (так SoundCloud/CDN часто режет поток аудио) скорость и параллельность уменьшаются вдвое и включается пауза
+    (Retry-After или растущая задержка); после RATE_LIMIT_RAMP_AFTER успешных
+    запросов подряд - плавно возвращаются к максимуму.
+    """
+
+    def __init__(self, max_concurrency, rate=RATE_LIMIT_INITIAL_RPS, min_rate=RATE_LIMIT_MIN_RPS,
+                 max_rate=RATE_LIMIT_MAX_RPS, burst=RATE_LIMIT_BURST):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = max(1, burst)
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = self.max_concurrency
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._active = 0
+        self._successes = 0
+        self._cooldown = RATE_LIMIT_COOLDOWN_SECONDS
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        # Статистика для итогов запуска
+        self.requests = 0
+        self.throttled = 0
+        self.pauses = 0
+        self.wait_time = 0.0
+        self.lowest_rate = self.rate
+        self.lowest_concurrency = self.concurrency
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """Блокирует поток, пока не будет разрешен очередной HTTP-запрос."""
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self.requests += 1
+                        break
+                    wait = (1 - self._tokens) / self.rate
+                self._cond.wait(wait)
+            self.wait_time += time.monotonic() - started
+
+    @contextmanager
+    def slot(self):
+        """Одна ссылка в работе: не больше self.concurrency одновременно."""
+        started = time.monotonic()
+        with self._cond:
+            while self._active >= self.concurrency:
+                self._cond.wait()
+            self._active += 1
+            self.wait_time += time.monotonic() - started
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self._successes += 1
+            if self._successes < RATE_LIMIT_RAMP_AFTER:
+                return
+            self._successes = 0
+            self._cooldown = RATE_LIMIT_COOLDOWN_SECONDS
+            if self.rate < self.max_rate or self.concurrency < self.max_concurrency:
+                self.rate = min(self.max_rate, self.rate + RATE_LIMIT_RAMP_STEP_RPS)
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                logger.debug(f"🚦 Лимит повышен: {self.rate:.2f} запр/с, параллельно {self.concurrency}")
+                self._cond.notify_all()
+
+    def on_throttle(self, status, retry_after=None):
+        """Ответ 429/5xx или сетевой сбой (status - его описание): уменьшаем скорость и параллельность, делаем паузу."""
+        with self._cond:
+            self.throttled += 1
+            self._successes = 0
+            now = time.monotonic()
+            if now < self._paused_until:
+                # Несколько воркеров получили отказ одновременно - это одно событие
+                return
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.concurrency = max(1, self.concurrency // 2)
+            pause = retry_after if retry_after else self._cooldown
+            self._cooldown = min(RATE_LIMIT_MAX_COOLDOWN_SECONDS, self._cooldown * 2)
+            self._paused_until = now + pause
+            self._tokens = 0.0
+            self.pauses += 1
+            self.lowest_rate = min(self.lowest_rate, self.rate)
+            self.lowest_concurrency = min(self.lowest_concurrency, self.concurrency)
+        logger.warning(
+            f"🚦 SoundCloud ограничивает ({status}): пауза {pause:.1f} сек, "
+            f"лимит {self.rate:.2f} запр/с, параллельно {self.concurrency}"
+        )
+
+    def log_summary(self):
+        logger.info(
+            f"🚦 Лимитер: запросов {self.requests}, отказов 429/5xx и сетевых сбоев: {self.throttled}, пауз: {self.pauses}, "
+            f"ожидание: {self.wait_time:.1f} сек"
+        )
+        logger.info(
+            f"🚦 Текущий лимит: {self.rate:.2f} запр/с (мин. за запуск {self.lowest_rate:.2f}), "
+            f"параллельно {self.concurrency}/{self.max_concurrency} (мин. {self.lowest_concurrency})"
+        )
+
+
+def _http_error_details(error):
+    """Достает HTTP-статус и Retry-After из исключения yt-dlp/urllib. (None, None), если это не HTTP-ошибка."""
+    status = getattr(error, 'status', None) or getattr(error, 'code', None)
+    if not isinstance(status, int):
+        return None, None
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or getattr(error, 'headers', None) or {}
+    try:
+        retry_after = float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        retry_after = None
+    return status, retry_after
+
+
+def _network_throttle_reason(error):
+    """
+    Описание сетевого сбоя, который считается признаком ограничения (таймаут, сброс
+    соединения, оборванный ответ), или None. Причина ищется по цепочке исключений:
+    yt-dlp оборачивает исходную ошибку сокета/urllib3/requests в TransportError.
+    """
+    if isinstance(error, IncompleteRead):
+        return 'оборванный ответ'
+    if not isinstance(error, TransportError):
+        return None
+    pending, seen = [error], set()
+    while pending:
+        current = pending.pop()
+        if not isinstance(current, BaseException) or id(current) in seen:
+            continue
+        seen.add(id(current))
+        if isinstance(current, TimeoutError) or 'Timeout' in type(current).__name__:
+            return 'таймаут'
+        if isinstance(current, (ConnectionResetError, ConnectionAbortedError)):
+            return 'сброс соединения'
+        pending.extend((getattr(current, 'cause', None), getattr(current, 'reason', None),
+                        current.__cause__, current.__context__))
+    return None
+
+
+class RateLimitedYoutubeDL(yt_dlp.YoutubeDL):
+    """
+    YoutubeDL, пропускающий ВСЕ свои HTTP-запросы (метаданные, обложки, аудио)
+    через общий AdaptiveRateLimiter. Без limiter работает как обычный YoutubeDL.
+    Сетевые сбои учитываются и при открытии, и при чтении ответа: загрузчик yt-dlp
+    читает аудио из ответа urlopen сам и при обрыве повторяет запрос.
+    """
+
+    def __init__(self, params=None, limiter=None, **kwargs):
+        super().__init__(params, **kwargs)
+        self._limiter = limiter
+
+    def urlopen(self, req):
+        if self._limiter is None:
+            return super().urlopen(req)
+        self._limiter.acquire()
+        try:
+            response = super().urlopen(req)
+        except Exception as e:
+            status, retry_after = _http_error_details(e)
+            if status in RATE_LIMIT_THROTTLE_STATUSES:
+                self._limiter.on_throttle(status, retry_after)
+            else:
+                self._report_network_error(e)
+            raise
+        self._limiter.on_success()
+        self._watch_body(req, response)
+        return response
+
+    def _watch_body(self, req, response):
+        """
+        Сообщает лимитеру о сбоях при чтении тела ответа. Обрыв без исключения (соединение
+        закрыто раньше Content-Length) тоже считается: загрузчик yt-dlp повторит запрос сам.
+        """
+        read = response.read
+        length = response.headers.get('Content-Length')
+        expected = None
+        if (length and length.isdigit() and not response.headers.get('Content-Encoding')
+                and response.status in (200, 206) and getattr(req, 'method', 'GET') != 'HEAD'):
+            expected = int(length)
+        received = 0
+
+        def read_reporting(amt=None):
+            nonlocal expected, received
+            try:
+                data = read(amt)
+            except Exception as e:
+                self._report_network_error(e)
+                raise
+            received += len(data)
+            if not data and amt != 0 and expected is not None and received < expected:
+                expected = None # Один обрыв - одно событие
+                self._limiter.on_throttle('оборванный ответ')
+            return data
+
+        response.read = read_reporting
+
+    def _report_network_error(self, error):
+        reason = _network_throttle_reason(error)
+        if reason:
+            self._limiter.on_throttle(reason)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import time
+import random
+import logging
+
+from .config import (
+    RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY_SECONDS, RETRY_MAX_DELAY_SECONDS, RETRY_JITTER,
+    PERMANENT_ERROR_MARKERS
+)
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+
+def is_permanent_error(reason):
+    """
+    Определяет, есть ли смысл повторять попытку.
+    Постоянные ошибки (приватный/удаленный трек, некорректный URL) задаются
+    в PERMANENT_ERROR_MARKERS: строка или кортеж фрагментов, которые должны встретиться все.
+    """
+    reason_lower = (reason or "").lower()
+    for marker in PERMANENT_ERROR_MARKERS:
+        fragments = (marker,) if isinstance(marker, str) else marker
+        if all(fragment.lower() in reason_lower for fragment in fragments):
+            return True
+    return False
+
+
+def retry_delay(attempts):
+    """
+    Задержка перед следующей попыткой: экспоненциальная (база * 2^(n-1), не больше максимума)
+    со случайным разбросом RETRY_JITTER, чтобы повторы не шли одной пачкой.
+    """
+    delay = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(1 - RETRY_JITTER, 1)
+
+
+def plan_retry(attempts, reason, now=None):
+    """
+    Решение по ссылке после attempts неудачных попыток.
+    Возвращает (permanent, next_attempt_at): permanent=True - больше не пытаться.
+    """
+    if is_permanent_error(reason):
+        logger.debug(f"Постоянная ошибка, повторов не будет: {reason}")
+        return True, None
+    if attempts >= RETRY_MAX_ATTEMPTS:
+        logger.debug(f"Исчерпаны попытки ({attempts}/{RETRY_MAX_ATTEMPTS}): {reason}")
+        return True, None
+    now = time.time() if now is None else now
+    return False, now + retry_delay(attempts)
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный HTTP-сервер веб-плеера на стандартной библиотеке: отдает WEB_PLAYER_DIR
+и DOWNLOADS_DIR (плеер ссылается на треки как '../downloads/...', браузер
+запрашивает их как '/downloads/...').
+  - Range-запросы (перемотка без повторного скачивания трека), ответ 206/416;
+  - ETag/Last-Modified с ответом 304 и If-Range;
+  - Cache-Control: файлы с хэшем в имени или адресе (страницы плейлиста, уменьшенные
+    обложки, ?v=) - навсегда, аудио и исходные обложки - SERVER_MEDIA_MAX_AGE,
+    остальное - с проверкой по ETag;
+  - готовые .br/.gz рядом с файлом (PLAYLIST_PRECOMPRESS) по Accept-Encoding, с Vary;
+  - тело ответа отправляется socket.sendfile (os.sendfile - без копирования в Python);
+  - поток на соединение (ThreadingHTTPServer), HTTP/1.1 keep-alive с таймаутом.
+"""
+import os
+import re
+import sys
+import stat
+import logging
+import mimetypes
+import posixpath
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, unquote, parse_qs
+
+from .covers import THUMB_NAME_RE
+from .config import (
+    WEB_PLAYER_DIR, DOWNLOADS_DIR, PLAYLIST_PAGES_DIR, COVER_THUMBS_DIR,
+    SERVER_HOST, SERVER_PORT, SERVER_KEEPALIVE_TIMEOUT, SERVER_REQUEST_QUEUE_SIZE,
+    SERVER_MEDIA_MAX_AGE, SERVER_IMMUTABLE_MAX_AGE
+)
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Типы, которых нет (или они другие) в mimetypes на части систем
+CONTENT_TYPES = {
+    '.mp3': 'audio/mpeg', '.m4a': 'audio/mp4', '.aac': 'audio/aac', '.opus': 'audio/ogg', '.ogg': 'audio/ogg',
+    '.json': 'application/json', '.js': 'text/javascript', '.css': 'text/css', '.html': 'text/html',
+    '.webp': 'image/webp', '.m3u': 'audio/x-mpegurl', '.xspf': 'application/xspf+xml',
+}
+TEXT_CONTENT_TYPES = ('text/', 'application/json', 'application/xspf+xml')
+# Готовые сжатые варианты в порядке предпочтения: (Content-Encoding, суффикс файла)
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+PAGE_NAME_RE = re.compile(r'^page-\d+-[0-9a-f]+\.json$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    """Запрошенный диапазон целиком за концом файла (ответ 416)."""
+
+
+def parse_range(header, size):
+    """
+    Разбирает заголовок Range для файла размером size: (начало, конец включительно)
+    или None, если заголовок нужно проигнорировать (несколько диапазонов, другие единицы,
+    синтаксическая ошибка) - тогда отдается весь файл, как разрешает RFC 9110.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '': # bytes=-N: последние N байт
+        length = int(last)
+        if length == 0 or size == 0: # У пустого файла нет ни одного байта для диапазона
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, которые клиент принимает (q > 0)."""
+    encodings = set()
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = params.strip().lower()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def _content_type(path):
+    ext = os.path.splitext(path)[1].lower()
+    content_type = CONTENT_TYPES.get(ext) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if content_type.startswith(TEXT_CONTENT_TYPES):
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+def _etag(stat_result, encoding=None):
+    """Сильный ETag по размеру и mtime (у сжатого варианта - свой)."""
+    suffix = f'-{encoding}' if encoding else ''
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}{suffix}"'
+
+
+def _cache_control(filepath, content_type, query):
+    """Политика кэширования: хэш в имени или адресе - навсегда, аудио и обложки - на срок, остальное - с проверкой."""
+    directory, name = os.path.split(filepath)
+    if ('v' in parse_qs(query) or (directory == os.path.normpath(PLAYLIST_PAGES_DIR) and PAGE_NAME_RE.match(name))
+            or (directory == os.path.normpath(COVER_THUMBS_DIR) and THUMB_NAME_RE.match(name))):
+        return f'public, max-age={SERVER_IMMUTABLE_MAX_AGE}, immutable'
+    if content_type.startswith(('audio/', 'image/')):
+        return f'public, max-age={SERVER_MEDIA_MAX_AGE}'
+    return 'no-cache'
+
+
+def _default_mounts():
+    """
+    Корни сервера: DOWNLOADS_DIR под своим именем ('/downloads/'), все остальное - WEB_PLAYER_DIR.
+    Пути плеера '../downloads/x.mp3' от '/index.html' браузер превращает в '/downloads/x.mp3'.
+    """
+    downloads_prefix = '/' + os.path.basename(os.path.normpath(DOWNLOADS_DIR)) + '/'
+    return ((downloads_prefix, DOWNLOADS_DIR), ('/', WEB_PLAYER_DIR))
+
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    """Обработчик GET/HEAD для статических файлов плеера и аудио. Корни - в server.mounts."""
+
+    protocol_version = 'HTTP/1.1' # keep-alive: плеер запрашивает диапазоны трека одним соединением
+    server_version = 'SoundCloudLikesPlayer/1.0'
+    timeout = SERVER_KEEPALIVE_TIMEOUT # Простаивающее соединение закрывается, поток освобождается
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def log_error(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+    def _resolve(self, url_path):
+        """Путь в URL -> файл на диске или None, если путь вне корней."""
+        path = posixpath.normpath(unquote(url_path))
+        if url_path.endswith('/'):
+            path = path.rstrip('/') + '/'
+        for prefix, root in self.server.mounts:
+            if not (path + '/').startswith(prefix):
+                continue
+            parts = [part for part in path[len(prefix):].split('/') if part]
+            if any(part in ('.', '..') or '\x00' in part or os.sep in part for part in parts):
+                return None
+            filepath = os.path.join(root, *parts)
+            if os.path.isdir(filepath):
+                filepath = os.path.join(filepath, 'index.html')
+            return filepath
+        return None
+
+    def _precompressed(self, filepath, source_stat):
+        """
+        Готовый сжатый вариант файла, если клиент его принимает: (путь, stat, кодировка, есть_варианты).
+        Вариант старше исходного файла не используется.
+        """
+        variants = []
+        for encoding, suffix in PRECOMPRESSED:
+            try:
+                variant_stat = os.stat(filepath + suffix)
+            except OSError:
+                continue
+            if variant_stat.st_mtime >= source_stat.st_mtime:
+                variants.append((encoding, filepath + suffix, variant_stat))
+        accepted = accepted_encodings(self.headers.get('Accept-Encoding'))
+        for encoding, path, variant_stat in variants:
+            if encoding in accepted:
+                return path, variant_stat, encoding, True
+        return filepath, source_stat, None, bool(variants)
+
+    def _not_modified(self, etag, stat_result):
+        """Проверка If-None-Match / If-Modified-Since (If-None-Match главнее)."""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or f'W/{etag}' in tags
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(stat_result.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+        return False
+
+    def _range_allowed(self, etag, last_modified):
+        """If-Range: диапазон отдается, только если файл не изменился с прошлого ответа клиенту."""
+        if_range = self.headers.get('If-Range')
+        return if_range is None or if_range.strip() in (etag, last_modified)
+
+    def _serve(self, send_body):
+        url = urlsplit(self.path)
+        filepath = self._resolve(url.path)
+        try:
+            source_stat = os.stat(filepath) if filepath else None
+        except OSError:
+            source_stat = None
+        if source_stat is None or not stat.S_ISREG(source_stat.st_mode):
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        range_header = self.headers.get('Range')
+        if range_header:
+            # Сжатые варианты - только для целых ответов: диапазоны считаются по исходному файлу
+            body_path, stat_result, encoding, has_variants = filepath, source_stat, None, False
+        else:
+            body_path, stat_result, encoding, has_variants = self._precompressed(filepath, source_stat)
+        etag = _etag(stat_result, encoding)
+        last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+        size = stat_result.st_size
+        content_type = _content_type(filepath)
+
+        headers = {
+            'ETag': etag,
+            'Last-Modified': last_modified,
+            'Cache-Control': _cache_control(filepath, content_type, url.query),
+            'Accept-Ranges': 'bytes',
+        }
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        if has_variants or encoding:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if self._not_modified(etag, stat_result):
+            self._send_headers(HTTPStatus.NOT_MODIFIED, headers)
+            return
+
+        status, offset, count = HTTPStatus.OK, 0, size
+        if range_header and self._range_allowed(etag, last_modified):
+            try:
+                byte_range = parse_range(range_header, size)
+            except RangeNotSatisfiable:
+                headers['Content-Range'] = f'bytes */{size}'
+                headers['Content-Length'] = '0'
+                self._send_headers(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, headers)
+                return
+            if byte_range:
+                status, offset, count = HTTPStatus.PARTIAL_CONTENT, byte_range[0], byte_range[1] - byte_range[0] + 1
+                headers['Content-Range'] = f'bytes {byte_range[0]}-{byte_range[1]}/{size}'
+
+        headers['Content-Type'] = content_type
+        headers['Content-Length'] = str(count)
+        try:
+            with open(body_path, 'rb') as f:
+                self._send_headers(status, headers)
+                if send_body and count:
+                    self.connection.sendfile(f, offset, count)
+        except (BrokenPipeError, ConnectionResetError) as e:
+            # Обычное дело при перемотке: браузер обрывает прежний запрос диапазона
+            logger.debug(f"{self.address_string()} оборвал загрузку {url.path}: {e}")
+            self.close_connection = True
+        except OSError as e:
+            logger.error(f"Ошибка при отдаче {body_path}: {e}")
+            self.close_connection = True
+
+    def _send_headers(self, status, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status == HTTPStatus.NOT_MODIFIED:
+            self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class MediaServer(ThreadingHTTPServer):
+    """Сервер с потоком на соединение; потоки-демоны не держат процесс при остановке."""
+
+    daemon_threads = True
+    request_queue_size = SERVER_REQUEST_QUEUE_SIZE
+
+    def __init__(self, address, handler_class=MediaRequestHandler, mounts=None):
+        # Более длинные префиксы проверяются первыми, '/' - последним
+        self.mounts = tuple(sorted(mounts or _default_mounts(), key=lambda mount: len(mount[0]), reverse=True))
+        super().__init__(address, handler_class)
+
+    def handle_error(self, request, client_address):
+        # Клиент закрыл соединение между запросами (переключение трека, закрытая вкладка) - не ошибка
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError, TimeoutError)):
+            logger.debug(f"{client_address[0]} закрыл соединение.")
+            return
+        super().handle_error(request, client_address)
+
+
+def create_server(host=None, port=None, mounts=None):
+    """Создает (но не запускает) сервер; port=0 - свободный порт."""
+    return MediaServer((host or SERVER_HOST, SERVER_PORT if port is None else port), mounts=mounts)
+
+
+def serve(host=None, port=None):
+    """Запускает сервер до Ctrl+C."""
+    server = create_server(host, port)
+    host, port = server.server_address[:2]
+    logger.info(f"🌐 Веб-плеер: http://{'localhost' if host in ('0.0.0.0', '::') else host}:{port}/")
+    for prefix, root in server.mounts:
+        logger.info(f"   {prefix} -> {root}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("🛑 Сервер остановлен.")
+    finally:
+        server.server_close()
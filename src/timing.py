@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import logging
+import threading
+
+from .config import TRACK_TIMINGS_FILE
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Поля записи, по которым считаются p50/p95 (поле, подпись, множитель, единица)
+SUMMARY_FIELDS = [
+    ('queue_wait', 'ожидание в очереди', 1, 'сек'),
+    ('extract', 'метаданные', 1, 'сек'),
+    ('download', 'скачивание', 1, 'сек'),
+    ('rate', 'скорость', 1 / 1024, 'КБ/с'),
+    ('transcode_wait', 'ожидание CPU', 1, 'сек'),
+    ('postprocess', 'постобработка', 1, 'сек'),
+    ('total', 'всего', 1, 'сек'),
+]
+
+
+def percentile(values, pct):
+    """Перцентиль методом ближайшего ранга (values не пустой)."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100)) # ceil без float
+    return ordered[int(rank) - 1]
+
+
+class TrackTimings:
+    """
+    Потокобезопасный сбор времени по каждому треку: ожидание в очереди, получение
+    метаданных, скачивание (байты и скорость), ожидание CPU, постобработка и итог.
+    Каждая завершенная попытка сразу дописывается строкой JSON в TRACK_TIMINGS_FILE.
+    """
+
+    def __init__(self, output_file=TRACK_TIMINGS_FILE):
+        self.output_file = output_file
+        self.run_started = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self._records = {} # index -> запись в работе
+        self._finished = []
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._file = None
+        try:
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            self._file = open(output_file, 'a', encoding='utf-8')
+        except OSError as e:
+            logger.error(f"Не удалось открыть файл замеров {output_file}: {e}")
+
+    def queued(self, index, link):
+        """Ссылка поставлена в очередь сетевого этапа."""
+        with self._lock:
+            self._attempts[index] = self._attempts.get(index, 0) + 1
+            self._records[index] = {'link': link, 'attempt': self._attempts[index], '_queued': time.monotonic()}
+
+    def mark(self, index, event, **fields):
+        """Отмечает момент события (fetch_start, download_start, ...) и/или поля записи."""
+        with self._lock:
+            record = self._records.get(index)
+            if record is None:
+                return
+            if event and '_' + event not in record:
+                record['_' + event] = time.monotonic()
+            record.update(fields)
+
+    def fill(self, index, **fields):
+        """Заполняет поля записи, которые еще не заданы."""
+        with self._lock:
+            record = self._records.get(index)
+            if record is None:
+                return
+            for key, value in fields.items():
+                if record.get(key) is None: record[key] = value
+
+    def finish(self, index, status):
+        """Трек завершен: вычисляет длительности, пишет строку JSONL."""
+        now = time.monotonic()
+        with self._lock:
+            record = self._records.pop(index, None)
+            if record is None:
+                return
+            marks = {key[1:]: value for key, value in record.items() if key.startswith('_')}
+            fetch_start = marks.get('fetch_start')
+            fetch_end = marks.get('fetch_end', now)
+            download_start = marks.get('download_start')
+            download_end = marks.get('download_end') or (download_start and fetch_end)
+            entry = {
+                'run': self.run_started,
+                'link': record['link'],
+                'title': record.get('title'),
+                'attempt': record['attempt'],
+                'status': status,
+                'queue_wait': fetch_start - marks['queued'] if fetch_start else None,
+                # Метаданные - от начала обработки до начала передачи аудио
+                'extract': (download_start or fetch_end) - fetch_start if fetch_start else None,
+                'download': download_end - download_start if download_start else None,
+                'bytes': record.get('bytes'),
+                'rate': None,
+                'transcode_wait': marks['transcode_start'] - fetch_end if 'transcode_start' in marks else None,
+                'postprocess': marks.get('transcode_end', now) - marks['transcode_start'] if 'transcode_start' in marks else None,
+                'total': now - marks['queued'],
+            }
+            if entry['bytes'] and entry['download']:
+                entry['rate'] = entry['bytes'] / entry['download']
+            for key, value in entry.items():
+                if isinstance(value, float): entry[key] = round(value, 3)
+            self._finished.append(entry)
+            if self._file is not None:
+                self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def log_summary(self):
+        """p50/p95 по успешно скачанным трекам и самые медленные треки."""
+        downloaded = [entry for entry in self._finished if entry['status'] == 'success']
+        if not downloaded:
+            logger.info("⏱️ Замеры по трекам: нет скачанных треков.")
+            return
+        logger.info(f"⏱️ Замеры по {len(downloaded)} скачанным трекам (p50 / p95), подробно: {self.output_file}")
+        for field, label, scale, unit in SUMMARY_FIELDS:
+            values = [entry[field] * scale for entry in downloaded if entry.get(field) is not None]
+            if values:
+                logger.info(f"   {label}: {percentile(values, 50):.2f} / {percentile(values, 95):.2f} {unit}")
+        for entry in sorted(downloaded, key=lambda e: e['total'], reverse=True)[:3]:
+            logger.info(f"   🐢 {entry['total']:.1f} сек: {entry.get('title') or entry['link']}")
@@ -2,7 +2,8 @@
 import re
 import os
 import logging
-from .config import PODCAST_KEYWORDS, MAX_TRACK_DURATION_SECONDS
+from .config import PODCAST_KEYWORDS, MAX_TRACK_DURATION_SECONDS, AUDIO_EXTENSIONS
+from .dirindex import shared_index
 
 def sanitize_filename(filename):
     """Очищает имя файла от недопустимых символов и лишних пробелов."""
@@ -18,6 +19,77 @@ def get_safe_filepath(base_path, title, extension="mp3"):
     safe_title = sanitize_filename(title)
     return os.path.join(base_path, f"{safe_title}.{extension}")
 
+def is_audio_file(filename):
+    """Аудиофайл библиотеки (MP3 или сохраненный без перекодирования), не .part."""
+    return filename.lower().endswith(AUDIO_EXTENSIONS)
+
+def find_audio_file(base_path, title):
+    """
+    Ищет уже скачанный трек по безопасному имени с любым расширением из AUDIO_EXTENSIONS
+    (по индексу папки, без обращений к диску).
+    """
+    index = shared_index(base_path)
+    filename = index.find(sanitize_filename(title), AUDIO_EXTENSIONS)
+    return index.path(filename) if filename else None
+
+class KeywordMatcher:
+    """
+    Поиск ключевых слов, подготовленный один раз из настроек. Слова ищутся целиком:
+    'set' не находится в 'sunset', 'mix' - в 'remix'; множественное число ('sets',
+    'mixes') по-прежнему считается совпадением. Регистр не важен.
+
+    Слова, содержащие более короткое ключевое слово ('dj mix', 'guest mix' -> 'mix'),
+    объединены в семейство: по тексту быстро (поиск подстроки) ищется только корень
+    семейства, и лишь при его наличии семейство проверяется заранее скомпилированным
+    регулярным выражением с границами слов.
+    """
+
+    def __init__(self, keywords):
+        # Длинные слова первыми: для 'DJ Set' вернется 'dj set', а не 'set'
+        # (при равной длине - по алфавиту, чтобы порядок не зависел от PYTHONHASHSEED)
+        self.keywords = sorted({keyword.lower() for keyword in keywords if keyword}, key=lambda k: (-len(k), k))
+        roots = [keyword for keyword in self.keywords
+                 if not any(other != keyword and other in keyword for other in self.keywords)]
+        families = {root: [] for root in roots}
+        for keyword in self.keywords:
+            families[next(root for root in roots if root in keyword)].append(keyword)
+        # (корень, насколько раньше корня может начинаться слово семейства, regex семейства)
+        self._families = [
+            (root, max(keyword.index(root) for keyword in families[root]), self._compile_family(families[root]))
+            for root in reversed(roots)
+        ]
+
+    @staticmethod
+    def _compile_family(keywords):
+        alternatives = []
+        for keyword in keywords:
+            # Граница слова нужна только с той стороны, где у слова буква/цифра ('ra.' совпадает с 'RA.123')
+            pattern = f'({re.escape(keyword)})'
+            if re.match(r'\w', keyword): pattern = r'(?<!\w)' + pattern
+            if re.search(r'\w$', keyword): pattern += r'(?:e?s)?(?!\w)'
+            alternatives.append(pattern)
+        return re.compile('|'.join(alternatives))
+
+    def search(self, *texts):
+        """
+        Ищет ключевое слово в каждом тексте по отдельности, чтобы фраза не собиралась
+        из конца одного поля и начала другого ('... live' + 'Set ...' - не 'live set').
+        Возвращает первое найденное ключевое слово (в написании из настроек) или None.
+        """
+        for text in filter(None, texts):
+            text = text.lower()
+            for root, offset, regex in self._families:
+                position = text.find(root)
+                if position != -1:
+                    # Регулярное выражение проверяет текст только начиная с первого вхождения корня
+                    match = regex.search(text, max(0, position - offset))
+                    if match:
+                        return match.group(match.lastindex)
+        return None
+
+
+PODCAST_MATCHER = KeywordMatcher(PODCAST_KEYWORDS)
+
 def filter_tracks_only(info):
     """
     Фильтр для yt-dlp ('match_filter'). Пропускает только треки.
@@ -26,17 +98,13 @@ def filter_tracks_only(info):
     """
     if not info: return "Нет информации о видео" # Проверка на пустой info
 
-    title = info.get('title', '').lower()
-    description = info.get('description', '').lower()
-    uploader = info.get('uploader', '').lower()
     duration = info.get('duration')
 
-    # 1. Проверка по ключевым словам
-    text_to_check = f"{title} {description} {uploader}"
-    for keyword in PODCAST_KEYWORDS:
-        if keyword in text_to_check:
-            logging.debug(f"Фильтр: Пропуск '{info.get('title', 'N/A')}' из-за слова '{keyword}'")
-            return f"Ключевое слово: '{keyword}'" # Короче причина
+    # 1. Проверка по ключевым словам (каждое поле отдельно)
+    keyword = PODCAST_MATCHER.search(info.get('title'), info.get('uploader'), info.get('description'))
+    if keyword:
+        logging.debug(f"Фильтр: Пропуск '{info.get('title', 'N/A')}' из-за слова '{keyword}'")
+        return f"Ключевое слово: '{keyword}'" # Короче причина
 
     # 2. Проверка по длительности
     if duration is not None:
@@ -1,12 +1,36 @@
 class MusicPlayer {
     constructor() {
         this.audio = new Audio();
+        // Предзагрузка следующего трека во второй элемент: на 'ended' элементы меняются местами без паузы на буферизацию
+        this.nextAudio = new Audio();
+        this.nextAudio.preload = 'none';
+        this.preloadedSrc = null; // track.src, загружаемый в nextAudio
+        this.preloadMaxBytes = 32 * 1024 * 1024; // Потолок памяти на предзагрузку (0 - не предзагружать), из playlist.json
+        this.preloadBytesPerSecond = 320 * 1000 / 8; // Оценка размера по длительности (верхняя граница MP3 320 кбит/с)
         this.playlist = [];
         this.currentTrackIndex = -1;
         this.isPlaying = false;
         this.isShuffled = false;
         this.repeatMode = 'off'; // 'off', 'all', 'one'
         this.originalPlaylist = [];
+        // Постраничный плейлист: манифест (playlist.json) и сколько страниц уже загружено
+        this.manifest = null;
+        this.pagesLoaded = 0;
+        this.pageLoading = null; // Promise загружаемой сейчас страницы
+        // Поиск: индекс (search_index.json), текущий результат (Set позиций треков или null - все) и debounce
+        this.searchIndexUrl = null;
+        this.searchIndex = null; // Promise индекса
+        this.currentMatches = null;
+        this.searchTimer = null;
+        this.searchRequest = 0;
+        this.searchDebounceMs = 150;
+        // Виртуальный список: индексы this.playlist, прошедшие фильтр, и переиспользуемые строки видимой области
+        this.view = [];
+        this.rowPool = [];
+        this.rowHeight = 0;
+        this.windowFirst = -1;
+        this.windowLast = -1;
+        this.scrollFrame = null;
 
         this.playIconName = 'play_arrow';
         this.pauseIconName = 'pause';
@@ -98,17 +122,97 @@ class MusicPlayer {
 
     displayPlaylistError(message) {
          this.dom.playlistContainer.innerHTML = '';
+         this.dom.playlistContainer.appendChild(this.dom.playlistErrorEl); // Элемент мог быть убран из списка при отрисовке
          this.dom.playlistErrorEl.textContent = message;
          this.dom.playlistErrorEl.style.display = 'block';
     }
 
+    fetchJSON(url) {
+        return fetch(url).then(response => { if (!response.ok) throw new Error(`HTTP ${response.status}`); return response.json(); });
+    }
+
+    // --- Paged Playlist ---
+    // playlist.json - либо весь плейлист ({tracks: [...]}), либо манифест ({pages: [...], fields: [...]}).
+    // Во втором случае сразу загружается первая страница, остальные - при прокрутке, поиске,
+    // перемешивании или переходе за последний загруженный трек.
+    hasMorePages() {
+        return !!this.manifest && this.pagesLoaded < this.manifest.pages.length;
+    }
+
+    decodeTracks(block, meta) {
+        // Компактный формат: строки-массивы в порядке meta.fields или массивы по полям (layout 'columns'),
+        // общий префикс путей meta.base хранится один раз
+        const fields = meta.fields, base = meta.base || '';
+        const columns = meta.layout === 'columns';
+        const count = columns ? (block[fields[0]] || []).length : block.length;
+        const tracks = new Array(count);
+        for (let i = 0; i < count; i++) {
+            const track = {};
+            fields.forEach((field, j) => { track[field] = columns ? block[field][i] : block[i][j]; });
+            if (base) { track.src = base + track.src; if (track.cover) track.cover = base + track.cover; if (track.thumb) track.thumb = base + track.thumb; }
+            tracks[i] = track;
+        }
+        return tracks;
+    }
+
+    loadNextPage() {
+        if (!this.hasMorePages()) return Promise.resolve(false);
+        if (this.pageLoading) return this.pageLoading;
+        this.pageLoading = this.fetchJSON(this.manifest.pages[this.pagesLoaded])
+            .then(block => {
+                const tracks = this.decodeTracks(block, this.manifest);
+                tracks.forEach((track, i) => { track.order = this.originalPlaylist.length + i; }); // Позиция в индексе поиска
+                const start = this.playlist.length;
+                this.originalPlaylist.push(...tracks);
+                this.pagesLoaded++;
+                // Все страницы загружаются до перемешивания, поэтому сюда попадаем только в исходном порядке
+                if (!this.isShuffled) { this.playlist.push(...tracks); this.appendPlaylistItems(start); }
+                return true;
+            })
+            .finally(() => { this.pageLoading = null; });
+        return this.pageLoading;
+    }
+
+    loadAllPages() {
+        return this.hasMorePages() ? this.loadNextPage().then(() => this.loadAllPages()) : Promise.resolve();
+    }
+
+    loadPagesUntil(index) {
+        return index >= this.originalPlaylist.length && this.hasMorePages()
+            ? this.loadNextPage().then(() => this.loadPagesUntil(index)) : Promise.resolve();
+    }
+
+    maybeLoadMore() {
+        // Догружаем следующую страницу, когда до конца списка осталось меньше экрана
+        const container = this.dom.playlistContainer;
+        if (this.hasMorePages() && container.scrollTop + container.clientHeight * 2 >= container.scrollHeight) {
+            this.loadNextPage().then(loaded => { if (loaded) this.maybeLoadMore(); })
+                .catch(error => console.error('Ошибка загрузки страницы плейлиста:', error));
+        }
+    }
+    // --- End Paged Playlist ---
+
     loadPlaylist() {
          this.dom.playlistContainer.innerHTML = '<div style="text-align: center; padding: 2rem; color: var(--text-secondary);">Загрузка плейлиста...</div>';
-        fetch('playlist.json')
-            .then(response => { if (!response.ok) throw new Error(`HTTP ${response.status}`); return response.json(); })
+        this.fetchJSON('playlist.json')
             .then(data => {
-                if (!data || !data.tracks || data.tracks.length === 0) { this.displayPlaylistError('Ошибка: Плейлист пуст или не найден.'); return; }
-                this.originalPlaylist = data.tracks; // Сохраняем оригинал
+                if (data && data.pages) {
+                    if (data.pages.length === 0) return data;
+                    this.manifest = data;
+                    // Сохраненный трек может быть дальше первой страницы; при шаффле нужен весь плейлист
+                    const ready = this.isShuffled ? this.loadAllPages() : this.loadPagesUntil(Math.max(0, this.currentTrackIndex));
+                    return ready.then(() => data);
+                }
+                return data;
+            })
+            .then(data => {
+                // Единый файл: компактный (есть fields) или прежний список объектов
+                const tracks = this.manifest ? this.originalPlaylist : data && data.tracks && (data.fields ? this.decodeTracks(data.tracks, data) : data.tracks);
+                if (!tracks || tracks.length === 0) { this.displayPlaylistError('Ошибка: Плейлист пуст или не найден.'); return; }
+                if (!this.manifest) tracks.forEach((track, i) => { track.order = i; });
+                this.searchIndexUrl = data.search_index || null;
+                if (Number.isFinite(data.preload_max_bytes)) this.preloadMaxBytes = data.preload_max_bytes; // PLAYER_PRELOAD_MAX_BYTES
+                this.originalPlaylist = tracks; // Сохраняем оригинал
                  // Восстанавливаем порядок, если был шаффл
                  if (this.isShuffled) { this.shufflePlaylist(false); } // false = не перерисовывать сразу
                  else { this.playlist = [...this.originalPlaylist]; }
@@ -133,6 +237,7 @@ class MusicPlayer {
                  } else if (this.playlist.length > 0) {
                       this.updateTrackInfo(0); // Показываем инфо первого трека, если индекс некорректный
                  }
+                 this.maybeLoadMore();
             })
             .catch(error => { console.error('Ошибка:', error); this.displayPlaylistError(`Ошибка: ${error.message}`); });
     }
@@ -147,7 +252,26 @@ class MusicPlayer {
         this.dom.volumeSlider.addEventListener('input', (e) => this.setVolume(e.target.value));
          this.dom.volumeDownBtn.addEventListener('click', () => this.changeVolume(-0.1));
          this.dom.volumeUpBtn.addEventListener('click', () => this.changeVolume(0.1));
-         this.dom.searchInput.addEventListener('input', (e) => this.filterPlaylist(e.target.value));
+         this.dom.searchInput.addEventListener('input', (e) => {
+              // Поиск запускается, когда пользователь перестал печатать
+              clearTimeout(this.searchTimer);
+              this.searchTimer = setTimeout(() => this.filterPlaylist(e.target.value), this.searchDebounceMs);
+         });
+         this.dom.playlistContainer.addEventListener('scroll', () => {
+              // Перерисовка видимой области не чаще одного раза за кадр
+              if (this.scrollFrame) return;
+              this.scrollFrame = requestAnimationFrame(() => { this.scrollFrame = null; this.renderWindow(); this.maybeLoadMore(); });
+         }, { passive: true });
+         // Один обработчик кликов на весь список (строки переиспользуются при прокрутке)
+         this.dom.playlistContainer.addEventListener('click', (e) => {
+              const item = e.target.closest('.playlist-item');
+              if (!item || item.dataset.index === '') return;
+              const index = parseInt(item.dataset.index, 10);
+              if (this.currentTrackIndex !== index) { this.currentTrackIndex = index; this.loadAndPlay(); }
+              else if (!this.isPlaying) { this.play(); }
+              else { this.pause(); }
+         });
+         window.addEventListener('resize', () => { this.rowHeight = 0; this.renderWindow(true); });
 
 
         this.dom.progressContainer.addEventListener('click', (e) => {
@@ -159,14 +283,19 @@ class MusicPlayer {
              this.updateProgress();
         });
 
-        // Аудио события
-        this.audio.addEventListener('timeupdate', () => { this.updateProgress(); this.saveState(); }); // Сохраняем позицию
-        this.audio.addEventListener('ended', () => this.handleTrackEnd()); // Используем отдельный обработчик
-        this.audio.addEventListener('loadedmetadata', () => { if(isFinite(this.audio.duration)) this.dom.durationEl.textContent = this.formatTime(this.audio.duration); });
-        this.audio.addEventListener('volumechange', () => { this.dom.volumeSlider.value = this.audio.volume; this.saveState(); }); // Сохраняем громкость
-        this.audio.addEventListener('play', () => { this.isPlaying = true; this.updatePlayPauseIcon(); this.highlightCurrentTrack(); }); // Обновляем статус при старте
-        this.audio.addEventListener('pause', () => { this.isPlaying = false; this.updatePlayPauseIcon(); this.saveState(); }); // Сохраняем при паузе (включая конец трека)
-        this.audio.addEventListener('error', (e) => {
+        // Аудио события: слушаем оба элемента (они меняются местами), обрабатываем только текущий
+        const onAudio = (type, handler) => [this.audio, this.nextAudio].forEach(audio => audio.addEventListener(type, (e) => {
+              if (audio === this.audio) handler(e);
+              else if (type === 'error') this.clearPreload(); // Предзагрузка не удалась - следующий трек загрузится обычным способом
+        }));
+        onAudio('timeupdate', () => { this.updateProgress(); this.saveState(); }); // Сохраняем позицию
+        onAudio('ended', () => this.handleTrackEnd()); // Используем отдельный обработчик
+        onAudio('loadedmetadata', () => { if(isFinite(this.audio.duration)) this.dom.durationEl.textContent = this.formatTime(this.audio.duration); });
+        onAudio('canplaythrough', () => this.preloadNext()); // Текущий трек буферизуется с запасом - можно грузить следующий
+        onAudio('volumechange', () => { this.dom.volumeSlider.value = this.audio.volume; this.saveState(); }); // Сохраняем громкость
+        onAudio('play', () => { this.isPlaying = true; this.updatePlayPauseIcon(); this.highlightCurrentTrack(); }); // Обновляем статус при старте
+        onAudio('pause', () => { this.isPlaying = false; this.updatePlayPauseIcon(); this.saveState(); }); // Сохраняем при паузе (включая конец трека)
+        onAudio('error', (e) => {
               console.error("Ошибка аудио:", this.audio.error);
               const trackSrc = this.playlist[this.currentTrackIndex]?.src || "N/A";
               this.dom.trackTitle.textContent = "Ошибка загрузки";
@@ -189,7 +318,7 @@ class MusicPlayer {
          if (this.repeatMode === 'one') {
               this.audio.currentTime = 0;
               this.play();
-         } else if (this.repeatMode === 'all' || this.currentTrackIndex < this.playlist.length - 1) {
+         } else if (this.repeatMode === 'all' || this.currentTrackIndex < this.playlist.length - 1 || this.hasMorePages()) {
               // Переходим к следующему если включен повтор всего или это не последний трек
               this.playNext();
          } else {
@@ -205,57 +334,126 @@ class MusicPlayer {
          }
      }
 
+    // --- Virtual List ---
+    // В DOM только строки видимой области (с запасом): высоту списка задает распорка,
+    // строки переиспользуются при прокрутке. Память и время кадра не зависят от размера библиотеки.
     renderPlaylist() {
-        const fragment = document.createDocumentFragment();
-        this.dom.playlistContainer.innerHTML = '';
-        if (this.dom.playlistErrorEl.style.display === 'block') return;
-        const searchTerm = this.dom.searchInput.value.toLowerCase().trim(); // Для фильтрации
-
-        this.playlist.forEach((track, index) => {
-            const item = document.createElement('div');
-            item.className = 'playlist-item';
-            item.dataset.index = index;
-
-             // Логика фильтрации
-             const titleLower = track.title.toLowerCase();
-             const artistLower = track.artist.toLowerCase();
-             const isVisible = !searchTerm || titleLower.includes(searchTerm) || artistLower.includes(searchTerm);
-             if (!isVisible) {
-                  item.classList.add('hidden'); // Скрываем, если не соответствует поиску
-             }
-
-             const durationStr = track.duration ? this.formatTime(track.duration) : '--:--';
-
-            item.innerHTML = `
-                 <div class="playlist-item-info">
-                     <div class="title" title="${track.title}">${track.title}</div>
-                     <div class="artist" title="${track.artist}">${track.artist}</div>
-                 </div>
-                 <div class="duration">${durationStr}</div>
-            `;
-            item.addEventListener('click', () => {
-                 if (this.currentTrackIndex !== index) { this.currentTrackIndex = index; this.loadAndPlay(); }
-                 else if (!this.isPlaying) { this.play(); }
-                 else { this.pause(); }
-            });
-            fragment.appendChild(item);
+        const container = this.dom.playlistContainer;
+        container.innerHTML = '';
+        if (this.dom.playlistErrorEl.style.display === 'block') { container.appendChild(this.dom.playlistErrorEl); return; }
+        this.dom.playlistSpacer = document.createElement('div');
+        this.dom.playlistSpacer.className = 'playlist-spacer';
+        this.dom.playlistWindow = document.createElement('div');
+        this.dom.playlistWindow.className = 'playlist-window';
+        this.dom.playlistSpacer.appendChild(this.dom.playlistWindow);
+        container.appendChild(this.dom.playlistSpacer);
+        this.rowPool = [];
+        this.updateView();
+        this.highlightCurrentTrack();
+    }
+
+    updateView() {
+        // Пересчитывает список видимых (по фильтру) треков и перерисовывает окно
+        const matches = this.currentMatches;
+        this.view = [];
+        this.playlist.forEach((track, index) => { if (!matches || matches.has(track.order)) this.view.push(index); });
+        this.renderWindow(true);
+    }
+
+    appendPlaylistItems(start) {
+        // Догруженная страница: ее треки добавляются в конец видимого списка
+        if (!this.dom.playlistSpacer) return;
+        const matches = this.currentMatches;
+        for (let index = start; index < this.playlist.length; index++) {
+            if (!matches || matches.has(this.playlist[index].order)) this.view.push(index);
+        }
+        this.renderWindow(true);
+    }
+
+    createRow() {
+        const item = document.createElement('div');
+        item.className = 'playlist-item';
+        item.innerHTML = `
+             <img class="playlist-thumb" alt="" loading="lazy" decoding="async">
+             <div class="playlist-item-info">
+                 <div class="title"></div>
+                 <div class="artist"></div>
+             </div>
+             <div class="duration"></div>
+        `;
+        item.thumbEl = item.querySelector('.playlist-thumb');
+        item.titleEl = item.querySelector('.title');
+        item.artistEl = item.querySelector('.artist');
+        item.durationEl = item.querySelector('.duration');
+        item.dataset.index = '';
+        return item;
+    }
+
+    measureRowHeight() {
+        // Все строки однострочные, поэтому высота (с отступом) одинаковая - измеряем одну
+        const row = this.createRow();
+        row.titleEl.textContent = row.artistEl.textContent = row.durationEl.textContent = '0';
+        row.style.visibility = 'hidden';
+        this.dom.playlistWindow.appendChild(row);
+        const style = getComputedStyle(row);
+        this.rowHeight = row.getBoundingClientRect().height + parseFloat(style.marginTop || 0) + parseFloat(style.marginBottom || 0) || 60;
+        row.remove();
+    }
+
+    renderWindow(force = false) {
+        if (!this.dom.playlistSpacer) return;
+        if (!this.rowHeight) this.measureRowHeight();
+        const container = this.dom.playlistContainer, rowHeight = this.rowHeight, overscan = 5;
+        this.dom.playlistSpacer.style.height = `${this.view.length * rowHeight}px`;
+        const first = Math.max(0, Math.floor(container.scrollTop / rowHeight) - overscan);
+        const last = Math.min(this.view.length, Math.ceil((container.scrollTop + container.clientHeight) / rowHeight) + overscan);
+        if (!force && first === this.windowFirst && last === this.windowLast) return;
+        this.windowFirst = first; this.windowLast = last;
+        this.dom.playlistWindow.style.transform = `translateY(${first * rowHeight}px)`;
+        const count = last - first;
+        while (this.rowPool.length < count) { const row = this.createRow(); this.rowPool.push(row); this.dom.playlistWindow.appendChild(row); }
+        this.rowPool.forEach((row, i) => {
+            if (i >= count) { row.style.display = 'none'; row.dataset.index = ''; return; }
+            row.style.display = '';
+            this.fillRow(row, this.view[first + i]);
         });
-         this.dom.playlistContainer.appendChild(fragment);
-         this.highlightCurrentTrack();
     }
 
+    fillRow(row, index) {
+        const track = this.playlist[index];
+        if (row.track !== track) { // Текст меняем, только если в строке другой трек
+            row.track = track;
+            row.titleEl.textContent = track.title; row.titleEl.title = track.title;
+            row.artistEl.textContent = track.artist; row.artistEl.title = track.artist;
+            row.durationEl.textContent = track.duration ? this.formatTime(track.duration) : '--:--';
+            // Иконка грузится только для смонтированных строк (видимая область с запасом); без иконки - заглушка фоном
+            if (track.thumb) row.thumbEl.src = track.thumb; else row.thumbEl.removeAttribute('src');
+        }
+        row.dataset.index = String(index);
+        row.classList.toggle('active', index === this.currentTrackIndex);
+    }
+
+    viewPosition(index) {
+        // Позиция трека в видимом списке (двоичный поиск - this.view отсортирован) или -1
+        let low = 0, high = this.view.length;
+        while (low < high) { const mid = (low + high) >> 1; if (this.view[mid] < index) low = mid + 1; else high = mid; }
+        return this.view[low] === index ? low : -1;
+    }
+    // --- End Virtual List ---
+
      highlightCurrentTrack() {
-          this.dom.playlistContainer.querySelectorAll('.playlist-item.active').forEach(el => el.classList.remove('active'));
-          if (this.currentTrackIndex >= 0 && this.currentTrackIndex < this.playlist.length) {
-               const activeItem = this.dom.playlistContainer.querySelector(`.playlist-item[data-index="${this.currentTrackIndex}"]`);
-               if (activeItem) {
-                   activeItem.classList.add('active');
-                   const containerRect = this.dom.playlistContainer.getBoundingClientRect();
-                   const itemRect = activeItem.getBoundingClientRect();
-                   if (itemRect.top < containerRect.top || itemRect.bottom > containerRect.bottom) {
-                        activeItem.scrollIntoView({ behavior: 'smooth', block: 'nearest' });
-                   }
-               }
+          this.rowPool.forEach(row => row.classList.toggle('active', row.dataset.index === String(this.currentTrackIndex)));
+          const position = this.viewPosition(this.currentTrackIndex);
+          if (position < 0 || !this.rowHeight) return;
+          // Прокручиваем к текущему треку, если он вне видимой области (как scrollIntoView 'nearest')
+          const container = this.dom.playlistContainer;
+          const top = position * this.rowHeight, bottom = top + this.rowHeight;
+          let target = null;
+          if (top < container.scrollTop) target = top;
+          else if (bottom > container.scrollTop + container.clientHeight) target = bottom - container.clientHeight;
+          if (target !== null) {
+               const far = Math.abs(target - container.scrollTop) > container.clientHeight * 3;
+               container.scrollTo({ top: target, behavior: far ? 'auto' : 'smooth' });
           }
      }
 
@@ -282,7 +480,11 @@ class MusicPlayer {
          if (this.currentTrackIndex < 0 || this.currentTrackIndex >= this.playlist.length) return;
         const track = this.playlist[this.currentTrackIndex];
          if (!track) return; // Доп. проверка
-        this.audio.src = track.src;
+        if (this.preloadedSrc === track.src) {
+             this.swapPreloaded();
+             // canplaythrough этого элемента уже прошло, пока он был вторым - сразу готовим следующий
+             if (this.audio.readyState >= 4) this.preloadNext();
+        } else { this.audio.src = track.src; }
          this.updateTrackInfo(this.currentTrackIndex);
          this.highlightCurrentTrack();
         const playPromise = this.audio.play();
@@ -312,13 +514,22 @@ class MusicPlayer {
     }
     playNext() {
         if (this.playlist.length === 0) return;
+        if (this.currentTrackIndex + 1 >= this.playlist.length && this.hasMorePages()) {
+            // Следующий трек еще не загружен - догружаем страницу
+            this.loadNextPage().then(() => this.playNext()).catch(error => console.error('Ошибка загрузки страницы плейлиста:', error));
+            return;
+        }
         this.currentTrackIndex = (this.currentTrackIndex + 1) % this.playlist.length;
         this.loadAndPlay();
     }
     playPrevious() {
          if (this.playlist.length === 0) return; let newIndex;
          if (this.audio.currentTime < 3 && this.currentTrackIndex !== 0) { newIndex = this.currentTrackIndex - 1; }
-         else if (this.audio.currentTime < 3 && this.currentTrackIndex === 0) { newIndex = this.playlist.length - 1; }
+         else if (this.audio.currentTime < 3 && this.currentTrackIndex === 0) {
+              // Переход к последнему треку - нужен весь плейлист
+              if (this.hasMorePages()) { this.loadAllPages().then(() => this.playPrevious()); return; }
+              newIndex = this.playlist.length - 1;
+         }
          else { this.audio.currentTime = 0; if (!this.isPlaying) this.play(); return; }
          this.currentTrackIndex = newIndex; this.loadAndPlay();
     }
@@ -337,12 +548,70 @@ class MusicPlayer {
         return `${minutes}:${remainingSeconds.toString().padStart(2, '0')}`;
     }
 
+    // --- Preload ---
+    nextTrackIndex() {
+         // Какой трек заиграет после текущего: следующий в текущем порядке (при шаффле - перемешанном),
+         // после последнего - первый при повторе всего. null - не предзагружать (повтор трека играет из буфера)
+         if (this.currentTrackIndex < 0 || this.playlist.length === 0 || this.repeatMode === 'one') return null;
+         if (this.currentTrackIndex + 1 < this.playlist.length) return this.currentTrackIndex + 1;
+         if (this.hasMorePages()) return null;
+         return this.repeatMode === 'all' && this.playlist.length > 1 ? 0 : null;
+    }
+
+    preloadNext() {
+         if (this.preloadMaxBytes <= 0) return;
+         if (this.currentTrackIndex + 1 >= this.playlist.length && this.hasMorePages() && this.repeatMode !== 'one') {
+              // Следующий трек на еще не загруженной странице
+              this.loadNextPage().then(() => this.preloadNext()).catch(error => console.error('Ошибка загрузки страницы плейлиста:', error));
+              return;
+         }
+         const index = this.nextTrackIndex();
+         const track = index === null ? null : this.playlist[index];
+         if (!track || track.src === this.playlist[this.currentTrackIndex]?.src) { this.clearPreload(); return; }
+         if (track.src === this.preloadedSrc) return;
+         // Целиком буферизуем только треки под потолок памяти; длинные миксы и треки без длительности -
+         // только заголовки (соединение и начало файла готовы, остальное грузится при воспроизведении)
+         const estimatedBytes = track.duration ? track.duration * this.preloadBytesPerSecond : Infinity;
+         this.nextAudio.preload = estimatedBytes <= this.preloadMaxBytes ? 'auto' : 'metadata';
+         this.nextAudio.src = track.src;
+         this.nextAudio.load();
+         this.preloadedSrc = track.src;
+    }
+
+    clearPreload() {
+         // Освобождаем буфер второго элемента
+         if (this.preloadedSrc === null) return;
+         this.preloadedSrc = null;
+         this.nextAudio.removeAttribute('src');
+         this.nextAudio.load();
+    }
+
+    swapPreloaded() {
+         // Предзагруженный элемент становится текущим, прежний освобождает буфер и ждет следующей предзагрузки
+         const previous = this.audio;
+         this.audio = this.nextAudio;
+         this.nextAudio = previous;
+         this.audio.volume = previous.volume;
+         this.preloadedSrc = null;
+         previous.pause();
+         previous.removeAttribute('src');
+         previous.load();
+         previous.preload = 'none';
+    }
+    // --- End Preload ---
+
     // --- Shuffle Logic ---
     toggleShuffle() {
+        if (this.hasMorePages()) {
+            // Перемешивается весь плейлист - сначала догружаем все страницы
+            this.loadAllPages().then(() => this.toggleShuffle()).catch(error => console.error('Ошибка загрузки страницы плейлиста:', error));
+            return;
+        }
         this.isShuffled = !this.isShuffled;
         this.updateShuffleButtonState(); // Обновляем вид кнопки
          this.shufflePlaylist(); // Перемешиваем или восстанавливаем
          this.saveState(); // Сохраняем состояние шаффла
+         if (this.isPlaying) this.preloadNext(); // Следующий трек теперь другой
     }
 
      updateShuffleButtonState() {
@@ -371,6 +640,7 @@ class MusicPlayer {
           else this.repeatMode = 'off';
           this.updateRepeatButtonState(); // Обновляем вид кнопки
           this.saveState(); // Сохраняем состояние
+          if (this.isPlaying) this.preloadNext();
      }
 
      updateRepeatButtonState() {
@@ -405,21 +675,68 @@ class MusicPlayer {
      // --- End Volume ---
 
      // --- Playlist Filter ---
+     normalizeSearchText(text) {
+          // Как _normalize_search_text в src/playlist.py: без диакритики и в нижнем регистре
+          return (text || '').normalize('NFKD').replace(/\p{M}/gu, '').toLowerCase();
+     }
+
+     loadSearchIndex() {
+          // Индекс загружается при первом поиске; без него (старый плейлист, ошибка) - простой перебор
+          if (!this.searchIndex) {
+               this.searchIndex = this.searchIndexUrl
+                    ? this.fetchJSON(this.searchIndexUrl).then(index => {
+                         const total = this.manifest ? this.manifest.total : this.originalPlaylist.length;
+                         return index.total === total ? index : null;
+                    }).catch(error => { console.warn('Поисковый индекс недоступен:', error); return null; })
+                    : Promise.resolve(null);
+          }
+          return this.searchIndex;
+     }
+
+     searchTracks(query, index) {
+          // Возвращает Set позиций треков (track.order) или null, если показывать все
+          const words = this.normalizeSearchText(query).match(/[\p{L}\p{N}_]+/gu);
+          if (!words) return null;
+          if (!index) {
+               const term = this.normalizeSearchText(query.trim());
+               return new Set(this.originalPlaylist
+                    .filter(track => this.normalizeSearchText(track.title).includes(term) || this.normalizeSearchText(track.artist).includes(term))
+                    .map(track => track.order));
+          }
+          // Каждое слово запроса - префикс слова из индекса; результат - пересечение по словам
+          let result = null;
+          for (const word of words) {
+               const matches = new Set();
+               let low = 0, high = index.tokens.length;
+               while (low < high) { const mid = (low + high) >> 1; if (index.tokens[mid] < word) low = mid + 1; else high = mid; }
+               for (let i = low; i < index.tokens.length && index.tokens[i].startsWith(word); i++) {
+                    let position = 0;
+                    for (const delta of index.postings[i]) { position += delta; if (!result || result.has(position)) matches.add(position); }
+               }
+               result = matches;
+               if (result.size === 0) break;
+          }
+          return result;
+     }
+
      filterPlaylist(term) {
-          const lowerTerm = term.toLowerCase().trim();
-          const items = this.dom.playlistContainer.querySelectorAll('.playlist-item');
-          let visibleCount = 0;
-          items.forEach((item, index) => {
-               const track = this.playlist[item.dataset.index]; // Получаем трек по data-index
-               if (!track) return; // Пропуск если трека нет
-               const titleLower = track.title.toLowerCase();
-               const artistLower = track.artist.toLowerCase();
-               const isVisible = !lowerTerm || titleLower.includes(lowerTerm) || artistLower.includes(lowerTerm);
-               item.classList.toggle('hidden', !isVisible);
-               if(isVisible) visibleCount++;
-          });
-          // Можно добавить сообщение "Ничего не найдено"
-          // console.log(`Найдено ${visibleCount} треков по запросу "${term}"`);
+          const query = term.trim();
+          const request = ++this.searchRequest;
+          // Поиск идет по всему плейлисту: догружаем страницы (новые строки фильтруются при добавлении)
+          const ready = query && this.hasMorePages() ? this.loadAllPages() : Promise.resolve();
+          ready.then(() => query ? this.loadSearchIndex() : null)
+               .then(index => {
+                    if (request !== this.searchRequest) return; // Пока ждали, запрос уже изменился
+                    this.currentMatches = query ? this.searchTracks(query, index) : null;
+                    this.applyFilter();
+               })
+               .catch(error => console.error('Ошибка поиска:', error));
+     }
+
+     applyFilter() {
+          // Новый результат поиска: пересчитываем видимый список с начала, в DOM меняются только строки окна
+          this.dom.playlistContainer.scrollTop = 0;
+          this.updateView();
      }
      // --- End Filter ---
 